@@ -1,10 +1,17 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import time
 from pathlib import Path
 
+from openneurolens.cache import ResultCache, hash_uploads, result_key
+from openneurolens.catalog import load_catalog
+from openneurolens.config import PipelineConfig
+from openneurolens.group import aggregate
+from openneurolens.jobs import get_runner
+from openneurolens.pipeline import process_upload
+from openneurolens.profiling import Probe, emit
+from openneurolens.recording import upload_format
+from openneurolens.stages import StageMemo
+from openneurolens.workbooks import Workbook
+
 # -------------------------------
 # Page Config
 # -------------------------------
@@ -13,6 +20,9 @@ st.set_page_config(
     layout="centered",
 )
 
+# Profile of this script rerun; shown in "Logging & Debug" on the next rerun
+rerun_probe = Probe(reset_rss=False).start()
+
 # -------------------------------
 # Paths
 # -------------------------------
@@ -36,6 +46,17 @@ STATIC_DIR = BASE_DIR / "static"
 EEGB_DIR = STATIC_DIR / "EEGB"
 DEMO_DIR = STATIC_DIR / "Demo"
 
+
+def show_workbook(path, key):
+    """One tab per sheet; only the open tab's sheet is read (from the columnar sidecar)."""
+    book = Workbook(path)
+    tabs = st.tabs(book.sheet_names, key=key, on_change="rerun")
+    for sheet_name, tab in zip(book.sheet_names, tabs):
+        if tab.open:
+            with tab:
+                st.dataframe(book.sheet(sheet_name), use_container_width=True)
+
+
 # -------------------------------
 # Welcome Section
 # -------------------------------
@@ -48,13 +69,19 @@ st.markdown("---")
 # -------------------------------
 st.markdown("## 🧠 Upload Your EEG File")
 
-uploaded_file = st.file_uploader(
-    "Choose an EEG file",
-    type=["eeg", "edf", "bdf", "set", "vhdr", "cnt", "csv"]
+uploaded_files = st.file_uploader(
+    "Choose an EEG file (for BrainVision, select the .vhdr, .eeg and .vmrk files together)",
+    type=["eeg", "edf", "bdf", "set", "vhdr", "vmrk", "cnt", "csv"],
+    accept_multiple_files=True,
 )
 
-if uploaded_file is not None:
-    st.success(f"✅ Uploaded file: {uploaded_file.name}")
+# Stage outputs survive reruns, so changing one setting only recomputes downstream stages
+if "stage_memo" not in st.session_state:
+    st.session_state.stage_memo = StageMemo()
+
+if uploaded_files:
+    uploaded_names = ", ".join(f.name for f in uploaded_files)
+    st.success(f"✅ Uploaded file: {uploaded_names}")
 
     # -------------------------------
     # Configuration Settings
@@ -168,6 +195,11 @@ if uploaded_file is not None:
             ["Delta (1–4 Hz)", "Theta (4–8 Hz)", "Alpha (8–13 Hz)", "Beta (13–30 Hz)", "Gamma (30–80 Hz)"],
             index=2,
         )
+        cluster_test = st.selectbox(
+            "Cluster Permutation Test: NoGo vs Go over channels and time (ERP only, adds processing time)",
+            ["No", "Yes"],
+            index=0,
+        )
 
     # --- 7. Output Settings ---
     with st.expander("💾 Output Settings", expanded=False):
@@ -223,6 +255,25 @@ if uploaded_file is not None:
             index=0,
         )
 
+        last_rerun = st.session_state.get("last_rerun")
+        if last_rerun:
+            st.caption(
+                f"Previous page rerun: {last_rerun['seconds'] * 1000:.0f} ms wall, "
+                f"{last_rerun['cpu_seconds'] * 1000:.0f} ms CPU, "
+                f"process peak RSS {last_rerun['process_peak_rss_mb']:.0f} MB"
+            )
+        last_job = get_runner().get(st.session_state.get("job_id"))
+        if last_job is not None and last_job.status == "done" and "profile" in last_job.result:
+            profile = last_job.result["profile"]
+            st.caption(
+                f"Last run ({profile['source']}, {profile['status']}): {profile['seconds']:.2f} s wall, "
+                f"{profile['cpu_seconds']:.2f} s CPU, peak RSS {profile['process_peak_rss_mb']:.0f} MB server "
+                f"(process-wide, approximate) + {profile['worker_peak_rss_mb']:.0f} MB workers"
+                + (f", slowest stage: {profile['slowest_stage']}" if profile.get("slowest_stage") else "")
+            )
+            if "Timings" in last_job.result["tables"]:
+                st.dataframe(last_job.result["tables"]["Timings"], use_container_width=True)
+
     # --- 10. Advanced Settings ---
     with st.expander("⚙️ Advanced Settings", expanded=False):
         parallel_processing = st.selectbox(
@@ -241,52 +292,133 @@ if uploaded_file is not None:
             index=0,
         )
 
+    settings = {
+        "file_type": file_type,
+        "sampling_rate": sampling_rate,
+        "channel_count": channel_count,
+        "filter_band": filter_band,
+        "notch_filter": notch_filter,
+        "reref": reref,
+        "epoch_window": epoch_window,
+        "event_channel": event_channel,
+        "baseline_corr": baseline_corr,
+        "artifact_reject": artifact_reject,
+        "threshold_uv": threshold_uv,
+        "blink_detection": blink_detection,
+        "montage_type": montage_type,
+        "bad_channel_interp": bad_channel_interp,
+        "ref_channel": ref_channel,
+        "analysis_type": analysis_type,
+        "time_window": time_window,
+        "frequency_range": frequency_range,
+        "cluster_test": cluster_test,
+        "export_format": export_format,
+        "include_figures": include_figures,
+        "auto_download": auto_download,
+        "theme_mode": theme_mode,
+        "show_annotations": show_annotations,
+        "figure_size": figure_size,
+        "log_level": log_level,
+        "save_logs": save_logs,
+        "show_console_output": show_console_output,
+        "parallel_processing": parallel_processing,
+        "gpu_acceleration": gpu_acceleration,
+        "cache_results": cache_results,
+    }
+
     st.markdown("---")
 
     # -------------------------------
     # Process Button
     # -------------------------------
     if st.button("🚀 Process"):
+        config = PipelineConfig.from_settings(settings)
+        detected_format = upload_format(uploaded_files)
+        if detected_format and detected_format != config.file_format:
+            st.warning(
+                f"⚠️ File type is set to {file_type}, but '{uploaded_names}' "
+                f"looks like {detected_format.upper()}; reading it as {detected_format.upper()}."
+            )
+
+        # A new run replaces whatever this session had in flight
+        runner = get_runner()
+        if st.session_state.get("job_id"):
+            runner.cancel(st.session_state.job_id)
+
+        upload_key = hash_uploads(uploaded_files)
+        cache = ResultCache() if cache_results == "Yes" else None
+        st.session_state.job_id = runner.submit(
+            process_upload,
+            uploaded_files,
+            upload_key,
+            config,
+            cache=cache,
+            cache_key=result_key(upload_key, settings) if cache else None,
+            memo=st.session_state.stage_memo,
+            label=uploaded_names,
+        )
+
+    # -------------------------------
+    # Processing Job Status / Results
+    # -------------------------------
+    job = get_runner().get(st.session_state.get("job_id"))
+
+    @st.fragment(run_every=1.0)
+    def show_job_progress():
+        """Poll the background job; hand back to a full rerun once it finishes."""
+        job = get_runner().get(st.session_state.get("job_id"))
+        if job is None or not job.active:
+            st.rerun()
+        st.progress(int(job.progress * 100))
+        st.text(f"{job.message}... {int(job.progress * 100)}% ({job.elapsed:.0f} s)")
+        if st.button("✖ Cancel processing"):
+            job.cancel()
+            st.rerun()
+
+    if job is not None:
         st.markdown("### EEG Processing Results")
 
-        progress_text = st.empty()
-        progress_bar = st.progress(0)
-        for percent_complete in range(101):
-            time.sleep(0.03)
-            progress_bar.progress(percent_complete)
-            progress_text.text(f"Processing... {percent_complete}%")
-        progress_text.text("✅ Processing complete!")
-
-        # EEG result images
-        result_images = [
-            ("ERP_Frontal_GoNoGo.png", "ERP - Frontal Go/NoGo"),
-            ("ERP_Posterior_GoNoGo.png", "ERP - Posterior Go/NoGo"),
-            ("PSD_Frontal_GoNoGo.png", "Power Spectrum - Frontal Go/NoGo"),
-            ("PSD_Posterior_GoNoGo.png", "Power Spectrum - Posterior Go/NoGo"),
-        ]
-        for img_file, caption in result_images:
-            img_path = DEMO_DIR / img_file
-            if img_path.exists():
-                st.image(str(img_path), caption=caption, use_container_width=True)
+        if job.active:
+            st.caption("Processing runs in the background — you can keep exploring the example datasets below.")
+            show_job_progress()
+        elif job.status == "cancelled":
+            st.info("Processing was cancelled.")
+        elif job.status == "failed":
+            st.error(f"Error processing EEG file: {job.error}")
+        elif job.status == "done":
+            report = job.result
+            if report.get("cached"):
+                st.text("⚡ Loaded cached results (same file and settings)")
             else:
-                st.warning(f"⚠️ Missing image: {img_file}")
-
-        # EEG summary Excel file
-        xlsx_path = DEMO_DIR / "GoNoGo_summary.xlsx"
-        if xlsx_path.exists():
-            st.markdown("### 📊 EEG Summary Results (Go/NoGo)")
-            try:
-                xls = pd.ExcelFile(xlsx_path)
-                sheet_names = xls.sheet_names
-                tabs = st.tabs(sheet_names)
-                for i, sheet_name in enumerate(sheet_names):
-                    with tabs[i]:
-                        df = pd.read_excel(xls, sheet_name=sheet_name)
-                        st.dataframe(df, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error reading Excel file: {e}")
-        else:
-            st.warning("⚠️ EEG summary file 'GoNoGo_summary.xlsx' not found.")
+                st.text("✅ Processing complete!")
+
+            info = report["recording"]
+            rate = f"{info['sfreq']:g} Hz"
+            if info.get("analysis_sfreq", info["sfreq"]) != info["sfreq"]:
+                rate += f" (analysed at {info['analysis_sfreq']:g} Hz)"
+            st.markdown(
+                f"**{info['n_channels']} channels · {rate} · "
+                f"{info['duration']:.1f} s · {info['n_events']} events**"
+            )
+            # The per-stage profile is shown under "Logging & Debug"
+            for name, table in report["tables"].items():
+                if name != "Timings":
+                    st.dataframe(table, use_container_width=True)
+
+            # EEG result figures (rendered and cached by the pipeline's render stage)
+            for caption, png in report["figures"].items():
+                st.image(png, caption=caption, use_container_width=True)
+
+            # EEG summary Excel file
+            xlsx_path = DEMO_DIR / "GoNoGo_summary.xlsx"
+            if xlsx_path.exists():
+                st.markdown("### 📊 EEG Summary Results (Go/NoGo)")
+                try:
+                    show_workbook(xlsx_path, key="demo_summary_tab")
+                except Exception as e:
+                    st.error(f"Error reading Excel file: {e}")
+            else:
+                st.warning("⚠️ EEG summary file 'GoNoGo_summary.xlsx' not found.")
 
 else:
     st.info("👆 Upload an EEG file to begin processing.")
@@ -299,44 +431,79 @@ st.markdown("---")
 st.markdown("#### If you don't have valid EEG files, you may")
 st.markdown("## Explore the Following Example EEG Datasets")
 
+# Built once and refreshed only when files under static/Example* change
+catalog = load_catalog(STATIC_DIR)
+
 eeg_choice = st.radio(
     "Choose EEG data to explore:",
-    ("", "EEG1", "EEG2"),
+    ("", *catalog.datasets),
     horizontal=True
 )
 
-EXAMPLE_DIRS = {
-    "EEG1": BASE_DIR / "static" / "Example1",
-    "EEG2": BASE_DIR / "static" / "Example2"
-}
-
 if eeg_choice:
     st.success(f"{eeg_choice} selected")
-    example_path = EXAMPLE_DIRS[eeg_choice]
+    dataset = catalog.datasets[eeg_choice]
     st.markdown("### 📈 EEG Figures")
 
-    image_files = sorted(list(example_path.glob("*.png")) + list(example_path.glob("*.jpg")) + list(example_path.glob("*.jpeg")))
-    if image_files:
-        for img_file in image_files:
-            st.image(str(img_file), caption=img_file.name, use_container_width=True)
+    if dataset.images:
+        # Thumbnails first; a full-size figure is only sent when it is asked for
+        columns = st.columns(3)
+        for i, image in enumerate(dataset.images):
+            with columns[i % 3]:
+                st.image(str(dataset.thumbnail_path(image)), caption=image["file"], use_container_width=True)
+        files = {image["file"]: image for image in dataset.images}
+        full = st.selectbox("Open a figure at full size", ["", *files], key=f"{eeg_choice}_full_image")
+        if full:
+            image = files[full]
+            st.image(str(dataset.image_path(image)), caption=f"{full} ({image['width']}×{image['height']} px)",
+                     use_container_width=True)
     else:
-        st.warning(f"⚠️ No EEG images found in {example_path}")
+        st.warning(f"⚠️ No EEG images found in {dataset.directory}")
 
     st.markdown("---")
     st.markdown("### 📊 EEG Analysis Results (Excel Preview)")
-    excel_files = list(example_path.glob("*.xlsx"))
-    if excel_files:
-        excel_path = excel_files[0]
+    if dataset.workbook_path is not None:
         try:
-            excel_data = pd.read_excel(excel_path, sheet_name=None)
-            tab_names = list(excel_data.keys())
-            tabs = st.tabs(tab_names)
-            for i, tab in enumerate(tabs):
-                with tab:
-                    st.dataframe(excel_data[tab_names[i]])
+            show_workbook(dataset.workbook_path, key=f"{eeg_choice}_summary_tab")
         except Exception as e:
             st.error(f"Error reading Excel file: {e}")
     else:
-        st.warning(f"⚠️ No Excel (.xlsx) file found in {example_path}")
+        st.warning(f"⚠️ No Excel (.xlsx) file found in {dataset.directory}")
 else:
     st.info("Select an EEG dataset to begin.")
+
+
+@st.cache_data(show_spinner="Aggregating the example datasets...")
+def group_tables(subjects):
+    """Group summary tables of ``[(label, workbook path, mtime_ns, size)]``; cached per file identity."""
+    return aggregate([(label, Path(path)) for label, path, _, _ in subjects]).tables()
+
+
+st.markdown("---")
+if st.toggle("👥 Show the group summary across all example datasets", key="group_summary"):
+    subjects = [
+        (label, str(d.workbook_path), d.workbook_path.stat().st_mtime_ns, d.workbook_path.stat().st_size)
+        for label, d in catalog.datasets.items() if d.workbook_path is not None
+    ]
+    if subjects:
+        tables = group_tables(subjects)
+        st.caption(f"Mean, SD and SEM across {len(subjects)} subject(s); n_subjects counts those with a value.")
+        tabs = st.tabs(list(tables), key="group_summary_tab", on_change="rerun")
+        for name, tab in zip(tables, tabs):
+            if tab.open:
+                with tab:
+                    st.dataframe(tables[name], use_container_width=True)
+    else:
+        st.warning("⚠️ No example summary workbooks found")
+
+rerun_probe.stop()
+st.session_state.last_rerun = {
+    "seconds": rerun_probe.seconds,
+    "cpu_seconds": rerun_probe.cpu_seconds,
+    "process_peak_rss_mb": rerun_probe.process_peak_rss_mb,
+}
+if uploaded_files:
+    emit(
+        [dict(st.session_state.last_rerun, event="rerun", source=uploaded_names, level="DEBUG")],
+        log_level, save_logs == "Yes", show_console_output == "Yes",
+    )
@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import time
 from pathlib import Path
 
+from openneurolens.catalog import load_catalog
+from openneurolens.config import PipelineConfig
+from openneurolens.pipeline import run_pipeline
+from openneurolens.recording import load_upload
+from openneurolens.workbooks import Workbook
+
 # -------------------------------
 # Page Config
 # -------------------------------
@@ -72,16 +76,26 @@ if uploaded_file is not None:
     if st.button("🚀 Process"):
         st.markdown("### EEG Processing Results")
 
-        # Progress bar (simulate 3-second processing)
+        # Progress bar (driven by the pipeline stages)
         progress_text = st.empty()
         progress_bar = st.progress(0)
 
-        for percent_complete in range(101):
-            time.sleep(0.03)  # 100 * 0.03s = 3s total
+        def report_progress(fraction, message):
+            percent_complete = int(fraction * 100)
             progress_bar.progress(percent_complete)
-            progress_text.text(f"Processing... {percent_complete}%")
+            progress_text.text(f"{message}... {percent_complete}%")
 
-        progress_text.text("✅ Processing complete!")
+        # This page has no settings expanders, so run with the defaults
+        try:
+            config = PipelineConfig.from_settings()
+            recording = load_upload(uploaded_file, config)
+            result = run_pipeline(recording, config, progress=report_progress)
+        except Exception as e:
+            progress_text.empty()
+            st.error(f"Error processing EEG file: {e}")
+        else:
+            progress_text.text("✅ Processing complete!")
+            st.dataframe(result.summary_frame(), use_container_width=True)
 
         
 
@@ -106,15 +120,14 @@ if uploaded_file is not None:
             st.markdown("### 📊 EEG Summary Results (Go/NoGo)")
 
             try:
-                # Load Excel file with multiple sheets
-                xls = pd.ExcelFile(xlsx_path)
-                sheet_names = xls.sheet_names
-                tabs = st.tabs(sheet_names)
+                # Sheets come from the workbook's columnar sidecar; only the open tab is read
+                book = Workbook(xlsx_path)
+                tabs = st.tabs(book.sheet_names, key="demo_summary_tab", on_change="rerun")
 
-                for i, sheet_name in enumerate(sheet_names):
-                    with tabs[i]:
-                        df = pd.read_excel(xls, sheet_name=sheet_name)
-                        st.dataframe(df, use_container_width=True)
+                for sheet_name, tab in zip(book.sheet_names, tabs):
+                    if tab.open:
+                        with tab:
+                            st.dataframe(book.sheet(sheet_name), use_container_width=True)
 
             except Exception as e:
                 st.error(f"Error reading Excel file: {e}")
@@ -137,38 +150,38 @@ st.markdown("---")
 st.markdown("#### If you don't have valid EEG files, you may")
 st.markdown("## Explore the Following Example EEG Datasets")
 
+# Example datasets come from the catalog manifest (refreshed only when files change)
+catalog = load_catalog(Path(__file__).parent / "static")
+
 eeg_choice = st.radio(
     "Choose EEG data to explore:",
-    ("", "EEG1", "EEG2"),
+    ("", *catalog.datasets),
     horizontal=True
 )
 
-# Base path for examples
-BASE_DIR = Path(__file__).parent
-EXAMPLE_DIRS = {
-    "EEG1": BASE_DIR / "static" / "Example1",
-    "EEG2": BASE_DIR / "static" / "Example2"
-}
-
 if eeg_choice:
     st.success(f"{eeg_choice} selected")
 
-    example_path = EXAMPLE_DIRS[eeg_choice]
-    # st.markdown(f"### Showing data from `{example_path}`")
+    dataset = catalog.datasets[eeg_choice]
 
     # -------------------------------
     # Show EEG Figures
     # -------------------------------
     st.markdown("### 📈 EEG Figures")
 
-    # Get all image files (png, jpg, jpeg)
-    image_files = sorted(list(example_path.glob("*.png")) + list(example_path.glob("*.jpg")) + list(example_path.glob("*.jpeg")))
-
-    if image_files:
-        for img_file in image_files:
-            st.image(str(img_file), caption=img_file.name, use_container_width=True)
+    if dataset.images:
+        # Thumbnails first; the full-size figure is sent only on request
+        columns = st.columns(3)
+        for i, image in enumerate(dataset.images):
+            with columns[i % 3]:
+                st.image(str(dataset.thumbnail_path(image)), caption=image["file"], use_container_width=True)
+
+        full = st.selectbox("Open a figure at full size", ["", *(image["file"] for image in dataset.images)],
+                            key=f"{eeg_choice}_full_image")
+        if full:
+            st.image(str(dataset.directory / full), caption=full, use_container_width=True)
     else:
-        st.warning(f"⚠️ No EEG images found in {example_path}")
+        st.warning(f"⚠️ No EEG images found in {dataset.directory}")
 
     st.markdown("---")
 
@@ -177,22 +190,19 @@ if eeg_choice:
     # -------------------------------
     st.markdown("### 📊 EEG Analysis Results (Excel Preview)")
 
-    excel_files = list(example_path.glob("*.xlsx"))
-
-    if excel_files:
-        excel_path = excel_files[0]  # take first .xlsx file found
+    if dataset.workbook_path is not None:
         try:
-            excel_data = pd.read_excel(excel_path, sheet_name=None)
-            tab_names = list(excel_data.keys())
-            tabs = st.tabs(tab_names)
+            book = Workbook(dataset.workbook_path)
+            tabs = st.tabs(book.sheet_names, key=f"{eeg_choice}_summary_tab", on_change="rerun")
 
-            for i, tab in enumerate(tabs):
-                with tab:
-                    st.dataframe(excel_data[tab_names[i]])
+            for sheet_name, tab in zip(book.sheet_names, tabs):
+                if tab.open:
+                    with tab:
+                        st.dataframe(book.sheet(sheet_name))
         except Exception as e:
             st.error(f"Error reading Excel file: {e}")
     else:
-        st.warning(f"⚠️ No Excel (.xlsx) file found in {example_path}")
+        st.warning(f"⚠️ No Excel (.xlsx) file found in {dataset.directory}")
 else:
     st.info("Select an EEG dataset to begin.")
 
@@ -0,0 +1,216 @@
+"""Pipeline benchmarks on synthetic Go/NoGo recordings.
+
+Runs the full stage graph (upload → render) on a synthetic BDF file for
+every sampling rate x channel count offered on the page and several
+recording lengths, and writes one JSON file with the wall time and peak
+traced memory of every stage::
+
+    python -m benchmarks.bench_pipeline --output bench.json
+    python -m benchmarks.bench_pipeline --quick --baseline bench.json
+
+With ``--baseline`` the run is compared stage by stage against an
+earlier results file and the exit status is 1 when any stage got slower
+than ``--tolerance`` (relative) and ``--min-seconds`` (absolute) allow,
+so it can gate a deployment.
+
+Peak memory is measured with :mod:`tracemalloc` (NumPy registers its
+buffers there); disk-backed scratch arrays and pool workers are not
+included. ``max_rss_mb`` is the whole process's high-water mark.
+"""
+import argparse
+import atexit
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Persistent caches go to a throwaway directory so results never depend on (or pollute) the user's cache;
+# the variable is read when openneurolens.cache is first imported
+os.environ["OPENNEUROLENS_CACHE_DIR"] = tempfile.mkdtemp(prefix="onl-bench-cache-")
+atexit.register(shutil.rmtree, os.environ["OPENNEUROLENS_CACHE_DIR"], True)
+
+from openneurolens import __version__, synthetic  # noqa: E402
+from openneurolens.cache import CACHE_DIR, hash_file  # noqa: E402
+from openneurolens.config import PipelineConfig  # noqa: E402
+from openneurolens.pipeline import PIPELINE  # noqa: E402
+from openneurolens.stages import StageMemo, StageTiming  # noqa: E402
+
+# The page's "Sampling Rate" and "Channel Count" choices
+SAMPLING_RATES = (256, 512, 1024, 2048)
+CHANNEL_COUNTS = (32, 64, 128, 256)
+# Recording lengths (s)
+DURATIONS = (60, 300, 600)
+ANALYSES = ("ERP", "PSD", "Time-Frequency", "Connectivity")
+
+QUICK = {"sampling_rates": (256, 512), "channel_counts": (32, 64), "durations": (60,)}
+
+# A stage regresses when it is this much slower, relatively and in seconds
+TOLERANCE = 0.25
+MIN_SECONDS = 0.05
+
+RESULT_COLUMNS = ["sfreq", "n_channels", "duration", "analysis", "stage", "seconds", "peak_mb"]
+
+
+class StagePeaks:
+    """Progress callback recording the traced-memory peak of each stage."""
+
+    def __init__(self):
+        self.peaks = {}
+        self._stage = None
+
+    def __call__(self, fraction, message):
+        if self._stage is not None:
+            self.peaks[self._stage] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        self._stage = message.lower() if fraction < 1.0 else None
+        tracemalloc.reset_peak()
+
+
+def _run(path, upload_key, sfreq, n_channels, analyses, trace=False):
+    """``[(analysis, stage, seconds, peak_mb)]`` of one cold run over ``analyses``.
+
+    The first analysis runs every stage; later ones reuse the memo, so
+    only their ``analysis`` and ``render`` stages are reported.
+    """
+    # Cold persistent caches (figures, interpolation matrices) for every run
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    memo = StageMemo()
+    rows = []
+    for analysis in analyses:
+        settings = {"sampling_rate": str(sfreq), "channel_count": str(n_channels), "analysis_type": analysis,
+                    "file_type": "BDF (.bdf)"}
+        config = PipelineConfig.from_settings(settings)
+        timing = StageTiming()
+        peaks = StagePeaks() if trace else None
+        with open(path, "rb") as upload:
+            if trace:
+                tracemalloc.start()
+            try:
+                PIPELINE.run("render", config, {"upload": (upload_key, upload)}, memo=memo, progress=peaks,
+                             timing=timing)
+            finally:
+                if trace:
+                    tracemalloc.stop()
+        rows += [
+            (analysis, r["stage"], r["seconds"], peaks.peaks.get(r["stage"]) if trace else None)
+            for r in timing.rows if not r["cached"]
+        ]
+    return rows
+
+
+def run_case(path, sfreq, n_channels, analyses, repeat=1, memory=True):
+    """Rows of :data:`RESULT_COLUMNS` (without the case columns) for one synthetic file.
+
+    Times are the fastest of ``repeat`` untraced runs; memory comes from
+    one extra run under :mod:`tracemalloc`, whose overhead would skew the
+    timings.
+    """
+    upload_key = hash_file(path)
+    seconds = {}
+    for _ in range(repeat):
+        for analysis, stage, s, _ in _run(path, upload_key, sfreq, n_channels, analyses):
+            seconds[(analysis, stage)] = min(seconds.get((analysis, stage), s), s)
+    peaks = {}
+    if memory:
+        peaks = {(a, stage): p for a, stage, _, p in _run(path, upload_key, sfreq, n_channels, analyses, True)}
+    return [
+        {"analysis": analysis, "stage": stage, "seconds": s, "peak_mb": peaks.get((analysis, stage))}
+        for (analysis, stage), s in seconds.items()
+    ]
+
+
+def run_suite(sampling_rates=SAMPLING_RATES, channel_counts=CHANNEL_COUNTS, durations=DURATIONS,
+              analyses=ANALYSES, repeat=1, memory=True, seed=synthetic.SYNTHETIC_SEED, log=print):
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="onl-bench-") as tmp:
+        for duration in durations:
+            for sfreq in sampling_rates:
+                for n_channels in channel_counts:
+                    start = time.perf_counter()
+                    recording = synthetic.generate(sfreq, n_channels, duration, seed=seed)
+                    path = Path(tmp) / f"synthetic_{sfreq}_{n_channels}_{duration:g}.bdf"
+                    synthetic.write_bdf(path, recording)
+                    del recording
+                    case = {"sfreq": sfreq, "n_channels": n_channels, "duration": duration}
+                    results = run_case(path, sfreq, n_channels, analyses, repeat, memory)
+                    rows += [dict(case, **r) for r in results]
+                    os.remove(path)
+                    total = sum(r["seconds"] for r in results)
+                    log(f"{sfreq:>5} Hz {n_channels:>4} ch {duration:>5} s: {total:7.2f} s in stages, "
+                        f"{time.perf_counter() - start:.1f} s wall")
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def environment():
+    return {
+        "openneurolens": __version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def write_results(path, frame):
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    payload = {"environment": environment(), "max_rss_mb": max_rss_mb, "results": frame.to_dict("records")}
+    Path(path).write_text(json.dumps(payload, indent=1), encoding="utf-8")
+
+
+def compare(current, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS):
+    """Stage timings of ``current`` next to ``baseline`` with a ``regression`` flag."""
+    keys = ["sfreq", "n_channels", "duration", "analysis", "stage"]
+    merged = current.merge(baseline[keys + ["seconds"]], on=keys, how="inner", suffixes=("", "_baseline"))
+    merged["ratio"] = merged["seconds"] / merged["seconds_baseline"]
+    slower = merged["seconds"] - merged["seconds_baseline"]
+    merged["regression"] = (merged["ratio"] > 1 + tolerance) & (slower > min_seconds)
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench.json", help="results file to write")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--quick", action="store_true", help="small configurations only (for CI)")
+    parser.add_argument("--sampling-rates", type=int, nargs="+")
+    parser.add_argument("--channel-counts", type=int, nargs="+")
+    parser.add_argument("--durations", type=float, nargs="+")
+    parser.add_argument("--analyses", nargs="+", choices=ANALYSES, default=list(ANALYSES))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures memory")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    args = parser.parse_args(argv)
+
+    grid = dict(QUICK) if args.quick else {}
+    for name in ("sampling_rates", "channel_counts", "durations"):
+        if getattr(args, name):
+            grid[name] = tuple(getattr(args, name))
+    frame = run_suite(analyses=args.analyses, repeat=args.repeat, memory=not args.no_memory, **grid)
+    write_results(args.output, frame)
+    print(f"Wrote {len(frame)} stage timings to {args.output}")
+
+    if args.baseline:
+        baseline = pd.DataFrame(json.loads(Path(args.baseline).read_text("utf-8"))["results"])
+        report = compare(frame, baseline, args.tolerance, args.min_seconds)
+        regressions = report[report["regression"]]
+        if len(regressions):
+            print(f"{len(regressions)} stage(s) slower than the baseline:")
+            print(regressions.to_string(index=False))
+            return 1
+        print(f"No regressions against {args.baseline} ({len(report)} stage timings compared)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
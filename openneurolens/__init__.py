@@ -0,0 +1,7 @@
+"""OpenNeuroLens EEG processing engine.
+
+The Streamlit pages (``NewWeb_Good.py``, ``app_web.py``) collect the
+settings; everything that actually touches EEG samples lives here.
+"""
+
+__version__ = "0.1.0"
@@ -0,0 +1,206 @@
+"""Streaming artifact detection: per-channel peak-to-peak threshold and frontal blinks.
+
+A streaming pass over the continuous (filtered, re-referenced) data in
+``ingest.BLOCK_SAMPLES`` blocks, split across channels on a
+:class:`~openneurolens.parallel.ChannelExecutor` when one is given. Each
+block is read with a small margin so every epoch window and blink is
+seen whole exactly once: an epoch is measured in the block where its
+window starts, a blink in the block whose core contains its peak. Only the per-epoch x channel peak-to-peak
+table and the blink sample indices are kept.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from . import ingest
+from .config import roi_indices
+from .events import EventIndex
+from .preprocess import epoch_offsets
+
+# Channels closest to the eyes, used to detect blinks when present
+BLINK_CHANNELS = ("Fp1", "Fp2", "Fpz", "AF7", "AF8", "AF3", "AF4")
+# A blink peak must exceed max(BLINK_MIN_UV, median + BLINK_MAD_FACTOR * MAD) of its block
+BLINK_MIN_UV = 50.0
+BLINK_MAD_FACTOR = 5.0
+# Minimum spacing between two blinks (s)
+BLINK_MIN_INTERVAL = 0.3
+
+REASON_P2P = "p2p_over_threshold"
+REASON_BLINK = "blink"
+
+
+def _pick(ch_names, labels):
+    upper = {label.upper() for label in labels}
+    return [i for i, name in enumerate(ch_names) if name.upper() in upper]
+
+
+def frontal_channels(ch_names):
+    """Indices of the Frontal ROI (or the ROI fallback), pooled for blink detection."""
+    rois = roi_indices(ch_names)
+    return rois.get("Frontal", next(iter(rois.values())))
+
+
+def blink_channels(ch_names):
+    """Fp/AF channels when present, otherwise the frontal channels."""
+    return _pick(ch_names, BLINK_CHANNELS) or frontal_channels(ch_names)
+
+
+def _blink_peaks(eog, sfreq):
+    med = np.median(eog)
+    mad = np.median(np.abs(eog - med))
+    height = max(BLINK_MIN_UV, med + BLINK_MAD_FACTOR * 1.4826 * mad)
+    peaks, _ = signal.find_peaks(eog, height=height, distance=max(1, int(BLINK_MIN_INTERVAL * sfreq)))
+    return peaks
+
+
+class ArtifactReport:
+    """Per-epoch rejection mask and amplitude statistics for one recording.
+
+    Rows follow the time order of the condition events in ``events``.
+    """
+
+    def __init__(self, events, conditions, ch_names, p2p, blink, dropped, reasons, threshold, blinks):
+        self.events = events              # (n_epochs, 3) condition events, time-ordered
+        self.conditions = conditions      # {condition: code}
+        self.ch_names = ch_names
+        self.p2p = p2p                    # (n_epochs, n_channels) float32, NaN when out of bounds
+        self.blink = blink                # (n_epochs,) bool
+        self.dropped = dropped            # (n_epochs,) bool
+        self.reasons = reasons            # (n_epochs,) object, None when clean
+        self.threshold = threshold
+        self.blinks = blinks              # blink peak samples
+
+    def kept_events(self):
+        return self.events[~self.dropped]
+
+    def max_p2p(self):
+        """``(values, channel indices)`` of each epoch's largest channel peak-to-peak (NaN / -1 when out of bounds)."""
+        valid = ~np.isnan(self.p2p).all(axis=1)
+        worst = np.full(len(self.p2p), -1)
+        worst[valid] = np.nanargmax(self.p2p[valid], axis=1)
+        values = np.full(len(self.p2p), np.nan)
+        values[valid] = self.p2p[valid, worst[valid]]
+        return values, worst
+
+    def _condition_names(self):
+        names = {code: cond for cond, code in self.conditions.items()}
+        return np.array([names.get(code) for code in self.events[:, 2]], dtype=object)
+
+    def summary_frame(self):
+        """The ``Artifact_Summary`` sheet: epochs kept and dropped per condition."""
+        conds = self._condition_names()
+        rows = []
+        for cond in self.conditions:
+            mask = conds == cond
+            dropped = int(self.dropped[mask].sum())
+            rows.append({"condition": cond, "total": int(mask.sum()), "kept": int(mask.sum()) - dropped,
+                         "dropped": dropped})
+        return pd.DataFrame(rows, columns=["condition", "total", "kept", "dropped"])
+
+    def epochs_frame(self):
+        """The ``Artifact_Epochs`` sheet: one row per epoch."""
+        max_p2p, worst = self.max_p2p()
+        names = np.array(self.ch_names + [None], dtype=object)
+        return pd.DataFrame({
+            "epoch_index": np.arange(len(self.events)),
+            "condition": self._condition_names(),
+            "event_code": self.events[:, 2],
+            "dropped": self.dropped,
+            "reason": self.reasons,
+            "max_p2p_uV": max_p2p,
+            "max_p2p_channel": names[worst],
+            "threshold_uV": self.threshold,
+            "blink": self.blink,
+        })
+
+    def channel_frame(self):
+        """Per-channel share of epochs over the threshold and peak-to-peak statistics."""
+        valid = ~np.isnan(self.p2p).any(axis=1)
+        p2p = self.p2p[valid]
+        over = (p2p > self.threshold).sum(axis=0)
+        n = max(len(p2p), 1)
+        return pd.DataFrame({
+            "channel": self.ch_names,
+            "epochs_over_threshold": over,
+            "rejection_rate": over / n,
+            "median_p2p_uV": np.median(p2p, axis=0) if len(p2p) else np.nan,
+            "max_p2p_uV": p2p.max(axis=0) if len(p2p) else np.nan,
+        })
+
+
+def _scan(data, starts, n_times, sfreq, p2p=None, eye=(), block_samples=ingest.BLOCK_SAMPLES):
+    """One streaming pass over ``data``; returns the blink peak samples of the pooled ``eye`` channels.
+
+    With ``p2p`` (channels x epochs) it is also filled with the per-channel
+    peak-to-peak of the epoch windows starting at the sorted ``starts``.
+    Without it only the ``eye`` rows are read.
+    """
+    n_samples = data.shape[-1]
+    pad = max(1, int(BLINK_MIN_INTERVAL * sfreq))
+    rows = slice(None) if p2p is not None else list(eye)
+    peaks = []
+    for start, stop in ingest.block_ranges(n_samples, block_samples):
+        # Epochs whose window starts in this block's core
+        a, b = np.searchsorted(starts, [start, stop]) if p2p is not None else (0, 0)
+        if b == a and not len(eye):
+            continue
+        lo = max(0, start - pad)
+        hi = min(n_samples, stop + max(n_times, pad))
+        block = np.asarray(data[rows, lo:hi], dtype=np.float64)
+        if b > a:
+            # (channels, epochs, times) gathered from a zero-copy window view
+            seg = sliding_window_view(block, n_times, axis=-1)[:, starts[a:b] - lo]
+            p2p[:, a:b] = seg.max(axis=-1) - seg.min(axis=-1)
+        if len(eye):
+            found = _blink_peaks((block[eye] if p2p is not None else block).mean(axis=0), sfreq) + lo
+            peaks.append(found[(found >= start) & (found < stop)])
+    return np.concatenate(peaks) if peaks else np.zeros(0, dtype=np.int64)
+
+
+def _p2p_channels(block, out, starts, n_times, sfreq, block_samples):
+    """:meth:`ChannelExecutor.map_channels` worker: peak-to-peak of a channel range."""
+    _scan(block, starts, n_times, sfreq, out, (), block_samples)
+
+
+def detect(data, events, sfreq, ch_names, tmin, tmax, conditions, threshold, blinks=True, drop=True,
+           block_samples=ingest.BLOCK_SAMPLES, executor=None):
+    """Scan ``data`` and flag condition epochs with artifacts.
+
+    An epoch is flagged when the peak-to-peak amplitude of any channel
+    exceeds ``threshold`` (µV), or, with ``blinks``, when a blink peak of
+    the pooled frontal/eye channels falls inside its window. With
+    ``drop=False`` the flags are reported but every epoch is kept (manual
+    review). Without ``executor`` this is one pass over the data; with one,
+    the workers measure the channels and a second pass reads only the eye
+    channels for blinks.
+    """
+    offsets, _ = epoch_offsets(sfreq, tmin, tmax)
+    n_times = len(offsets)
+    index = EventIndex.from_array(events).select(conditions.values())
+    events = index.to_array()
+    first = index.onsets + offsets[0]
+    valid = index.in_bounds(offsets[0], offsets[-1], data.shape[-1])
+    # Events are onset-sorted, so the kept window starts are too
+    starts = first[valid]
+    eye = blink_channels(ch_names) if blinks else []
+
+    measured = np.zeros((len(ch_names), len(starts)), dtype=np.float32)
+    if executor is not None and len(ch_names) > 1 and len(starts):
+        executor.map_channels(_p2p_channels, data, measured, args=(starts, n_times, sfreq, block_samples))
+        peaks = _scan(data, starts, n_times, sfreq, None, eye, block_samples)
+    else:
+        peaks = _scan(data, starts, n_times, sfreq, measured, eye, block_samples)
+    p2p = np.full((len(events), len(ch_names)), np.nan, dtype=np.float32)
+    p2p[valid] = measured.T
+
+    # A blink touches an epoch when its peak lies inside the epoch window
+    blink = np.searchsorted(peaks, first + n_times) > np.searchsorted(peaks, first)
+    # Any single channel over threshold rejects the epoch (fmax skips the NaN of out-of-bounds epochs)
+    over = np.fmax.reduce(p2p, axis=1) > threshold
+    reasons = np.full(len(events), None, dtype=object)
+    reasons[blink] = REASON_BLINK
+    reasons[over] = REASON_P2P
+    flagged = over | blink
+    dropped = flagged if drop else np.zeros(len(events), dtype=bool)
+    return ArtifactReport(events, dict(conditions), list(ch_names), p2p, blink, dropped, reasons, threshold, peaks)
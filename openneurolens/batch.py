@@ -0,0 +1,287 @@
+"""Headless batch processing of a directory of recordings.
+
+Runs the page's pipeline over every recording of the configured file type
+under a directory, one recording per worker process, and writes each
+report in the configured "Export Format"::
+
+    python -m openneurolens.batch --write-settings settings.json
+    python -m openneurolens.batch recordings/ --settings settings.json --output results/ --workers 8
+
+The settings file (JSON or TOML) holds the same keys and values as the
+ten expanders on the page (see :data:`openneurolens.config.DEFAULT_SETTINGS`);
+missing keys keep their defaults. Every recording gets its own output
+directory, which is written under a temporary name and renamed into place
+only when complete, so an interrupted batch is resumed by running the same
+command again: recordings whose output directory was written with the same
+settings are skipped, those written with other settings are reprocessed
+(``--force`` reprocesses them all). A worker process that dies (e.g. out of
+memory) fails only its own recording; the rest continue on a new pool, and
+the summary is written even when the batch is interrupted.
+"""
+import argparse
+import dataclasses
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+
+from . import export
+from .cache import canonical_settings
+from .config import DEFAULT_SETTINGS, PipelineConfig
+from .parallel import CPU_COUNT
+from .pipeline import run_report
+from .recording import EXTENSION_FORMATS
+
+# Output directories are built under this prefix and renamed when complete
+PARTIAL_PREFIX = ".partial-"
+SETTINGS_NAME = "settings.json"
+SUMMARY_NAME = "batch_summary.csv"
+SUMMARY_COLUMNS = ["recording", "status", "seconds", "output", "error"]
+# Summary status of recordings not reached before the batch was interrupted
+STATUS_NOT_RUN = "not_run"
+
+# Per-process math-library threads; one file per worker already uses every core
+THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+# -------------------------------
+# Settings and inputs
+# -------------------------------
+def read_settings(path):
+    """Settings dict from a JSON or TOML file; tables/objects (one per expander) are flattened."""
+    path = Path(path)
+    if path.suffix.lower() == ".toml":
+        import tomllib
+
+        with open(path, "rb") as fh:
+            raw = tomllib.load(fh)
+    else:
+        raw = json.loads(path.read_text("utf-8"))
+    settings = {}
+    for key, value in raw.items():
+        if isinstance(value, dict):
+            settings.update(value)
+        else:
+            settings[key] = value
+    unknown = sorted(set(settings) - set(DEFAULT_SETTINGS))
+    if unknown:
+        raise ValueError(f"{path.name}: unknown setting(s) {', '.join(unknown)}")
+    # TOML/JSON booleans and numbers are accepted alongside the page's labels
+    return {key: ("Yes" if value else "No") if isinstance(value, bool) else str(value)
+            for key, value in settings.items()}
+
+
+def find_recordings(root, file_format, recursive=False, exclude=None):
+    """``[(relative name, [paths])]`` of the recordings of ``file_format`` under ``root``.
+
+    BrainVision recordings are found by their ``.vhdr`` header, which names
+    its companion files; every other format is one file per recording.
+    Files under ``exclude`` (the results directory) are ignored.
+    """
+    root = Path(root)
+    suffixes = [ext for ext, fmt in EXTENSION_FORMATS.items() if fmt == file_format]
+    if file_format == "brainvision":
+        suffixes = [".vhdr"]
+    files = root.rglob("*") if recursive else root.iterdir()
+    exclude = Path(exclude).resolve() if exclude is not None else None
+    found = sorted(p for p in files if p.is_file() and p.suffix.lower() in suffixes
+                   and (exclude is None or exclude not in p.resolve().parents))
+    recordings, names = [], {}
+    for path in found:
+        name = path.relative_to(root).with_suffix("").as_posix()
+        if name in names:
+            raise ValueError(f"{names[name].name} and {path.name} would write the same outputs")
+        names[name] = path
+        recordings.append((name, [path]))
+    return recordings
+
+
+def _outputs_current(target, settings):
+    """Whether ``target`` was written with the same result-affecting settings and export format."""
+    try:
+        stored = json.loads((target / SETTINGS_NAME).read_text("utf-8"))
+        return (canonical_settings(stored) == canonical_settings(settings)
+                and export.export_format(stored["export_format"]) == export.export_format(settings["export_format"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def _upload_key(paths):
+    """Identity of files on disk for the stage memo (no need to hash their contents)."""
+    return "|".join(f"{p.resolve()}:{p.stat().st_mtime_ns}:{p.stat().st_size}" for p in paths)
+
+
+# -------------------------------
+# One recording (runs in a worker process)
+# -------------------------------
+def process_recording(name, paths, output, settings, parallel=True):
+    """Process one recording into ``output/name`` and return its summary row."""
+    start = time.perf_counter()
+    target = Path(output) / name
+    partial = target.parent / f"{PARTIAL_PREFIX}{target.name}-{uuid.uuid4().hex[:8]}"
+    row = {"recording": name, "status": "done", "seconds": None, "output": str(target), "error": None}
+    try:
+        config = PipelineConfig.from_settings(settings)
+        if not parallel:
+            config = dataclasses.replace(config, parallel=False)
+        report = run_report(paths, _upload_key(paths), config)
+        export.write_report(report, partial, target.name, settings.get("export_format", "xlsx"))
+        (partial / SETTINGS_NAME).write_text(json.dumps(settings, indent=1, ensure_ascii=False), encoding="utf-8")
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(partial, target)
+    except Exception as e:
+        row.update(status="failed", output=None, error=repr(e))
+    finally:
+        shutil.rmtree(partial, ignore_errors=True)
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+# -------------------------------
+# Batch
+# -------------------------------
+def _remove_partials(output):
+    for partial in Path(output).rglob(f"{PARTIAL_PREFIX}*"):
+        if partial.is_dir():
+            shutil.rmtree(partial, ignore_errors=True)
+
+
+def _row(name, status, error=None):
+    return {"recording": name, "status": status, "seconds": None, "output": None, "error": error}
+
+
+def _run_pool(todo, workers, output, settings, report):
+    """Process ``todo`` on a new pool; returns the recordings left unfinished because a worker died."""
+    pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+    try:
+        futures = {pool.submit(process_recording, name, paths, output, settings, False): (name, paths)
+                   for name, paths in todo}
+        left = dict(futures)
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except BrokenProcessPool:
+                continue
+            except Exception as e:
+                # Raised outside process_recording, e.g. the arguments could not be sent to the worker
+                row = _row(futures[future][0], "failed", repr(e))
+            del left[future]
+            report(row)
+        return list(left.values())
+    finally:
+        # On Ctrl-C, drop the queued recordings; finished outputs are kept and skipped on the next run
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_batch(input_dir, output, settings=None, workers=CPU_COUNT, recursive=False, force=False, log=print):
+    """Process every recording under ``input_dir``; returns the summary as a DataFrame.
+
+    The summary (one row per recording: done, skipped, failed, or not_run
+    when the batch was interrupted first) is also written to
+    ``output/batch_summary.csv``, whether or not the batch completed.
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    config = PipelineConfig.from_settings(settings)
+    export.export_format(settings["export_format"])
+    if config.file_format is None:
+        raise ValueError(f"Unsupported file type {settings['file_type']!r}")
+    output = Path(output)
+    recordings = find_recordings(input_dir, config.file_format, recursive, exclude=output)
+    if not recordings:
+        raise ValueError(f"No {settings['file_type']} recordings in {input_dir} (set \"file_type\" in the settings)")
+
+    output.mkdir(parents=True, exist_ok=True)
+    _remove_partials(output)
+    rows, todo = [], []
+    for name, paths in recordings:
+        if not force and (output / name).is_dir() and _outputs_current(output / name, settings):
+            rows.append({"recording": name, "status": "skipped", "seconds": None, "output": str(output / name),
+                         "error": None})
+        else:
+            (output / name).parent.mkdir(parents=True, exist_ok=True)
+            todo.append((name, paths))
+    # Largest recordings first, so one long file does not start last and hold up the batch
+    todo.sort(key=lambda item: -sum(p.stat().st_size for p in item[1]))
+    workers = max(1, min(workers, len(todo)))
+    log(f"{len(recordings)} recording(s): {len(rows)} already done, {len(todo)} to process on {workers} worker(s)")
+
+    def report(row):
+        rows.append(row)
+        took = f" in {row['seconds']:.1f} s" if row["seconds"] is not None else ""
+        note = f" ({row['error']})" if row["error"] else ""
+        log(f"[{len(rows)}/{len(recordings)}] {row['recording']}: {row['status']}{took}{note}")
+
+    try:
+        if workers == 1:
+            # In-process, so the per-channel pool can still use every core
+            for name, paths in todo:
+                report(process_recording(name, paths, output, settings, parallel=True))
+        elif todo:
+            for var in THREAD_ENV:
+                os.environ.setdefault(var, "1")
+            # After a worker dies, retry the unfinished recordings on a new pool; once a pool dies without
+            # finishing any, run the rest one per pool so the one that kills its worker fails alone
+            left = todo
+            while left:
+                before = len(left)
+                left = _run_pool(left, workers, output, settings, report)
+                if left:
+                    log(f"A worker process died; {len(left)} recording(s) left")
+                if len(left) == before:
+                    for item in left:
+                        if _run_pool([item], 1, output, settings, report):
+                            report(_row(item[0], "failed", "worker process died (out of memory?)"))
+                    left = []
+    finally:
+        done = {row["recording"] for row in rows}
+        rows.extend(_row(name, STATUS_NOT_RUN) for name, _ in recordings if name not in done)
+        order = {name: i for i, (name, _) in enumerate(recordings)}
+        summary = pd.DataFrame(sorted(rows, key=lambda r: order[r["recording"]]), columns=SUMMARY_COLUMNS)
+        summary.to_csv(output / SUMMARY_NAME, index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", help="directory of recordings")
+    parser.add_argument("--settings", help="JSON or TOML file of page settings (defaults when omitted)")
+    parser.add_argument("--output", help="results directory (default: <input>/openneurolens_results)")
+    parser.add_argument("--workers", type=int, default=CPU_COUNT, help="recordings processed at once")
+    parser.add_argument("--recursive", action="store_true", help="also look in subdirectories")
+    parser.add_argument("--force", action="store_true", help="reprocess recordings that already have outputs")
+    parser.add_argument("--write-settings", metavar="PATH", help="write the default settings to PATH and exit")
+    args = parser.parse_args(argv)
+
+    if args.write_settings:
+        Path(args.write_settings).write_text(json.dumps(DEFAULT_SETTINGS, indent=1, ensure_ascii=False) + "\n",
+                                             encoding="utf-8")
+        print(f"Wrote the default settings to {args.write_settings}")
+        return 0
+    if not args.input:
+        parser.error("the input directory is required")
+    output = args.output or Path(args.input) / "openneurolens_results"
+    try:
+        settings = read_settings(args.settings) if args.settings else {}
+        summary = run_batch(args.input, output, settings, args.workers, args.recursive, args.force)
+    except ValueError as e:
+        parser.exit(2, f"error: {e}\n")
+    failed = summary[summary["status"] == "failed"]
+    print(f"Summary written to {Path(output) / SUMMARY_NAME}")
+    if len(failed):
+        print(f"{len(failed)} recording(s) failed:")
+        print(failed[["recording", "error"]].to_string(index=False))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
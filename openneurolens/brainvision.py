@@ -0,0 +1,203 @@
+"""BrainVision (.vhdr/.eeg/.vmrk) reader with lazy channel access.
+
+The ``.vhdr`` header is parsed eagerly (it is tiny); the ``.eeg`` binary
+is memory-mapped in its native MULTIPLEXED or VECTORIZED layout and only
+the requested channels/time range are decoded; ``.vmrk`` markers are
+parsed into compact NumPy arrays.
+"""
+import re
+from pathlib import Path, PureWindowsPath
+
+import numpy as np
+
+BINARY_FORMATS = {
+    "INT_16": "<i2",
+    "UINT_16": "<u2",
+    "INT_32": "<i4",
+    "IEEE_FLOAT_32": "<f4",
+}
+# Channel unit -> factor to µV
+_UNIT_SCALE = {"µv": 1.0, "μv": 1.0, "uv": 1.0, "": 1.0, "nv": 1e-3, "mv": 1e3, "v": 1e6}
+# Marker types that map onto the "Event Channel" selection
+MARKER_KINDS = ("Stimulus", "Response")
+
+
+def _read_text(path):
+    raw = Path(path).read_bytes()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def parse_ini(path):
+    """Parse a .vhdr/.vmrk file into ``{section: {key: value}}``."""
+    sections = {}
+    current = None
+    for line in _read_text(path).splitlines():
+        line = line.strip()
+        if not line or line.startswith(";"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            current = sections.setdefault(line[1:-1], {})
+        elif current is not None and "=" in line:
+            key, value = line.split("=", 1)
+            current[key.strip()] = value
+    return sections
+
+
+def companion_path(directory, name):
+    """Path of a file named in a header (``DataFile``/``MarkerFile``), which must sit in ``directory``.
+
+    Header values come from the uploaded ``.vhdr``, so anything but a plain
+    file name (an absolute path, a separator, ``..``) is rejected rather
+    than letting the header point the reader at other files on the server.
+    """
+    name = name.strip()
+    if (not name or ".." in name or "/" in name or "\\" in name or Path(name).is_absolute()
+            or PureWindowsPath(name).anchor):
+        raise ValueError(f"BrainVision header refers to {name!r}; companion files must be plain names "
+                         "next to the .vhdr")
+    return Path(directory) / Path(name).name
+
+
+def _split_fields(value):
+    # BrainVision escapes literal commas in names as "\1"
+    return [f.replace("\\1", ",") for f in value.split(",")]
+
+
+class BrainVisionHeader:
+    """Everything the reader needs from a ``.vhdr`` file."""
+
+    def __init__(self, vhdr_path):
+        self.path = Path(vhdr_path)
+        ini = parse_ini(self.path)
+        common = ini.get("Common Infos", {})
+        binary = ini.get("Binary Infos", {})
+
+        if common.get("DataFormat", "BINARY").upper() != "BINARY":
+            raise ValueError("Only BINARY BrainVision data is supported")
+        self.data_file = companion_path(self.path.parent, common["DataFile"])
+        marker = common.get("MarkerFile", "").strip()
+        self.marker_file = companion_path(self.path.parent, marker) if marker else None
+        self.orientation = common.get("DataOrientation", "MULTIPLEXED").strip().upper()
+        if self.orientation not in ("MULTIPLEXED", "VECTORIZED"):
+            raise ValueError(f"Unsupported DataOrientation: {self.orientation}")
+        self.sfreq = 1e6 / float(common["SamplingInterval"])
+
+        fmt = binary.get("BinaryFormat", "INT_16").strip().upper()
+        if fmt not in BINARY_FORMATS:
+            raise ValueError(f"Unsupported BinaryFormat: {fmt}")
+        self.dtype = np.dtype(BINARY_FORMATS[fmt])
+
+        n_channels = int(common["NumberOfChannels"])
+        infos = ini.get("Channel Infos", {})
+        self.ch_names = []
+        self.resolution = np.ones(n_channels)
+        for i in range(n_channels):
+            fields = _split_fields(infos.get(f"Ch{i + 1}", f"Ch{i + 1}"))
+            fields += [""] * (4 - len(fields))
+            self.ch_names.append(fields[0].strip())
+            res = float(fields[2]) if fields[2].strip() else 1.0
+            self.resolution[i] = res * _UNIT_SCALE.get(fields[3].strip().lower(), 1.0)
+
+
+class Markers:
+    """``.vmrk`` markers as parallel arrays.
+
+    ``onsets`` are 0-based sample indices, ``codes`` the number in the
+    description (``-1`` if none) and ``kinds`` an index into
+    :data:`MARKER_KINDS` (``-1`` for other marker types).
+    """
+
+    def __init__(self, onsets, codes, kinds, descriptions):
+        self.onsets = np.asarray(onsets, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.descriptions = list(descriptions)
+
+    def __len__(self):
+        return len(self.onsets)
+
+    @classmethod
+    def from_vmrk(cls, path):
+        entries = parse_ini(path).get("Marker Infos", {})
+        onsets, codes, kinds, descriptions = [], [], [], []
+        for value in entries.values():
+            fields = _split_fields(value)
+            if len(fields) < 3:
+                continue
+            kind, desc, position = fields[0].strip(), fields[1].strip(), fields[2]
+            digits = re.findall(r"\d+", desc)
+            onsets.append(int(position) - 1)
+            codes.append(int(digits[-1]) if digits else -1)
+            kinds.append(MARKER_KINDS.index(kind) if kind in MARKER_KINDS else -1)
+            descriptions.append(f"{kind}/{desc}")
+        markers = cls(onsets, codes, kinds, descriptions)
+        order = np.argsort(markers.onsets, kind="stable")
+        return cls(markers.onsets[order], markers.codes[order], markers.kinds[order],
+                   [markers.descriptions[i] for i in order])
+
+    def events(self, event_channel="Stimulus"):
+        """MNE-style events for one marker kind (``"Custom"`` keeps every coded marker)."""
+        mask = self.codes >= 0
+        if event_channel in MARKER_KINDS:
+            mask &= self.kinds == MARKER_KINDS.index(event_channel)
+        onsets = self.onsets[mask]
+        return np.column_stack([onsets, np.zeros_like(onsets), self.codes[mask].astype(np.int64)])
+
+
+class BrainVisionReader:
+    """Lazy channels x samples view over a BrainVision ``.eeg`` file.
+
+    ``reader[picks, start:stop]`` decodes only those channels and samples
+    to float64 µV; the file itself stays memory-mapped.
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, vhdr_path):
+        self.header = h = BrainVisionHeader(vhdr_path)
+        n_channels = len(h.ch_names)
+        n_samples = h.data_file.stat().st_size // (n_channels * h.dtype.itemsize)
+        if h.orientation == "MULTIPLEXED":
+            mm = np.memmap(h.data_file, dtype=h.dtype, mode="r", shape=(n_samples, n_channels))
+            self._raw = mm.T
+        else:
+            self._raw = np.memmap(h.data_file, dtype=h.dtype, mode="r", shape=(n_channels, n_samples))
+        self.sfreq = h.sfreq
+        self.ch_names = h.ch_names
+
+    @property
+    def shape(self):
+        return self._raw.shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        ch_key, time_key = key if isinstance(key, tuple) else (key, slice(None))
+        picks = np.arange(self.shape[0])[ch_key]
+        raw = self._raw[ch_key, time_key]
+        scale = self.header.resolution[picks]
+        if np.ndim(picks) and np.ndim(raw) == 2:
+            scale = scale[:, None]
+        return raw * scale
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:, :]
+        return out if dtype is None else out.astype(dtype)
+
+    def markers(self):
+        """Parsed ``.vmrk`` markers (empty if the header names no marker file)."""
+        path = self.header.marker_file
+        if path is None or not path.exists():
+            return Markers([], [], [], [])
+        return Markers.from_vmrk(path)
+
+    def __repr__(self):
+        return (
+            f"<BrainVisionReader {self.header.orientation.lower()} {self.shape[0]} ch x "
+            f"{self.shape[1]} samples @ {self.sfreq:g} Hz>"
+        )
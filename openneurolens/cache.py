@@ -0,0 +1,144 @@
+"""Content-addressed on-disk result cache with a size limit and LRU eviction.
+
+Keys combine a streaming hash of the uploaded bytes with a canonical
+form of every setting, so re-submitting the same recording with the same
+settings returns the stored report without touching the pipeline.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from . import __version__
+from .config import DEFAULT_SETTINGS
+
+CACHE_DIR = Path(os.environ.get("OPENNEUROLENS_CACHE_DIR", Path.home() / ".cache" / "openneurolens"))
+MAX_CACHE_BYTES = int(os.environ.get("OPENNEUROLENS_CACHE_MB", "1024")) << 20
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def hash_uploads(uploaded, chunk_bytes=HASH_CHUNK_BYTES):
+    """Streaming BLAKE2b digest of one upload or an upload set (name + bytes)."""
+    files = uploaded if isinstance(uploaded, (list, tuple)) else [uploaded]
+    digest = hashlib.blake2b(digest_size=20)
+    for f in sorted(files, key=lambda f: f.name):
+        digest.update(Path(f.name).name.encode("utf-8") + b"\0")
+        f.seek(0)
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+        f.seek(0)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_file(path, chunk_bytes=HASH_CHUNK_BYTES):
+    """Streaming BLAKE2b digest of a file on disk."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Settings that change how a report is exported, logged or stored, never its contents
+NON_RESULT_SETTINGS = ("export_format", "auto_download", "cache_results", "log_level", "save_logs",
+                       "show_console_output")
+
+
+def canonical_settings(settings):
+    """Stable JSON text of the result-affecting settings, with defaults filled in."""
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(settings or {})
+    return json.dumps({k: str(v) for k, v in merged.items() if k not in NON_RESULT_SETTINGS},
+                      sort_keys=True, ensure_ascii=False)
+
+
+def result_key(upload_hash, settings):
+    """Cache key for a recording hash plus the full configuration."""
+    text = f"{__version__}\n{upload_hash}\n{canonical_settings(settings)}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def atomic_write(path, write):
+    """Call ``write(tmp_path)`` and move the result over ``path`` in one step."""
+    fd, tmp = tempfile.mkstemp(dir=Path(path).parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ResultCache:
+    """Pickled values stored as ``<key>.pkl`` files, evicted least-recently-used first.
+
+    Recency is the file's mtime, refreshed on every hit, so the cache
+    needs no index file and is safe to share between sessions.
+    """
+
+    suffix = ".pkl"
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """Stored value for ``key``, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` atomically, then evict down to the size limit."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+    def _entries(self):
+        entries = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits ``max_bytes``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
@@ -0,0 +1,148 @@
+"""Manifest of the example datasets under ``static/``, with thumbnails.
+
+Every ``static/Example<N>`` directory is one dataset (shown as
+``EEG<N>``): its figures, their pixel sizes and a small PNG thumbnail of
+each, and the sheet names of its summary workbook. The manifest is built
+once into ``CACHE_DIR/catalog`` and only rebuilt when a file is added,
+removed or modified, which is detected from one ``scandir`` per dataset
+directory; nothing is opened or decoded on an ordinary page rerun.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from .cache import CACHE_DIR, atomic_write
+from .workbooks import Workbook
+
+CATALOG_DIR = CACHE_DIR / "catalog"
+DATASET_PATTERN = "Example*"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+WORKBOOK_SUFFIXES = (".xlsx",)
+
+# Longest side of a thumbnail (px); the explorer shows three per row
+THUMBNAIL_PX = 320
+
+
+def dataset_label(directory):
+    """``Example12`` -> ``EEG12``; other directory names are kept as they are."""
+    match = re.fullmatch(r"Example(\d+)", Path(directory).name)
+    return f"EEG{match.group(1)}" if match else Path(directory).name
+
+
+def _natural_key(path):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path.name)]
+
+
+def _listing(directory):
+    """``[(file name, mtime_ns, size)]`` of the images and workbooks in ``directory``."""
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_SUFFIXES + WORKBOOK_SUFFIXES):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return sorted(entries)
+
+
+def _thumbnail(source, directory, stamp):
+    """Write a PNG thumbnail of ``source`` and return ``(file name, (width, height))``."""
+    from PIL import Image
+
+    # Named after the source's identity so a changed figure never reuses a stale thumbnail
+    name = hashlib.blake2b(f"{source}|{stamp}".encode("utf-8"), digest_size=10).hexdigest() + ".png"
+    with Image.open(source) as image:
+        size = image.size
+        if not (directory / name).exists():
+            image.thumbnail((THUMBNAIL_PX, THUMBNAIL_PX))
+            atomic_write(directory / name, lambda tmp: image.save(tmp, format="PNG", optimize=True))
+    return name, size
+
+
+class ExampleDataset:
+    """One example dataset as recorded in the catalog manifest."""
+
+    def __init__(self, label, directory, images, workbook, sheets, thumbnail_dir):
+        self.label = label
+        self.directory = Path(directory)
+        self.images = images            # [{"file", "width", "height", "thumbnail"}]
+        self.workbook = workbook        # file name of the summary workbook, or None
+        self.sheets = sheets
+        self.thumbnail_dir = Path(thumbnail_dir)
+
+    def image_path(self, image):
+        return self.directory / image["file"]
+
+    def thumbnail_path(self, image):
+        return self.thumbnail_dir / image["thumbnail"]
+
+    @property
+    def workbook_path(self):
+        return self.directory / self.workbook if self.workbook else None
+
+
+class Catalog:
+    """Example datasets found under ``root``, keyed by their label."""
+
+    def __init__(self, root, directory=CATALOG_DIR):
+        self.root = Path(root)
+        name = hashlib.blake2b(str(self.root.resolve()).encode("utf-8"), digest_size=10).hexdigest()
+        self.directory = Path(directory) / name
+        self.datasets = {}
+
+    def _dataset_dirs(self):
+        dirs = [p for p in self.root.glob(DATASET_PATTERN) if p.is_dir()]
+        return sorted(dirs, key=_natural_key)
+
+    def signature(self):
+        """Fingerprint of every dataset directory's images and workbooks."""
+        listing = [[d.name, _listing(d)] for d in self._dataset_dirs()]
+        return hashlib.blake2b(json.dumps(listing).encode("utf-8"), digest_size=20).hexdigest()
+
+    def load(self):
+        """Read the manifest, rebuilding it first when the files changed."""
+        signature = self.signature()
+        try:
+            manifest = json.loads((self.directory / "manifest.json").read_text("utf-8"))
+            if manifest["signature"] != signature:
+                manifest = self.build(signature)
+        except (OSError, ValueError, KeyError):
+            manifest = self.build(signature)
+        self.datasets = {
+            d["label"]: ExampleDataset(d["label"], self.root / d["directory"], d["images"], d["workbook"],
+                                       d["sheets"], self.directory)
+            for d in manifest["datasets"]
+        }
+        return self
+
+    def build(self, signature=None):
+        """Scan every dataset, write thumbnails and the manifest, and return the manifest."""
+        signature = self.signature() if signature is None else signature
+        self.directory.mkdir(parents=True, exist_ok=True)
+        datasets, thumbnails = [], set()
+        for d in self._dataset_dirs():
+            images, workbooks = [], []
+            for name, mtime, size in _listing(d):
+                if name.lower().endswith(WORKBOOK_SUFFIXES):
+                    workbooks.append(name)
+                    continue
+                thumb, (width, height) = _thumbnail(d / name, self.directory, (mtime, size))
+                thumbnails.add(thumb)
+                images.append({"file": name, "width": width, "height": height, "thumbnail": thumb})
+            workbook = workbooks[0] if workbooks else None
+            # Also converts the workbook to its columnar sidecar ahead of the first view
+            sheets = Workbook(d / workbook).sheet_names if workbook else []
+            datasets.append({"label": dataset_label(d), "directory": d.name, "images": images,
+                             "workbook": workbook, "sheets": sheets})
+        manifest = {"root": str(self.root), "signature": signature, "datasets": datasets}
+        text = json.dumps(manifest, ensure_ascii=False, indent=1)
+        atomic_write(self.directory / "manifest.json", lambda tmp: Path(tmp).write_text(text, encoding="utf-8"))
+        for stale in set(self.directory.glob("*.png")) - {self.directory / t for t in thumbnails}:
+            stale.unlink(missing_ok=True)
+        return manifest
+
+
+def load_catalog(root):
+    """The :class:`Catalog` of ``root`` (``static/``), built or refreshed as needed."""
+    return Catalog(root).load()
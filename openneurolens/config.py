@@ -0,0 +1,219 @@
+"""Pipeline configuration parsed from the Streamlit expander selections.
+
+The pages keep the selectbox strings exactly as shown to the user
+("0.5–40 Hz", "-200 to 800 ms", ...). ``PipelineConfig.from_settings``
+turns that dict into the numbers the engine needs.
+"""
+import re
+from dataclasses import dataclass, field
+
+# -------------------------------
+# Defaults (mirror the selectbox ``index`` values in NewWeb_Good.py)
+# -------------------------------
+DEFAULT_SETTINGS = {
+    # 1. File Settings
+    "file_type": "BrainVision (.vhdr/.eeg/.vmrk)",
+    "sampling_rate": "512",
+    "channel_count": "64",
+    # 2. Preprocessing Settings
+    "filter_band": "0.5–40 Hz",
+    "notch_filter": "60 Hz",
+    "reref": "Average",
+    # 3. Epoching Settings
+    "epoch_window": "-200 to 800 ms",
+    "event_channel": "Stimulus",
+    "baseline_corr": "Yes",
+    # 4. Artifact Rejection
+    "artifact_reject": "Automatic",
+    "threshold_uv": "100",
+    "blink_detection": "Enabled",
+    # 5. Channel Settings
+    "montage_type": "Standard 10-20",
+    "bad_channel_interp": "Yes",
+    "ref_channel": "Average",
+    # 6. Analysis Settings
+    "analysis_type": "ERP",
+    "time_window": "0–500 ms",
+    "frequency_range": "Alpha (8–13 Hz)",
+    "cluster_test": "No",
+    # 7. Output Settings
+    "export_format": "Excel (.xlsx)",
+    "include_figures": "Yes",
+    "auto_download": "No",
+    # 8. Display Options
+    "theme_mode": "Light",
+    "show_annotations": "Yes",
+    "figure_size": "Medium",
+    # 9. Logging & Debug
+    "log_level": "INFO",
+    "save_logs": "No",
+    "show_console_output": "Yes",
+    # 10. Advanced Settings
+    "parallel_processing": "Yes",
+    "gpu_acceleration": "No",
+    "cache_results": "Yes",
+}
+
+# "EEG File Type" selection -> reader format key (see recording.EXTENSION_FORMATS)
+FILE_TYPE_FORMATS = {
+    "BrainVision (.vhdr/.eeg/.vmrk)": "brainvision",
+    "EDF (.edf)": "edf",
+    "BDF (.bdf)": "bdf",
+    "EEGLAB (.set)": "eeglab",
+    "CSV (.csv)": "csv",
+}
+
+# "Montage Type" selection -> MNE standard montage used for channel positions.
+# Custom montages carry no positions here, so they use the densest standard set.
+MONTAGES = {
+    "Standard 10-20": "standard_1020",
+    "Standard 10-10": "standard_1005",
+    "Custom": "standard_1005",
+}
+
+# Go/NoGo marker codes used by the example sessions (see GoNoGo_summary.xlsx)
+CONDITIONS = {"Go": 5, "NoGo": 6}
+
+# Canonical EEG bands offered by "Frequency Range" (Hz, [lo, hi))
+FREQUENCY_BANDS = {
+    "delta": (1.0, 4.0),
+    "theta": (4.0, 8.0),
+    "alpha": (8.0, 13.0),
+    "beta": (13.0, 30.0),
+    "gamma": (30.0, 80.0),
+}
+
+# Regions of interest used by the summary sheets (10-20/10-10 labels)
+ROIS = {
+    "Frontal": ("Fz", "F1", "F2", "F3", "F4", "AFz", "FCz", "FC1", "FC2"),
+    "Posterior": ("Pz", "P1", "P2", "P3", "P4", "POz", "PO3", "PO4", "Oz", "O1", "O2"),
+}
+
+# Values used when the user picks "Custom" without further input
+CUSTOM_FILTER_BAND = (0.5, 40.0)
+CUSTOM_TIME_WINDOW = (0.0, 0.5)
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_numbers(text):
+    """Return every number in a selectbox label, e.g. "0.5–40 Hz" -> [0.5, 40.0]."""
+    return [float(x) for x in _NUMBER.findall(str(text))]
+
+
+def roi_indices(ch_names, rois=ROIS):
+    """``{roi: channel indices}`` for the ROIs present in ``ch_names``.
+
+    Recordings without standard labels (e.g. "Channel1") fall back to a
+    single "All" ROI so the summaries are still produced.
+    """
+    lookup = {name.upper(): i for i, name in enumerate(ch_names)}
+    found = {}
+    for roi, labels in rois.items():
+        idx = [lookup[label.upper()] for label in labels if label.upper() in lookup]
+        if idx:
+            found[roi] = idx
+    return found or {"All": list(range(len(ch_names)))}
+
+
+def _yes(value):
+    return str(value).strip().lower() in ("yes", "enabled", "true", "1")
+
+
+def _reref_method(value):
+    return {
+        "average": "average",
+        "linked mastoids": "mastoids",
+        "none": None,
+    }.get(str(value).strip().lower())
+
+
+def _artifact_method(value):
+    return {"automatic": "automatic", "manual": "manual"}.get(str(value).strip().lower())
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    """Numeric view of the settings dict used by every processing stage."""
+
+    file_format: str = "brainvision"
+    sfreq: float = 512.0
+    n_channels: int = 64
+    l_freq: float = 0.5
+    h_freq: float = 40.0
+    notch: float = 60.0
+    filter_method: str = "fir"
+    resample: bool = True
+    reref: str = "average"
+    interpolate: bool = True
+    montage: str = "standard_1020"
+    tmin: float = -0.2
+    tmax: float = 0.8
+    event_channel: str = "Stimulus"
+    baseline: bool = True
+    conditions: dict = field(default_factory=lambda: dict(CONDITIONS))
+    artifact_reject: str = "automatic"
+    threshold_uv: float = 100.0
+    blink_detection: bool = True
+    analysis_type: str = "ERP"
+    analysis_window: tuple = (0.0, 0.5)
+    band: tuple = ("alpha", 8.0, 13.0)
+    cluster_test: bool = False
+    n_permutations: int = 1000
+    permutation_seed: int = 0
+    parallel: bool = True
+    include_figures: bool = True
+    figure_size: str = "Medium"
+    theme: str = "light"
+    show_annotations: bool = True
+    log_level: str = "INFO"
+    save_logs: bool = False
+    show_console_output: bool = True
+
+    @classmethod
+    def from_settings(cls, settings=None):
+        """Build a config from the page's settings dict (missing keys use defaults)."""
+        s = dict(DEFAULT_SETTINGS)
+        s.update(settings or {})
+
+        band = parse_numbers(s["filter_band"]) or list(CUSTOM_FILTER_BAND)
+        notch = parse_numbers(s["notch_filter"])
+        window = parse_numbers(s["epoch_window"])
+        analysis_window = parse_numbers(s["time_window"])
+        analysis_window = (
+            tuple(x / 1000.0 for x in analysis_window) if len(analysis_window) == 2 else CUSTOM_TIME_WINDOW
+        )
+        band_name = str(s["frequency_range"]).split()[0].lower()
+        band_lo, band_hi = parse_numbers(s["frequency_range"])[:2]
+
+        return cls(
+            file_format=FILE_TYPE_FORMATS.get(s["file_type"]),
+            sfreq=float(s["sampling_rate"]),
+            n_channels=int(s["channel_count"]),
+            l_freq=band[0],
+            h_freq=band[1],
+            notch=notch[0] if notch else None,
+            reref=_reref_method(s["reref"]),
+            interpolate=_yes(s["bad_channel_interp"]),
+            montage=MONTAGES.get(s["montage_type"], "standard_1005"),
+            tmin=window[0] / 1000.0,
+            tmax=window[1] / 1000.0,
+            event_channel=s["event_channel"],
+            baseline=_yes(s["baseline_corr"]),
+            artifact_reject=_artifact_method(s["artifact_reject"]),
+            threshold_uv=float(s["threshold_uv"]),
+            blink_detection=_yes(s["blink_detection"]),
+            analysis_type=s["analysis_type"],
+            analysis_window=analysis_window,
+            band=(band_name, band_lo, band_hi),
+            cluster_test=_yes(s["cluster_test"]),
+            parallel=_yes(s["parallel_processing"]),
+            include_figures=_yes(s["include_figures"]),
+            figure_size=s["figure_size"],
+            # "System Default" has no server-side meaning; figures then use the light theme
+            theme="dark" if str(s["theme_mode"]).lower() == "dark" else "light",
+            show_annotations=_yes(s["show_annotations"]),
+            log_level=s["log_level"],
+            save_logs=_yes(s["save_logs"]),
+            show_console_output=_yes(s["show_console_output"]),
+        )
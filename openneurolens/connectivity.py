@@ -0,0 +1,224 @@
+"""All-pairs spectral connectivity (coherence and phase-locking value).
+
+Each epoch is transformed once and only the bins of the selected band
+are kept, as a ``(n_freqs, n_epochs, n_channels)`` array. Cross-spectra
+for every channel pair are then batched matrix products over tiles of
+``CONNECTIVITY_TILE`` channels, so memory is bounded by the tile size
+rather than by the 32,640 pairs of a 256-channel montage. In parallel,
+every (frequency chunk, tile pair) is one worker task over the spectra in
+shared memory. Results are stored as the upper triangle
+(``np.triu_indices(n, k=1)`` order).
+"""
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from .config import roi_indices
+from .jobs import cancel_scope, check_cancelled
+from .parallel import SharedArray, gather
+
+# Channels per side of one cross-spectral tile
+CONNECTIVITY_TILE = 64
+# Smallest tile the parallel path shrinks to when there are fewer tile pairs than workers
+MIN_PARALLEL_TILE = 16
+# Bytes of epoch samples transformed per batch
+SPECTRA_BATCH_BYTES = 128 << 20
+
+METRICS = ("coherence", "plv")
+
+
+def pair_count(n_channels):
+    return n_channels * (n_channels - 1) // 2
+
+
+def pair_index(i, j, n_channels):
+    """Position of pair ``(i, j)``, ``i < j``, in the upper-triangular vector."""
+    return i * n_channels - i * (i + 1) // 2 + (j - i - 1)
+
+
+def band_spectra(epochs, sfreq, lo, hi, batch_bytes=SPECTRA_BATCH_BYTES):
+    """Hann-windowed Fourier coefficients of ``epochs`` in ``[lo, hi)`` Hz.
+
+    Returns ``(freqs, X)`` with ``X`` shaped ``(n_freqs, n_epochs, n_channels)``.
+    """
+    n_epochs, n_channels, n_times = epochs.shape
+    freqs = np.fft.rfftfreq(n_times, 1.0 / sfreq)
+    mask = (freqs >= lo) & (freqs < hi)
+    window = signal.get_window("hann", n_times)
+    X = np.empty((int(mask.sum()), n_epochs, n_channels), dtype=np.complex64)
+    rows = max(1, batch_bytes // max(n_channels * n_times * 8, 1))
+    for start in range(0, n_epochs, rows):
+        check_cancelled()
+        batch = np.asarray(epochs[start:start + rows], dtype=np.float64)
+        batch = (batch - batch.mean(axis=-1, keepdims=True)) * window
+        X[:, start:start + len(batch)] = np.fft.rfft(batch, axis=-1)[..., mask].transpose(2, 0, 1)
+    return freqs[mask], X
+
+
+def _unit(X):
+    mag = np.abs(X)
+    return np.divide(X, mag, out=np.zeros_like(X), where=mag > 0)
+
+
+def _tile_pairs(n_channels, tile):
+    """``(a0, a1, b0, b1)`` channel ranges of every tile pair on or above the diagonal."""
+    starts = range(0, n_channels, tile)
+    return [(a0, min(a0 + tile, n_channels), b0, min(b0 + tile, n_channels)) for a0 in starts for b0 in starts
+            if b0 >= a0]
+
+
+def _tile_metrics(X, out, a0, a1, b0, b1):
+    """Coherence and PLV of the pairs between channels ``a0:a1`` and ``b0:b1`` (``a0 <= b0``).
+
+    ``X`` is ``(n_freqs, n_epochs, n_channels)``; ``out`` is the matching
+    ``(n_freqs, 2, n_pairs)`` output.
+    """
+    n_epochs, n_channels = X.shape[1:]
+    Xa, Xb = X[:, :, a0:a1], X[:, :, b0:b1]
+    cross = np.matmul(Xa.transpose(0, 2, 1), Xb.conj()) / n_epochs
+    phase = np.matmul(_unit(Xa).transpose(0, 2, 1), _unit(Xb).conj()) / n_epochs
+    denom = (Xa.real ** 2 + Xa.imag ** 2).mean(axis=1)[:, :, None] * (Xb.real ** 2 + Xb.imag ** 2).mean(axis=1)[:, None]
+    coh = np.divide(np.abs(cross) ** 2, denom, out=np.zeros(denom.shape), where=denom > 0)
+
+    i, j = np.nonzero(np.arange(a0, a1)[:, None] < np.arange(b0, b1)[None, :])
+    idx = pair_index(i + a0, j + b0, n_channels)
+    out[:, 0, idx] = coh[:, i, j]
+    out[:, 1, idx] = np.abs(phase[:, i, j])
+
+
+def _pair_metrics(X, out, tile):
+    """Every tile pair of ``X`` (``(n_freqs, n_epochs, n_channels)``) into ``out`` (``(n_freqs, 2, n_pairs)``)."""
+    for a0, a1, b0, b1 in _tile_pairs(X.shape[2], tile):
+        check_cancelled()
+        _tile_metrics(X, out, a0, a1, b0, b1)
+
+
+def _run_tile(x_spec, out_spec, flag_spec, f0, f1, a0, a1, b0, b1):
+    """Worker entry point: one tile pair over frequency bins ``f0:f1``, in shared memory."""
+    X = SharedArray.attach(x_spec)
+    out = SharedArray.attach(out_spec)
+    flag = SharedArray.attach(flag_spec)
+    try:
+        with cancel_scope(lambda: bool(flag.array[0])):
+            check_cancelled()
+            _tile_metrics(X.array[f0:f1], out.array[f0:f1], a0, a1, b0, b1)
+    finally:
+        X.close()
+        out.close()
+        flag.close()
+
+
+def _parallel_pair_metrics(X, out, tile, executor):
+    """:func:`_pair_metrics` as (frequency chunk x tile pair) tasks on ``executor``.
+
+    Tiles shrink (down to ``MIN_PARALLEL_TILE``) until there is a tile pair
+    per worker, and frequency bins are chunked so there are about two tasks
+    per worker, so the pair work spreads over every core however few bins
+    the band has.
+    """
+    n_freqs, _, n_channels = X.shape
+    while tile > MIN_PARALLEL_TILE and len(_tile_pairs(n_channels, tile)) < executor.n_workers:
+        tile = max(MIN_PARALLEL_TILE, tile // 2)
+    tiles = _tile_pairs(n_channels, tile)
+    chunks = min(n_freqs, -(-2 * executor.n_workers // len(tiles)))
+    bounds = np.linspace(0, n_freqs, chunks + 1).astype(int)
+    shm_x = SharedArray(X.shape, X.dtype)
+    shm_out = SharedArray(out.shape, out.dtype)
+    flag = SharedArray((1,), np.uint8)
+    try:
+        shm_x.array[:] = X
+        futures = [executor.submit(_run_tile, shm_x.spec, shm_out.spec, flag.spec, int(f0), int(f1), *t)
+                   for f0, f1 in zip(bounds[:-1], bounds[1:]) for t in tiles]
+        gather(futures, flag)
+        out[:] = shm_out.array
+    finally:
+        shm_x.close()
+        shm_out.close()
+        flag.close()
+    return out
+
+
+def pair_metrics(epochs, sfreq, lo, hi, tile=CONNECTIVITY_TILE, executor=None):
+    """Band-averaged coherence and PLV for every channel pair.
+
+    Returns ``(2, n_pairs)``: row 0 magnitude-squared coherence, row 1 PLV.
+    With ``executor`` the tile pairs and frequency bins are spread over its
+    workers (see :func:`_parallel_pair_metrics`).
+    """
+    n_channels = epochs.shape[1]
+    if not epochs.shape[0]:
+        return np.full((2, pair_count(n_channels)), np.nan)
+    freqs, X = band_spectra(epochs, sfreq, lo, hi)
+    if not len(freqs):
+        return np.full((2, pair_count(n_channels)), np.nan)
+    out = np.zeros((len(freqs), 2, pair_count(n_channels)))
+    if executor is not None and n_channels > 1:
+        _parallel_pair_metrics(X, out, tile, executor)
+    else:
+        _pair_metrics(X, out, tile)
+    return out.mean(axis=0)
+
+
+class Connectivity:
+    """Per-condition upper-triangular coherence and PLV in one band."""
+
+    def __init__(self, band, values, ch_names):
+        self.band = band              # (name, lo, hi)
+        self.values = values          # {condition: (2, n_pairs)}
+        self.ch_names = ch_names
+
+    @classmethod
+    def from_epochs(cls, epochs, band, executor=None, **kwargs):
+        _, lo, hi = band
+        values = {
+            cond: pair_metrics(data, epochs.sfreq, lo, hi, executor=executor, **kwargs)
+            for cond, data in epochs.data.items()
+        }
+        return cls(band, values, epochs.ch_names)
+
+    def matrix(self, condition, metric="coherence"):
+        """Symmetric ``(n_channels, n_channels)`` matrix of one metric (diagonal 1)."""
+        n = len(self.ch_names)
+        m = np.eye(n)
+        i, j = np.triu_indices(n, k=1)
+        m[i, j] = m[j, i] = self.values[condition][METRICS.index(metric)]
+        return m
+
+    def pairs_frame(self):
+        """One row per channel pair and condition."""
+        i, j = np.triu_indices(len(self.ch_names), k=1)
+        names = np.asarray(self.ch_names)
+        frames = [
+            pd.DataFrame({
+                "channel_a": names[i],
+                "channel_b": names[j],
+                "condition": cond,
+                "coherence": values[0],
+                "plv": values[1],
+            })
+            for cond, values in self.values.items()
+        ]
+        columns = ["channel_a", "channel_b", "condition", "coherence", "plv"]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def roi_frame(self):
+        """Mean coherence and PLV within and between ROIs."""
+        rois = list(roi_indices(self.ch_names).items())
+        rows = []
+        for cond in self.values:
+            mats = [self.matrix(cond, metric) for metric in METRICS]
+            for k, (roi_a, idx_a) in enumerate(rois):
+                for roi_b, idx_b in rois[k:]:
+                    block = np.ix_(idx_a, idx_b)
+                    # Exclude self-pairs (the diagonal) from within-ROI means
+                    keep = np.not_equal.outer(idx_a, idx_b)
+                    if not keep.any():
+                        continue
+                    rows.append({
+                        "roi_pair": roi_a if roi_a == roi_b else f"{roi_a}-{roi_b}",
+                        "band": self.band[0],
+                        "condition": cond,
+                        "coherence": mats[0][block][keep].mean(),
+                        "plv": mats[1][block][keep].mean(),
+                    })
+        return pd.DataFrame(rows, columns=["roi_pair", "band", "condition", "coherence", "plv"])
@@ -0,0 +1,153 @@
+"""Online ERP averaging and the Go/NoGo peak sheets.
+
+Epochs are read from the (lazy) epoch arrays in bounded batches and
+folded into a running mean and sum of squared deviations per condition
+(Welford's update, merged batch-wise with Chan et al.'s formula), so
+memory is O(channels x times) however many epochs a session has. ROI
+averages are accumulated as extra rows, which gives their standard
+errors across epochs exactly rather than by pooling channel variances.
+"""
+import numpy as np
+import pandas as pd
+
+from .config import roi_indices
+from .jobs import check_cancelled
+
+# Bytes of epoch samples read per batch
+ERP_BATCH_BYTES = 64 << 20
+
+# Component -> (search window start s, end s, polarity); matches GoNoGo_summary.xlsx
+ERP_COMPONENTS = {
+    "N2": (0.20, 0.35, -1),
+    "P3": (0.30, 0.60, 1),
+}
+# Half-width (s) of the window around the peak used for the mean amplitude
+PEAK_MEAN_HALF_WIDTH = 0.025
+
+
+class RunningStats:
+    """Running count, mean and M2 over the first axis of streamed batches."""
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, batch):
+        batch = np.asarray(batch, dtype=np.float64)
+        n_b = batch.shape[0]
+        if not n_b:
+            return self
+        mean_b = batch.mean(axis=0)
+        m2_b = ((batch - mean_b) ** 2).sum(axis=0)
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * (n_b / n)
+        self.m2 += m2_b + delta ** 2 * (self.count * n_b / n)
+        self.count = n
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1); NaN with fewer than two epochs."""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.full_like(self.m2, np.nan)
+
+    @property
+    def sem(self):
+        return np.sqrt(self.variance / self.count) if self.count > 1 else np.full_like(self.m2, np.nan)
+
+
+def accumulate(epochs, rois, batch_bytes=ERP_BATCH_BYTES):
+    """Stream ``(n_epochs, n_channels, n_times)`` epochs into a :class:`RunningStats`.
+
+    Rows of the result are the channels followed by one pooled row per ROI.
+    """
+    n_epochs, n_channels, n_times = epochs.shape
+    stats = RunningStats((n_channels + len(rois), n_times))
+    rows = max(1, batch_bytes // max(n_channels * n_times * 8, 1))
+    for start in range(0, n_epochs, rows):
+        check_cancelled()
+        batch = np.asarray(epochs[start:start + rows], dtype=np.float64)
+        pooled = [batch[:, idx].mean(axis=1, keepdims=True) for idx in rois.values()]
+        stats.update(np.concatenate([batch] + pooled, axis=1))
+    return stats
+
+
+class ERP:
+    """Per-condition averages with standard errors, for channels and ROIs."""
+
+    def __init__(self, times, stats, ch_names, rois):
+        self.times = times
+        self.stats = stats            # {condition: RunningStats over channels + ROIs}
+        self.ch_names = ch_names
+        self.rois = rois              # {roi: channel indices}
+
+    @classmethod
+    def from_epochs(cls, epochs, **kwargs):
+        rois = roi_indices(epochs.ch_names)
+        stats = {cond: accumulate(data, rois, **kwargs) for cond, data in epochs.data.items()}
+        return cls(epochs.times, stats, epochs.ch_names, rois)
+
+    def roi_waveform(self, condition, roi):
+        """``(mean, sem, count)`` of one ROI's average waveform in µV."""
+        s = self.stats[condition]
+        row = len(self.ch_names) + list(self.rois).index(roi)
+        return s.mean[row], s.sem[row], s.count
+
+    def channel_waveforms(self, condition):
+        s = self.stats[condition]
+        return s.mean[:len(self.ch_names)], s.sem[:len(self.ch_names)]
+
+    def peaks_frame(self, components=ERP_COMPONENTS):
+        """The ``ERP_Peaks`` sheet: peak latency, peak and mean amplitude per component."""
+        rows = []
+        half = PEAK_MEAN_HALF_WIDTH
+        for cond in self.stats:
+            for roi in self.rois:
+                wave, _, count = self.roi_waveform(cond, roi)
+                for name, (lo, hi, sign) in components.items():
+                    window = np.flatnonzero((self.times >= lo) & (self.times <= hi))
+                    if not count or not len(window):
+                        continue
+                    peak = window[np.argmax(sign * wave[window])]
+                    latency = self.times[peak]
+                    around = (self.times >= latency - half) & (self.times <= latency + half)
+                    rows.append({
+                        "condition": cond,
+                        "roi": roi,
+                        "component": name,
+                        "peak_latency_ms": int(round(latency * 1000)),
+                        "mean_uV": wave[around].mean(),
+                        "peak_uV": wave[peak],
+                    })
+        columns = ["condition", "roi", "component", "peak_latency_ms", "mean_uV", "peak_uV"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def summary_frame(self, components=ERP_COMPONENTS):
+        """The ``ERP_Summary`` sheet: one row per condition x ROI, components side by side."""
+        rows = {}
+        for p in self.peaks_frame(components).itertuples(index=False):
+            row = rows.setdefault((p.condition, p.roi), {"condition": p.condition, "roi": p.roi})
+            row[f"{p.component}_mean_uV"] = p.mean_uV
+            row[f"{p.component}_latency_ms"] = p.peak_latency_ms
+        columns = ["condition", "roi"]
+        for name in components:
+            columns += [f"{name}_mean_uV", f"{name}_latency_ms"]
+        return pd.DataFrame(list(rows.values()), columns=columns)
+
+    def waveform_frame(self):
+        """ROI waveforms in long form: mean, SEM and epoch count per time point."""
+        frames = []
+        for cond in self.stats:
+            for roi in self.rois:
+                mean, sem, count = self.roi_waveform(cond, roi)
+                frames.append(pd.DataFrame({
+                    "condition": cond,
+                    "roi": roi,
+                    "time_ms": np.round(self.times * 1000, 3),
+                    "mean_uV": mean,
+                    "sem_uV": sem,
+                    "n_epochs": count,
+                }))
+        columns = ["condition", "roi", "time_ms", "mean_uV", "sem_uV", "n_epochs"]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
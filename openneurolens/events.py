@@ -0,0 +1,66 @@
+"""Sorted event index over MNE-style ``(n, 3)`` event arrays.
+
+Onsets and codes live in two parallel NumPy arrays sorted by onset, so
+selecting a condition is one vectorized mask and finding the events in a
+sample range is two binary searches, however many markers a session has.
+"""
+import numpy as np
+
+
+class EventIndex:
+    """Time-ordered event onsets (samples) and codes."""
+
+    def __init__(self, onsets, codes, previous=None):
+        onsets = np.asarray(onsets, dtype=np.int64)
+        order = np.argsort(onsets, kind="stable")
+        self.onsets = onsets[order]
+        self.codes = np.asarray(codes, dtype=np.int64)[order]
+        self.previous = (
+            np.zeros_like(self.onsets) if previous is None else np.asarray(previous, dtype=np.int64)[order]
+        )
+
+    @classmethod
+    def from_array(cls, events):
+        events = np.asarray(events, dtype=np.int64).reshape(-1, 3)
+        return cls(events[:, 0], events[:, 2], events[:, 1])
+
+    def to_array(self):
+        """Back to an ``(n, 3)`` ``[sample, previous, code]`` array."""
+        return np.column_stack([self.onsets, self.previous, self.codes])
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def _subset(self, index):
+        sub = EventIndex.__new__(EventIndex)
+        sub.onsets = self.onsets[index]
+        sub.codes = self.codes[index]
+        sub.previous = self.previous[index]
+        return sub
+
+    def mask(self, codes):
+        """Boolean mask of events whose code is one of ``codes`` (an int or iterable)."""
+        codes = [codes] if np.isscalar(codes) else list(codes)
+        return np.isin(self.codes, np.asarray(codes, dtype=np.int64))
+
+    def select(self, codes):
+        """Events whose code is one of ``codes``, still time-ordered."""
+        return self._subset(self.mask(codes))
+
+    def span(self, start, stop):
+        """``slice`` of the events with ``start <= onset < stop`` (binary search)."""
+        return slice(int(np.searchsorted(self.onsets, start, "left")),
+                     int(np.searchsorted(self.onsets, stop, "left")))
+
+    def between(self, start, stop):
+        """Events with ``start <= onset < stop``."""
+        return self._subset(self.span(start, stop))
+
+    def in_bounds(self, first_offset, last_offset, n_samples):
+        """Mask of events whose ``[onset + first_offset, onset + last_offset]`` fits the recording."""
+        return (self.onsets + first_offset >= 0) & (self.onsets + last_offset < n_samples)
+
+    def counts(self):
+        """``{code: number of events}``."""
+        codes, counts = np.unique(self.codes, return_counts=True)
+        return dict(zip(codes.tolist(), counts.tolist()))
@@ -0,0 +1,96 @@
+"""Writers for a processed report in the page's "Export Format" choices.
+
+A report (see :func:`openneurolens.pipeline.run_report`) is written into
+one directory: the tables as an Excel workbook (one sheet per table), one
+CSV file per table, or a single JSON document, plus the figures as PNG
+files under ``figures/`` when the run included them.
+"""
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+# "Export Format" selection -> writer key
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": "xlsx",
+    "CSV (.csv)": "csv",
+    "JSON (.json)": "json",
+}
+
+FIGURE_DIR = "figures"
+
+# Excel limits sheet names to 31 characters
+SHEET_NAME_CHARS = 31
+
+
+def export_format(value):
+    """Writer key for an "Export Format" label (or a bare ``xlsx``/``csv``/``json``)."""
+    key = EXPORT_FORMATS.get(value, str(value).strip().lower().lstrip("."))
+    if key not in EXPORT_FORMATS.values():
+        raise ValueError(f"Unknown export format {value!r}; choose one of {', '.join(EXPORT_FORMATS)}")
+    return key
+
+
+def slug(text):
+    """File-name-safe version of a table or figure caption."""
+    return re.sub(r"[^0-9A-Za-z]+", "_", str(text)).strip("_") or "figure"
+
+
+def report_tables(report):
+    """``{name: DataFrame}`` of a report, led by a one-row ``Recording`` table."""
+    tables = {"Recording": pd.DataFrame([report["recording"]])}
+    tables.update(report["tables"])
+    return tables
+
+
+# -------------------------------
+# Writers
+# -------------------------------
+def _write_xlsx(tables, directory, name):
+    path = directory / f"{name}.xlsx"
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for table, df in tables.items():
+            df.to_excel(writer, sheet_name=table[:SHEET_NAME_CHARS], index=False)
+    return [path]
+
+
+def _write_csv(tables, directory, name):
+    paths = []
+    for table, df in tables.items():
+        path = directory / f"{name}_{slug(table)}.csv"
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def _write_json(tables, directory, name):
+    path = directory / f"{name}.json"
+    # pandas serialises each table (NaN -> null, numpy scalars); only the outer object is assembled here
+    body = ",\n".join(f" {json.dumps(table)}: {df.to_json(orient='records')}" for table, df in tables.items())
+    path.write_text("{\n" + body + "\n}\n", encoding="utf-8")
+    return [path]
+
+
+WRITERS = {"xlsx": _write_xlsx, "csv": _write_csv, "json": _write_json}
+
+
+def write_figures(figures, directory):
+    """Write ``{caption: png bytes}`` as ``directory/<caption>.png``; returns the paths."""
+    paths = []
+    if figures:
+        directory.mkdir(parents=True, exist_ok=True)
+    for caption, png in figures.items():
+        path = directory / f"{slug(caption)}.png"
+        path.write_bytes(png)
+        paths.append(path)
+    return paths
+
+
+def write_report(report, directory, name, fmt="xlsx"):
+    """Write ``report`` into ``directory`` as ``name.<fmt>`` (plus figures); returns the paths written."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = WRITERS[export_format(fmt)](report_tables(report), directory, name)
+    paths += write_figures(report.get("figures") or {}, directory / FIGURE_DIR)
+    return paths
@@ -0,0 +1,328 @@
+"""Report figures rendered off the page thread with a decimating, cached Agg pipeline.
+
+Figures are drawn on a bare :class:`matplotlib.figure.Figure` with the
+Agg canvas (no pyplot state, safe in the job threads) and returned as
+PNG bytes. Long traces are reduced before plotting: the continuous
+overview keeps the min/max envelope of each pixel column, computed in
+one streaming pass, and waveforms/spectra longer than ``MAX_POINTS`` are
+thinned with largest-triangle-three-buckets (LTTB). PNGs are cached on
+disk keyed on a hash of the plotted data and the display settings, so
+toggling a display option back and forth never redraws.
+"""
+import hashlib
+import io
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from . import ingest
+from .cache import CACHE_DIR, ResultCache
+from .config import FREQUENCY_BANDS
+from .erp import ERP_COMPONENTS
+
+# "Figure Size" selection -> inches at FIGURE_DPI
+FIGURE_SIZES = {"Small": (6.0, 3.2), "Medium": (8.0, 4.2), "Large": (11.0, 5.6)}
+FIGURE_DPI = 100
+
+THEMES = {
+    "light": {
+        "face": "white", "fg": "#222222", "grid": "#dddddd",
+        "lines": ("#1f77b4", "#d62728", "#2ca02c", "#9467bd"),
+    },
+    "dark": {
+        "face": "#0e1117", "fg": "#e6e6e6", "grid": "#333a45",
+        "lines": ("#4fa3ff", "#ff6b6b", "#5fd068", "#c39bff"),
+    },
+}
+
+# Points kept per plotted line; the overview uses one min/max pair per pixel column
+MAX_POINTS = 2000
+OVERVIEW_CHANNELS = 8
+
+_figure_cache = ResultCache(CACHE_DIR / "figures", max_bytes=256 << 20)
+
+
+class FigureStyle:
+    """Display settings that change how a figure looks but not what it shows."""
+
+    def __init__(self, size="Medium", theme="light", annotations=True):
+        self.size = size if size in FIGURE_SIZES else "Medium"
+        self.theme = theme if theme in THEMES else "light"
+        self.annotations = bool(annotations)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.figure_size, config.theme, config.show_annotations)
+
+    @property
+    def key(self):
+        return f"{self.size}|{self.theme}|{int(self.annotations)}"
+
+    @property
+    def pixels(self):
+        return int(FIGURE_SIZES[self.size][0] * FIGURE_DPI)
+
+
+# -------------------------------
+# Decimation
+# -------------------------------
+def lttb(x, y, n_out):
+    """Largest-triangle-three-buckets downsampling of one line to ``n_out`` points."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.asarray(x), np.asarray(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        a, b = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        c_end = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[b:c_end].mean(), y[b:c_end].mean()
+        area = np.abs((x[prev] - cx) * (y[a:b] - y[prev]) - (x[prev] - x[a:b]) * (cy - y[prev]))
+        prev = a + int(np.argmax(area))
+        keep[i + 1] = prev
+    return x[keep], y[keep]
+
+
+def envelope(data, n_bins, picks=None, block_samples=ingest.BLOCK_SAMPLES):
+    """Per-bin ``(lo, hi)`` of the ``picks`` channels in one streaming pass.
+
+    Returns ``(starts, lo, hi)`` where ``starts`` are the first sample of
+    each bin and ``lo``/``hi`` are ``(n_picks, n_bins)``.
+    """
+    picks = list(range(data.shape[0])) if picks is None else list(picks)
+    n = data.shape[-1]
+    width = max(1, -(-n // max(n_bins, 1)))
+    n_bins = -(-n // width)
+    lo = np.empty((len(picks), n_bins))
+    hi = np.empty((len(picks), n_bins))
+    # Blocks are whole numbers of bins so no bin straddles two blocks
+    step = max(width, block_samples // width * width)
+    for start, stop in ingest.block_ranges(n, step):
+        block = np.asarray(data[picks, start:stop], dtype=np.float64)
+        b0 = start // width
+        full = block.shape[-1] // width
+        if full:
+            shaped = block[:, :full * width].reshape(block.shape[0], full, width)
+            lo[:, b0:b0 + full] = shaped.min(axis=-1)
+            hi[:, b0:b0 + full] = shaped.max(axis=-1)
+        if block.shape[-1] % width:
+            lo[:, b0 + full] = block[:, full * width:].min(axis=-1)
+            hi[:, b0 + full] = block[:, full * width:].max(axis=-1)
+    return np.arange(n_bins) * width, lo, hi
+
+
+# -------------------------------
+# Rendering and caching
+# -------------------------------
+def data_digest(*arrays):
+    digest = hashlib.blake2b(digest_size=20)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        digest.update(f"{a.dtype.str}{a.shape}".encode("ascii"))
+        digest.update(a.tobytes())
+    return digest.hexdigest()
+
+
+def _new_axes(style):
+    theme = THEMES[style.theme]
+    fig = Figure(figsize=FIGURE_SIZES[style.size], dpi=FIGURE_DPI, facecolor=theme["face"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1, facecolor=theme["face"])
+    ax.tick_params(colors=theme["fg"])
+    for spine in ax.spines.values():
+        spine.set_color(theme["fg"])
+    ax.grid(True, color=theme["grid"], linewidth=0.6)
+    return fig, ax, theme
+
+
+def _finish(fig, ax, theme, title, xlabel, ylabel, legend=True):
+    ax.set_title(title, color=theme["fg"])
+    ax.set_xlabel(xlabel, color=theme["fg"])
+    ax.set_ylabel(ylabel, color=theme["fg"])
+    if legend and ax.get_legend_handles_labels()[0]:
+        leg = ax.legend(frameon=False, fontsize="small")
+        for text in leg.get_texts():
+            text.set_color(theme["fg"])
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", facecolor=fig.get_facecolor())
+    return buf.getvalue()
+
+
+def cached_png(kind, arrays, style, draw, digest=None):
+    """PNG bytes for ``draw(style)``, cached under ``digest`` (default: a hash of ``arrays``) and ``style``."""
+    text = f"{kind}|{digest or data_digest(*arrays)}|{style.key}"
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+    png = _figure_cache.get(key)
+    if png is None:
+        png = draw(style)
+        _figure_cache.put(key, png)
+    return png
+
+
+# -------------------------------
+# Figures
+# -------------------------------
+def overview_figure(data, sfreq, ch_names, events, style, conditions=None, data_key=None):
+    """Stacked min/max envelopes of the first channels with event markers.
+
+    ``data_key`` identifies ``data`` and ``events`` (e.g. the key of the
+    pipeline stage that produced them). With it the cache is consulted
+    before the recording is scanned, so a display-only change that hits
+    the cache never reads the data again.
+    """
+    picks = list(range(min(OVERVIEW_CHANNELS, len(ch_names))))
+    onsets = events[:, 0] / sfreq if len(events) else np.zeros(0)
+
+    def trace():
+        starts, lo, hi = envelope(data, style.pixels, picks)
+        return starts / sfreq, lo, hi
+
+    def draw(style, times, lo, hi):
+        spacing = np.nanpercentile(hi - lo, 95) * 1.5 if lo.size else 1.0
+        spacing = spacing if spacing > 0 else 1.0
+        fig, ax, theme = _new_axes(style)
+        for k in range(len(picks)):
+            offset = -k * spacing
+            ax.fill_between(times, lo[k] + offset, hi[k] + offset, color=theme["lines"][0], linewidth=0.3)
+        ax.set_yticks([-k * spacing for k in range(len(picks))], [ch_names[i] for i in picks])
+        if style.annotations and len(onsets):
+            codes = dict((v, k) for k, v in (conditions or {}).items())
+            for j, code in enumerate(np.unique(events[:, 2])):
+                mask = events[:, 2] == code
+                ax.vlines(onsets[mask], -(len(picks) - 0.5) * spacing, 0.5 * spacing, linewidth=0.4,
+                          color=theme["lines"][1 + j % 3], alpha=0.6, label=codes.get(code, f"code {code}"))
+        ax.set_xlim(0, data.shape[-1] / sfreq)
+        return _finish(fig, ax, theme, "Processed recording", "Time (s)", "")
+
+    if data_key is None:
+        times, lo, hi = trace()
+        return cached_png("overview", (lo, hi, times, events), style, lambda s: draw(s, times, lo, hi))
+    digest = f"{data_key}|{sfreq!r}|{[ch_names[i] for i in picks]}|{sorted((conditions or {}).items())}"
+    return cached_png("overview", (), style, lambda s: draw(s, *trace()), digest=digest)
+
+
+def erp_figure(erp, roi, style):
+    """Condition ERPs of one ROI with ±1 SEM bands."""
+    waves = {cond: erp.roi_waveform(cond, roi) for cond in erp.stats}
+    times_ms = erp.times * 1000
+
+    def draw(style):
+        fig, ax, theme = _new_axes(style)
+        for j, (cond, (mean, sem, count)) in enumerate(waves.items()):
+            color = theme["lines"][j % len(theme["lines"])]
+            t, m = lttb(times_ms, mean, MAX_POINTS)
+            ax.plot(t, m, color=color, linewidth=1.4, label=f"{cond} (n={count})")
+            if count > 1:
+                ax.fill_between(times_ms, mean - sem, mean + sem, color=color, alpha=0.2, linewidth=0)
+        if style.annotations:
+            ax.axvline(0, color=theme["fg"], linewidth=0.8, linestyle="--")
+            for name, (lo, hi, _) in ERP_COMPONENTS.items():
+                ax.axvspan(lo * 1000, hi * 1000, color=theme["grid"], alpha=0.35)
+                ax.text((lo + hi) * 500, 1.0, name, transform=ax.get_xaxis_transform(), ha="center", va="top",
+                        color=theme["fg"], fontsize="small")
+        ax.axhline(0, color=theme["fg"], linewidth=0.5)
+        return _finish(fig, ax, theme, f"ERP - {roi}", "Time (ms)", "Amplitude (µV)")
+
+    arrays = [times_ms] + [a for mean, sem, _ in waves.values() for a in (mean, sem)]
+    return cached_png("erp", arrays, style, draw)
+
+
+def psd_figure(spectra, roi, style):
+    """Condition PSDs of one ROI on a log scale with the canonical bands shaded."""
+    roi_psd = {cond: psd for (cond, r), psd in spectra.roi_psd().items() if r == roi}
+    freqs = spectra.freqs
+    shown = (freqs >= 1) & (freqs <= min(freqs[-1], 80))
+
+    def draw(style):
+        fig, ax, theme = _new_axes(style)
+        for j, (cond, psd) in enumerate(roi_psd.items()):
+            f, p = lttb(freqs[shown], psd[shown], MAX_POINTS)
+            ax.semilogy(f, p, color=theme["lines"][j % len(theme["lines"])], linewidth=1.4, label=cond)
+        if style.annotations:
+            for k, (name, (lo, hi)) in enumerate(FREQUENCY_BANDS.items()):
+                if lo < freqs[shown][-1]:
+                    ax.axvspan(lo, min(hi, freqs[shown][-1]), color=theme["grid"], alpha=0.25 + 0.15 * (k % 2))
+                    ax.text((lo + min(hi, freqs[shown][-1])) / 2, 1.0, name, transform=ax.get_xaxis_transform(),
+                            ha="center", va="top", color=theme["fg"], fontsize="small")
+        return _finish(fig, ax, theme, f"Power Spectrum - {roi}", "Frequency (Hz)", "PSD (µV²/Hz)")
+
+    return cached_png("psd", [freqs] + list(roi_psd.values()), style, draw)
+
+
+def tfr_figure(tfr, roi, condition, style):
+    """Baseline-normalised (dB) time-frequency power of one ROI and condition."""
+    power = tfr.roi_power()[(condition, roi)]
+    base = tfr.times < 0
+    ref = power[:, base].mean(axis=1, keepdims=True) if base.any() else power.mean(axis=1, keepdims=True)
+    db = 10 * np.log10(np.where(ref > 0, power / ref, np.nan))
+    # Display at most one column per pixel
+    step = max(1, len(tfr.times) // style.pixels)
+    db_shown, times_shown = db[:, ::step], tfr.times[::step]
+
+    def draw(style):
+        fig, ax, theme = _new_axes(style)
+        ax.grid(False)
+        lim = np.nanmax(np.abs(db_shown)) if np.isfinite(db_shown).any() else 1.0
+        mesh = ax.pcolormesh(times_shown * 1000, tfr.freqs, db_shown, cmap="RdBu_r", vmin=-lim, vmax=lim,
+                             shading="auto")
+        cbar = fig.colorbar(mesh, ax=ax)
+        cbar.set_label("dB vs baseline", color=theme["fg"])
+        cbar.ax.tick_params(colors=theme["fg"])
+        if style.annotations:
+            ax.axvline(0, color=theme["fg"], linewidth=0.8, linestyle="--")
+        return _finish(fig, ax, theme, f"Time-Frequency - {roi} {condition}", "Time (ms)", "Frequency (Hz)",
+                       legend=False)
+
+    return cached_png("tfr", [db_shown, times_shown, tfr.freqs], style, draw)
+
+
+def connectivity_figure(conn, condition, style, metric="coherence"):
+    """Channel x channel matrix of one connectivity metric."""
+    matrix = conn.matrix(condition, metric)
+
+    def draw(style):
+        fig, ax, theme = _new_axes(style)
+        ax.grid(False)
+        image = ax.imshow(matrix, vmin=0, vmax=1, cmap="viridis", interpolation="nearest")
+        cbar = fig.colorbar(image, ax=ax)
+        cbar.ax.tick_params(colors=theme["fg"])
+        if style.annotations and len(conn.ch_names) <= 32:
+            ticks = np.arange(len(conn.ch_names))
+            ax.set_xticks(ticks, conn.ch_names, rotation=90, fontsize="x-small")
+            ax.set_yticks(ticks, conn.ch_names, fontsize="x-small")
+        label = "PLV" if metric == "plv" else metric.capitalize()
+        return _finish(fig, ax, theme, f"{label} ({conn.band[0]}) - {condition}", "", "", legend=False)
+
+    return cached_png(f"conn-{metric}", [matrix], style, draw)
+
+
+def report_figures(style, recording=None, data=None, analysis=None, conditions=None, data_key=None):
+    """``{caption: png}`` for the processed recording and the analysis results.
+
+    ``data_key`` identifies ``data`` for the overview cache (see :func:`overview_figure`).
+    """
+    figures = {}
+    if recording is not None and data is not None:
+        figures["Processed recording"] = overview_figure(
+            data, recording.sfreq, recording.ch_names, recording.events, style, conditions, data_key
+        )
+    analysis = analysis or {}
+    if "erp" in analysis:
+        for roi in analysis["erp"].rois:
+            figures[f"ERP - {roi} Go/NoGo"] = erp_figure(analysis["erp"], roi, style)
+    if "spectra" in analysis:
+        rois = {roi for _, roi in analysis["spectra"].roi_psd()}
+        for roi in sorted(rois):
+            figures[f"Power Spectrum - {roi} Go/NoGo"] = psd_figure(analysis["spectra"], roi, style)
+    if "tfr" in analysis:
+        for cond, roi in analysis["tfr"].roi_power():
+            figures[f"Time-Frequency - {roi} {cond}"] = tfr_figure(analysis["tfr"], roi, cond, style)
+    if "connectivity" in analysis:
+        for cond in analysis["connectivity"].values:
+            figures[f"Coherence - {cond}"] = connectivity_figure(analysis["connectivity"], cond, style)
+    return figures
@@ -0,0 +1,306 @@
+"""Group-level statistics across many subjects' Go/NoGo summaries.
+
+Each subject contributes its summary sheets (an example ``GoNoGo_summary_*.xlsx``
+workbook, or a batch output in any export format). The per-subject values
+of every measure are folded into running counts, means and sums of squared
+deviations keyed by the sheet's key columns (condition, ROI, component,
+band, time point...), and accumulators are merged pairwise with Chan et
+al.'s formula, the same update :class:`openneurolens.erp.RunningStats`
+uses for epochs. Workers each reduce a chunk of subjects, reading one
+summary at a time, and only their small accumulators come back to be
+merged, so the cost is dominated by reading the summaries::
+
+    python -m openneurolens.group static/ --output group/ --workers 8
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import export
+from .parallel import CPU_COUNT
+from .workbooks import Workbook
+
+# Summary sheet -> (key columns, measures averaged across subjects)
+GROUP_SHEETS = {
+    "ERP_Peaks": (("condition", "roi", "component"), ("peak_latency_ms", "mean_uV", "peak_uV")),
+    "ERP_Waveforms": (("condition", "roi", "time_ms"), ("mean_uV",)),
+    "Bandpower": (("condition", "roi", "band"), ("power_uV2", "relative_power", "power_dB")),
+    "Artifact_Summary": (("condition",), ("total", "kept", "dropped")),
+}
+
+# A pool only pays for its start-up with at least this many subjects per worker
+MIN_SUBJECTS_PER_WORKER = 8
+# Chunks per worker, so a few slow summaries do not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+# Files next to batch outputs that are not subject summaries
+IGNORED_NAMES = ("settings.json", "manifest.json")
+
+SUBJECT_COLUMNS = ["subject", "status", "sheets", "error"]
+
+
+class TableStats:
+    """Across-subject count, mean and M2 of a sheet's measures, one row per key.
+
+    Rows are added as keys are first seen; ``rows`` maps a key tuple to its
+    row in the ``(n_keys, n_measures)`` arrays, so adding a subject is a
+    lookup plus a vectorised update rather than a DataFrame alignment.
+    """
+
+    def __init__(self, keys, measures):
+        self.keys = tuple(keys)
+        self.measures = tuple(measures)
+        self.rows = {}
+        self.count = np.zeros((0, len(self.measures)), dtype=np.int64)
+        self.mean = np.zeros((0, len(self.measures)))
+        self.m2 = np.zeros((0, len(self.measures)))
+        # Subjects share their key layout, so the last one's row lookup is usually reusable
+        self._last = (None, None)
+
+    def _row_indices(self, keys):
+        """Row of every key tuple, growing the arrays for keys not seen before."""
+        n_before = len(self.rows)
+        idx = np.fromiter((self.rows.setdefault(k, len(self.rows)) for k in keys), dtype=np.intp, count=len(keys))
+        grow = len(self.rows) - n_before
+        if grow:
+            pad = ((0, grow), (0, 0))
+            self.count, self.mean, self.m2 = (np.pad(a, pad) for a in (self.count, self.mean, self.m2))
+        return idx
+
+    def add(self, frame):
+        """Fold in one subject's sheet; rows repeating a key are averaged so each subject counts once."""
+        # Plain arrays from here on: per-subject DataFrame operations would cost more than reading the sheet
+        columns = set(frame.columns)
+        key_columns = [frame[k].to_numpy() for k in self.keys]
+        keep = ~np.logical_or.reduce([pd.isna(c) for c in key_columns])
+        values = np.full((int(keep.sum()), len(self.measures)), np.nan)
+        for j, m in enumerate(self.measures):
+            if m in columns:
+                column = frame[m].to_numpy()[keep]
+                values[:, j] = column if column.dtype.kind in "fiub" else pd.to_numeric(column, errors="coerce")
+        keys = tuple(zip(*(c[keep].tolist() for c in key_columns)))
+        if keys == self._last[0]:
+            idx = self._last[1]
+        else:
+            idx = self._row_indices(keys)
+            self._last = (keys, idx)
+        if len(np.unique(idx)) < len(idx):
+            idx, inverse = np.unique(idx, return_inverse=True)
+            valid = ~np.isnan(values)
+            sums = np.zeros((len(idx), values.shape[1]))
+            hits = np.zeros((len(idx), values.shape[1]))
+            np.add.at(sums, inverse, np.where(valid, values, 0.0))
+            np.add.at(hits, inverse, valid)
+            values = np.where(hits > 0, sums / np.maximum(hits, 1), np.nan)
+        # Welford's update with one value per key and measure
+        valid = ~np.isnan(values)
+        count = self.count[idx] + valid
+        delta = np.where(valid, values - self.mean[idx], 0.0)
+        mean = self.mean[idx] + delta / np.maximum(count, 1)
+        self.m2[idx] += delta * np.where(valid, values - mean, 0.0)
+        self.mean[idx] = mean
+        self.count[idx] = count
+        return self
+
+    def merge(self, other):
+        """Fold in another accumulator over the same measures (Chan et al.'s formula)."""
+        idx = self._row_indices(list(other.rows))
+        n_a, n_b = self.count[idx], other.count
+        n = n_a + n_b
+        delta = other.mean - self.mean[idx]
+        self.mean[idx] += delta * (n_b / np.maximum(n, 1))
+        self.m2[idx] += other.m2 + delta ** 2 * (n_a * n_b / np.maximum(n, 1))
+        self.count[idx] = n
+        return self
+
+    def frame(self):
+        """Long-form group table: key columns, then ``measure``, ``n_subjects``, ``mean``, ``sd``, ``sem``."""
+        n_keys, n_measures = self.count.shape
+        count = self.count.ravel()
+        # Sample variance across subjects (ddof=1); NaN with fewer than two subjects
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.where(count > 1, np.sqrt(self.m2.ravel() / (count - 1)), np.nan)
+            sem = sd / np.sqrt(count)
+        keys = list(self.rows)
+        out = pd.DataFrame({
+            **{name: np.repeat(np.array([k[i] for k in keys], dtype=object), n_measures)
+               for i, name in enumerate(self.keys)},
+            "measure": np.tile(np.array(self.measures, dtype=object), n_keys),
+            "n_subjects": count,
+            "mean": self.mean.ravel(),
+            "sd": sd,
+            "sem": sem,
+        })
+        out = out[out["n_subjects"] > 0].reset_index(drop=True)
+        return out.infer_objects()
+
+
+def merge_stats(a, b):
+    """Fold the ``{sheet: TableStats}`` accumulator ``b`` into ``a`` and return ``a``."""
+    for sheet, stats in b.items():
+        if sheet in a:
+            a[sheet].merge(stats)
+        else:
+            a[sheet] = stats
+    return a
+
+
+# -------------------------------
+# Subject summaries
+# -------------------------------
+def _csv_tables(directory, sheets=GROUP_SHEETS):
+    """``{sheet: path}`` of the per-table CSV files a batch wrote into ``directory``."""
+    found = {}
+    for sheet in sheets:
+        matches = sorted(Path(directory).glob(f"*_{export.slug(sheet)}.csv"))
+        if matches:
+            found[sheet] = matches[0]
+    return found
+
+
+def read_summary(path, sheets=GROUP_SHEETS):
+    """``{sheet: DataFrame}`` of the wanted sheets in one subject's summary.
+
+    ``path`` is an ``.xlsx`` workbook (read from its columnar sidecar), a
+    JSON report or a directory of per-table CSV files written by the batch.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return {sheet: pd.read_csv(csv) for sheet, csv in _csv_tables(path, sheets).items()}
+    if path.suffix.lower() == ".json":
+        data = json.loads(path.read_text("utf-8"))
+        return {sheet: pd.DataFrame(data[sheet]) for sheet in sheets if sheet in data}
+    book = Workbook(path)
+    return {sheet: book.sheet(sheet) for sheet in sheets if sheet in book.sheet_names}
+
+
+def find_summaries(root, sheets=GROUP_SHEETS, exclude=None):
+    """Subject summaries under ``root``: workbooks, JSON reports and directories of CSV tables."""
+    root = Path(root)
+    exclude = Path(exclude).resolve() if exclude is not None else None
+    found = set()
+    for path in root.rglob("*"):
+        name = path.name.lower()
+        if not path.is_file() or name in IGNORED_NAMES or name.startswith(("~$", ".")):
+            continue
+        if exclude is not None and exclude in path.resolve().parents:
+            continue
+        if path.suffix.lower() in (".xlsx", ".json"):
+            found.add(path)
+        elif path.suffix.lower() == ".csv" and any(name.endswith(f"_{export.slug(s).lower()}.csv") for s in sheets):
+            found.add(path.parent)
+    return sorted(found)
+
+
+def add_subject(stats, path, sheets=GROUP_SHEETS):
+    """The map step: fold one subject's summary into ``stats``; returns the sheets it contributed."""
+    used = []
+    for sheet, frame in read_summary(path, sheets).items():
+        keys, measures = sheets[sheet]
+        columns = set(frame.columns)
+        if columns.issuperset(keys) and columns.intersection(measures):
+            if sheet not in stats:
+                stats[sheet] = TableStats(keys, measures)
+            stats[sheet].add(frame)
+            used.append(sheet)
+    return used
+
+
+def _reduce_chunk(subjects, sheets):
+    """Fold ``[(label, path)]`` into one accumulator; returns it with a status row per subject."""
+    stats, rows = {}, []
+    for label, path in subjects:
+        try:
+            used = add_subject(stats, path, sheets)
+        except Exception as e:
+            rows.append({"subject": label, "status": "failed", "sheets": "", "error": repr(e)})
+            continue
+        rows.append({"subject": label, "status": "included" if used else "no group sheets",
+                     "sheets": ", ".join(used), "error": None})
+    return stats, rows
+
+
+# -------------------------------
+# Group summary
+# -------------------------------
+class GroupSummary:
+    """Merged accumulators of every subject plus the per-subject status rows."""
+
+    def __init__(self, stats, subjects):
+        self.stats = stats
+        self.subjects = subjects
+
+    @property
+    def n_subjects(self):
+        return int((self.subjects["status"] == "included").sum())
+
+    def tables(self):
+        """``{name: DataFrame}``: ``Group_<sheet>`` per aggregated sheet and ``Subjects``."""
+        tables = {f"Group_{sheet}": stats.frame() for sheet, stats in self.stats.items()}
+        tables["Subjects"] = self.subjects
+        return tables
+
+    def write(self, directory, name="group_summary", fmt="xlsx"):
+        """Write the tables in an export format (see :mod:`openneurolens.export`); returns the paths."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        return export.WRITERS[export.export_format(fmt)](self.tables(), directory, name)
+
+
+def aggregate(subjects, workers=CPU_COUNT, sheets=GROUP_SHEETS):
+    """Map-reduce ``subjects`` (paths, or ``(label, path)`` pairs) into a :class:`GroupSummary`.
+
+    Subjects are split into contiguous chunks; each worker reduces its
+    chunks one summary at a time and returns only the accumulators, which
+    are merged here in subject order.
+    """
+    subjects = [s if isinstance(s, tuple) else (str(s), s) for s in subjects]
+    workers = max(1, min(workers, len(subjects) // MIN_SUBJECTS_PER_WORKER))
+    if workers == 1:
+        results = [_reduce_chunk(subjects, sheets)]
+    else:
+        size = math.ceil(len(subjects) / (workers * CHUNKS_PER_WORKER))
+        chunks = [subjects[i:i + size] for i in range(0, len(subjects), size)]
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) as pool:
+            results = list(pool.map(_reduce_chunk, chunks, [sheets] * len(chunks)))
+    stats, rows = {}, []
+    for chunk_stats, chunk_rows in results:
+        stats = merge_stats(stats, chunk_stats)
+        rows += chunk_rows
+    return GroupSummary(stats, pd.DataFrame(rows, columns=SUBJECT_COLUMNS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="subject summaries, or directories to search for them")
+    parser.add_argument("--output", default="group_results", help="directory for the group summary")
+    parser.add_argument("--export-format", default="xlsx", help="xlsx, csv or json")
+    parser.add_argument("--workers", type=int, default=CPU_COUNT)
+    args = parser.parse_args(argv)
+
+    subjects = []
+    for item in map(Path, args.inputs):
+        if item.is_dir() and not _csv_tables(item):
+            subjects += [(str(p.relative_to(item)), p) for p in find_summaries(item, exclude=args.output)]
+        else:
+            subjects.append((str(item), item))
+    if not subjects:
+        parser.exit(2, "error: no subject summaries found\n")
+    summary = aggregate(subjects, args.workers)
+    paths = summary.write(args.output, fmt=args.export_format)
+    print(f"{summary.n_subjects} of {len(subjects)} subject(s) aggregated into {', '.join(map(str, paths))}")
+    skipped = summary.subjects[summary.subjects["status"] != "included"]
+    if len(skipped):
+        print(skipped.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
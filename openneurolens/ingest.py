@@ -0,0 +1,147 @@
+"""Memory-bounded ingest: spool uploads to disk and stream fixed-size sample blocks.
+
+Nothing in here ever holds more than one block of samples in RAM. Whole
+recordings live in disk-backed ``np.memmap`` arrays created by
+:func:`scratch_array`, which the pipeline then walks block by block.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .jobs import check_cancelled
+
+# Samples per block handed to the pipeline (256 ch x 16384 x 8 B = 32 MB)
+BLOCK_SAMPLES = 16384
+# Bytes per read when copying an upload to disk
+COPY_CHUNK_BYTES = 1 << 20
+# Arrays smaller than this stay in RAM instead of going to a temp file
+IN_MEMORY_LIMIT_BYTES = 64 << 20
+
+
+def spool_upload(uploaded_file, directory=None, chunk_bytes=COPY_CHUNK_BYTES):
+    """Copy an upload (any file-like with ``name``) to a temp file and return its path."""
+    suffix = Path(getattr(uploaded_file, "name", "")).suffix.lower()
+    uploaded_file.seek(0)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(fd, "wb") as fh:
+        shutil.copyfileobj(uploaded_file, fh, chunk_bytes)
+    return Path(path)
+
+
+def spool_uploads(uploaded_files, chunk_bytes=COPY_CHUNK_BYTES):
+    """Spool several uploads into one fresh temp directory, keeping their names.
+
+    Multi-file formats (BrainVision) reference their companions by file
+    name, so the names must survive spooling.
+    """
+    directory = Path(tempfile.mkdtemp(prefix="onl-upload-"))
+    for uploaded_file in uploaded_files:
+        uploaded_file.seek(0)
+        with open(directory / Path(uploaded_file.name).name, "wb") as fh:
+            shutil.copyfileobj(uploaded_file, fh, chunk_bytes)
+    return directory
+
+
+def remove_spool_dir(directory):
+    """Delete a directory created by :func:`spool_uploads`."""
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def remove_spool(path):
+    """Delete a spool file, ignoring files already gone or still mapped (Windows)."""
+    try:
+        Path(path).unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+@contextmanager
+def spooled(uploaded_file, directory=None):
+    """Context manager around :func:`spool_upload` that removes the spool file."""
+    path = spool_upload(uploaded_file, directory)
+    try:
+        yield path
+    finally:
+        remove_spool(path)
+
+
+def scratch_array(shape, dtype=np.float32):
+    """Zeroed array for intermediate data, disk-backed once it is large.
+
+    The backing file is anonymous (``tempfile.TemporaryFile``), so it
+    disappears as soon as the array is garbage collected.
+    """
+    dtype = np.dtype(dtype)
+    if int(np.prod(shape)) * dtype.itemsize <= IN_MEMORY_LIMIT_BYTES:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode="w+", shape=tuple(shape))
+
+
+def block_ranges(n_samples, block_samples=BLOCK_SAMPLES):
+    """``(start, stop)`` pairs covering ``range(n_samples)`` in fixed-size steps.
+
+    Checks for job cancellation before every block (see :func:`openneurolens.jobs.check_cancelled`).
+    """
+    for start in range(0, n_samples, block_samples):
+        check_cancelled()
+        yield start, min(start + block_samples, n_samples)
+
+
+def iter_array_blocks(data, block_samples=BLOCK_SAMPLES):
+    """Yield ``(start, block)`` from a channels x samples array (or memmap) as float64."""
+    for start, stop in block_ranges(data.shape[-1], block_samples):
+        yield start, np.array(data[:, start:stop], dtype=np.float64)
+
+
+def iter_csv_blocks(path, block_samples=BLOCK_SAMPLES, time_columns=(), event_columns=(),
+                    event_channel="Stimulus"):
+    """Stream a wide CSV as ``(ch_names, block, events)`` tuples.
+
+    ``block`` is channels x samples; ``events`` holds the MNE-style rows
+    whose onsets fall inside the block, with absolute sample indices.
+    """
+    start = 0
+    previous = 0
+    for df in pd.read_csv(path, chunksize=block_samples):
+        df = df.drop(columns=[c for c in df.columns if c in time_columns])
+        marker_cols = [c for c in df.columns if c in event_columns]
+        events = np.zeros((0, 3), dtype=np.int64)
+        if marker_cols:
+            col = event_channel if event_channel in marker_cols else marker_cols[0]
+            values = np.nan_to_num(df[col].to_numpy(dtype=np.float64)).astype(np.int64)
+            before = np.concatenate(([previous], values[:-1]))
+            onsets = np.flatnonzero((values != before) & (values != 0))
+            events = np.column_stack([onsets + start, before[onsets], values[onsets]])
+            previous = values[-1] if len(values) else previous
+            df = df.drop(columns=marker_cols)
+        block = df.to_numpy(dtype=np.float64).T
+        yield list(df.columns), block, events
+        start += block.shape[1]
+
+
+def collect_blocks(blocks, dtype=np.float32):
+    """Write streamed channels x n blocks to an anonymous temp file.
+
+    Returns a channels x samples view of a samples-major memmap, so
+    reading a time block back touches one contiguous region of the file.
+    """
+    fh = tempfile.TemporaryFile()
+    n_channels = None
+    n_samples = 0
+    for block in blocks:
+        if n_channels is None:
+            n_channels = block.shape[0]
+        elif block.shape[0] != n_channels:
+            raise ValueError(f"Block has {block.shape[0]} channels, expected {n_channels}")
+        fh.write(np.ascontiguousarray(block.T, dtype=dtype).tobytes())
+        n_samples += block.shape[1]
+    if not n_samples:
+        fh.close()
+        return np.zeros((n_channels or 0, 0), dtype=dtype)
+    fh.flush()
+    return np.memmap(fh, dtype=dtype, mode="r+", shape=(n_samples, n_channels)).T
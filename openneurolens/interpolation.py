@@ -0,0 +1,195 @@
+"""Bad-channel detection and spherical-spline repair with cached matrices.
+
+The interpolation matrix (Perrin et al., 1989) depends only on the
+montage, the channel list and the set of bad channels, so it is computed
+once per combination and kept both in-process and in a persistent
+:class:`~openneurolens.cache.ResultCache` under ``CACHE_DIR/interpolation``.
+Repairing a recording is then one ``(n_bad, n_good) @ (n_good, block)``
+matrix multiply per sample block.
+"""
+import functools
+import hashlib
+
+import numpy as np
+import pandas as pd
+from numpy.polynomial import legendre
+
+from . import ingest
+from .cache import CACHE_DIR, ResultCache
+
+# Spline stiffness, Legendre terms and regularisation used by MNE's interpolate_bads
+SPLINE_STIFFNESS = 4
+LEGENDRE_TERMS = 50
+SPLINE_ALPHA = 1e-5
+
+# A channel is bad when flat or when its log-std is this many robust SDs from the median
+FLAT_STD_UV = 0.5
+BAD_Z = 5.0
+
+# Newer MNE releases renamed the standard montages (same template positions)
+MONTAGE_ALIASES = {
+    "standard_1020": ("colin27_1020", "standard_1020"),
+    "standard_1005": ("colin27_1005", "standard_1005"),
+}
+
+_matrix_cache = ResultCache(CACHE_DIR / "interpolation", max_bytes=64 << 20)
+
+
+def builtin_montage(montage):
+    """The installed MNE name of ``montage``, preferring the non-deprecated alias."""
+    import mne
+
+    available = set(mne.channels.get_builtin_montages())
+    return next((n for n in MONTAGE_ALIASES.get(montage, (montage,)) if n in available), montage)
+
+
+@functools.lru_cache(maxsize=4)
+def montage_positions(montage):
+    """``{channel label (upper case): xyz}`` of an MNE standard montage."""
+    import mne
+
+    pos = mne.channels.make_standard_montage(builtin_montage(montage)).get_positions()["ch_pos"]
+    return {name.upper(): np.asarray(xyz, dtype=float) for name, xyz in pos.items()}
+
+
+@functools.lru_cache(maxsize=4)
+def head_positions(montage):
+    """``{channel label (upper case): xyz}`` of an MNE standard montage in head coordinates (fiducial frame)."""
+    import mne
+
+    template = mne.channels.make_standard_montage(builtin_montage(montage))
+    pos = template.get_positions()["ch_pos"]
+    xyz = mne.transforms.apply_trans(mne.channels.compute_native_head_t(template), np.array(list(pos.values())))
+    return {name.upper(): np.asarray(p, dtype=float) for name, p in zip(pos, xyz)}
+
+
+def _fit_sphere(points):
+    """Least-squares sphere centre of ``(n, 3)`` points."""
+    A = np.c_[2 * points, np.ones(len(points))]
+    b = (points ** 2).sum(axis=1)
+    return np.linalg.lstsq(A, b, rcond=None)[0][:3]
+
+
+def unit_positions(montage, ch_names):
+    """``(indices, (n, 3) unit vectors)`` of the channels in ``ch_names`` placed by ``montage``.
+
+    Positions are centred on their best-fit sphere before normalising.
+    """
+    positions = montage_positions(montage)
+    placed = np.array([i for i, name in enumerate(ch_names) if name.upper() in positions], dtype=np.int64)
+    if len(placed) < 4:
+        return placed, np.zeros((len(placed), 3))
+    xyz = np.array([positions[ch_names[i].upper()] for i in placed])
+    xyz -= _fit_sphere(xyz)
+    return placed, xyz / np.linalg.norm(xyz, axis=1, keepdims=True)
+
+
+def _legendre_g(cosang):
+    n = np.arange(1, LEGENDRE_TERMS + 1)
+    coeffs = np.r_[0.0, (2 * n + 1) / (n * (n + 1)) ** SPLINE_STIFFNESS / (4 * np.pi)]
+    return legendre.legval(np.clip(cosang, -1.0, 1.0), coeffs)
+
+
+def spline_matrix(pos_from, pos_to):
+    """``(n_to, n_from)`` spherical-spline interpolation matrix between unit vectors."""
+    G_from = _legendre_g(pos_from @ pos_from.T)
+    G_from.flat[::len(G_from) + 1] += SPLINE_ALPHA
+    G_to = _legendre_g(pos_to @ pos_from.T)
+    n = len(pos_from)
+    C = np.block([[G_from, np.ones((n, 1))], [np.ones((1, n)), np.zeros((1, 1))]])
+    return np.c_[G_to, np.ones((len(pos_to), 1))] @ np.linalg.pinv(C)[:, :-1]
+
+
+def matrix_key(montage, ch_names, bads):
+    text = "\n".join([montage, ",".join(ch_names), ",".join(bads)])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def interpolation_matrix(montage, ch_names, bads):
+    """``(good indices, bad indices, matrix)`` for a montage and a bad-channel set.
+
+    ``ch_names`` and ``bads`` are tuples. Channels without a position in
+    the montage are neither used as sources nor repaired.
+    """
+    placed, xyz = unit_positions(montage, ch_names)
+    bad_set = set(bads)
+    good = np.array([i for i in placed if ch_names[i] not in bad_set], dtype=np.int64)
+    bad = np.array([i for i in placed if ch_names[i] in bad_set], dtype=np.int64)
+    if len(good) < 3 or not len(bad):
+        # Nothing to repair (the common case): not worth a slot in the persistent cache
+        return good, np.zeros(0, dtype=np.int64), np.zeros((0, len(good)))
+
+    key = matrix_key(montage, ch_names, bads)
+    cached = _matrix_cache.get(key)
+    if cached is not None:
+        return cached
+    unit = dict(zip(placed, xyz))
+    matrix = spline_matrix(np.array([unit[i] for i in good]), np.array([unit[i] for i in bad]))
+    value = (good, bad, matrix)
+    _matrix_cache.put(key, value)
+    return value
+
+
+def channel_std(data, block_samples=ingest.BLOCK_SAMPLES):
+    """Per-channel standard deviation from one streaming pass of block sums."""
+    n = data.shape[-1]
+    s = np.zeros(data.shape[0])
+    ss = np.zeros(data.shape[0])
+    for _, block in ingest.iter_array_blocks(data, block_samples):
+        s += block.sum(axis=1)
+        ss += (block ** 2).sum(axis=1)
+    mean = s / max(n, 1)
+    return np.sqrt(np.maximum(ss / max(n, 1) - mean ** 2, 0.0))
+
+
+def detect_bad_channels(std, ch_names):
+    """Names of flat channels and of channels whose log-std is a robust outlier."""
+    log_std = np.log(np.maximum(std, 1e-12))
+    med = np.median(log_std)
+    mad = 1.4826 * np.median(np.abs(log_std - med))
+    z = (log_std - med) / mad if mad > 0 else np.zeros_like(log_std)
+    bad = (std < FLAT_STD_UV) | (np.abs(z) > BAD_Z)
+    return [name for name, b in zip(ch_names, bad) if b]
+
+
+class ChannelRepair:
+    """Data with bad channels replaced, plus what was detected and repaired."""
+
+    def __init__(self, data, ch_names, std, bads, interpolated):
+        self.data = data
+        self.ch_names = ch_names
+        self.std = std
+        self.bads = bads
+        self.interpolated = interpolated
+
+    def frame(self):
+        """The ``Bad_Channels`` sheet: one row per detected bad channel."""
+        std = dict(zip(self.ch_names, self.std))
+        rows = [
+            {"channel": name, "std_uV": std[name], "interpolated": name in self.interpolated}
+            for name in self.bads
+        ]
+        return pd.DataFrame(rows, columns=["channel", "std_uV", "interpolated"])
+
+
+def repair(data, ch_names, montage, bads=None, block_samples=ingest.BLOCK_SAMPLES):
+    """Detect (unless ``bads`` is given) and interpolate bad channels.
+
+    Returns a :class:`ChannelRepair` whose ``data`` is a new scratch array
+    when channels were repaired, and ``data`` itself (never modified)
+    when there was nothing to repair.
+    """
+    std = channel_std(data, block_samples)
+    bads = detect_bad_channels(std, ch_names) if bads is None else list(bads)
+    good, bad, matrix = interpolation_matrix(montage, tuple(ch_names), tuple(bads))
+    if not len(bad):
+        return ChannelRepair(data, ch_names, std, bads, [])
+
+    out = ingest.scratch_array(data.shape)
+    matrix = matrix.astype(out.dtype)
+    for start, stop in ingest.block_ranges(data.shape[-1], block_samples):
+        block = np.asarray(data[:, start:stop])
+        out[:, start:stop] = block
+        out[bad, start:stop] = matrix @ block[good]
+    return ChannelRepair(out, ch_names, std, bads, [ch_names[i] for i in bad])
@@ -0,0 +1,168 @@
+"""Background job runner so processing never blocks the Streamlit script thread.
+
+Jobs live in a process-wide :class:`JobRunner`, so they survive page
+reruns and browser reconnects; the page only keeps the job id in
+``st.session_state`` and polls :meth:`JobRunner.get` for progress.
+Cancellation is cooperative: the job's progress callback raises
+:class:`JobCancelled` at the next stage boundary, and the block loops
+inside a stage call :func:`check_cancelled` so a cancel takes effect
+within one block.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOB_WORKERS = int(os.environ.get("OPENNEUROLENS_JOB_WORKERS", "2"))
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+# Cancellation test of the job (or worker task) running on each thread
+_local = threading.local()
+
+
+@contextmanager
+def cancel_scope(cancelled):
+    """Make :func:`check_cancelled` on this thread consult ``cancelled()``."""
+    previous = getattr(_local, "cancelled", None)
+    _local.cancelled = cancelled
+    try:
+        yield
+    finally:
+        _local.cancelled = previous
+
+
+def check_cancelled():
+    """Raise :class:`JobCancelled` if the job running on this thread was cancelled; a no-op outside jobs."""
+    cancelled = getattr(_local, "cancelled", None)
+    if cancelled is not None and cancelled():
+        raise JobCancelled("cancelled")
+
+
+class Job:
+    """State of one submitted job, updated by the worker and read by the page."""
+
+    def __init__(self, job_id, label=""):
+        self.id = job_id
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.submitted = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.submitted
+
+    def report(self, fraction, message):
+        """Progress callback handed to the job function."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.progress = float(fraction)
+        self.message = message
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == QUEUED:
+            self.status = CANCELLED
+            self.message = "Cancelled"
+            self.finished = time.time()
+
+
+class JobRunner:
+    """Thread pool plus a registry of jobs keyed by id.
+
+    Threads rather than processes: the heavy work is NumPy/SciPy code that
+    releases the GIL, and jobs share memoized stage outputs and
+    memory-mapped recordings with the session that submitted them.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="onl-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, label="", **kwargs):
+        """Run ``func(*args, progress=job.report, **kwargs)`` in the pool; return the job id."""
+        self.prune()
+        job = Job(uuid.uuid4().hex, label)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def _run(self, job, func, args, kwargs):
+        if job.status == CANCELLED:
+            return
+        job.status = RUNNING
+        job.message = "Starting"
+        try:
+            with cancel_scope(job._cancel.is_set):
+                job.result = func(*args, progress=job.report, **kwargs)
+        except JobCancelled:
+            job.status = CANCELLED
+            job.message = "Cancelled"
+        except Exception as e:
+            job.status = FAILED
+            job.error = e
+            job.traceback = traceback.format_exc()
+            job.message = f"Failed: {e}"
+        else:
+            job.status = DONE
+            job.progress = 1.0
+            job.message = "Complete"
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def prune(self, ttl=JOB_TTL_SECONDS):
+        """Forget finished jobs older than ``ttl`` seconds."""
+        cutoff = time.time() - ttl
+        with self._lock:
+            stale = [k for k, j in self._jobs.items() if j.finished and j.finished < cutoff]
+            for k in stale:
+                del self._jobs[k]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """The process-wide :class:`JobRunner` shared by every session."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,260 @@
+"""Channel-parallel process-pool executor backed by shared memory.
+
+Every heavy per-channel operation in the pipeline (decimation, filtering,
+artifact detection, spectral analysis) is independent across channels.
+The :class:`ChannelExecutor` copies a group of channels into a
+``multiprocessing.shared_memory`` block once, hands each worker process
+a channel range plus the block's *name* (never the samples), and lets
+the workers write their results straight into a shared output block.
+Two groups are in flight at a time, so copying one in or out overlaps
+with the workers' compute on the other. Groups are sized so both stay
+within ``PARALLEL_MEMORY_BYTES``, but never below one channel per worker,
+so every core stays busy even on long, high-rate recordings. A one-byte shared cancel flag lets a cancelled
+job stop its worker tasks within one block (see :mod:`openneurolens.jobs`). Every task reports its CPU time
+and memory peak, which :func:`gather` hands to the caller's :class:`~openneurolens.profiling.Probe`.
+"""
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .jobs import cancel_scope, check_cancelled
+from .profiling import record_tasks, run_task
+
+CPU_COUNT = os.cpu_count() or 1
+# How often a job waiting on worker tasks checks whether it was cancelled (s)
+CANCEL_POLL_SECONDS = 0.1
+# Shared input + output bytes for the (up to two) channel groups in flight
+PARALLEL_MEMORY_BYTES = int(os.environ.get("OPENNEUROLENS_PARALLEL_MB", "1024")) << 20
+# Source rows read at a time when gathering a channel group from epochs
+COPY_BATCH_BYTES = 64 << 20
+
+
+class SharedArray:
+    """NumPy array in a named shared-memory block; picklable as its spec."""
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @property
+    def spec(self):
+        return (self.shape, self.dtype.str, self._shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        shape, dtype, name = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        self.array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _run_channels(func, in_spec, out_spec, flag_spec, start, stop, args):
+    """Worker entry point: ``func(in[start:stop], out[start:stop], *args)``, stopped by the cancel flag."""
+    inp = SharedArray.attach(in_spec)
+    out = SharedArray.attach(out_spec)
+    flag = SharedArray.attach(flag_spec)
+    try:
+        with cancel_scope(lambda: bool(flag.array[0])):
+            func(inp.array[start:stop], out.array[start:stop], *args)
+    finally:
+        inp.close()
+        out.close()
+        flag.close()
+
+
+def gather(futures, flag=None, poll=CANCEL_POLL_SECONDS):
+    """Results of ``futures`` (from :meth:`ChannelExecutor.submit`) in order, checking for job cancellation.
+
+    The tasks' CPU time and memory peaks are recorded for the running
+    probes (see :func:`~openneurolens.profiling.record_tasks`). On
+    cancellation (or a failed task) the queued tasks are cancelled and
+    ``flag`` (a one-byte :class:`SharedArray`), if given, is raised so the
+    running tasks stop at their next block.
+    """
+    try:
+        pending = set(futures)
+        while pending:
+            check_cancelled()
+            done, pending = wait(pending, timeout=poll, return_when=FIRST_EXCEPTION)
+            if any(f.exception() is not None for f in done):
+                break
+        results = [f.result() for f in futures]
+        record_tasks([usage for _, usage in results])
+        return [value for value, _ in results]
+    except BaseException:
+        if flag is not None:
+            flag.array[0] = 1
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def _channels_first(array, axis):
+    return array if axis == 0 else np.moveaxis(array, axis, 0)
+
+
+def _copy_channels(data, axis, g0, g1, dest, batch_bytes=COPY_BATCH_BYTES):
+    """Copy channels ``g0:g1`` (along ``axis``) of ``data`` into the channels-first ``dest``.
+
+    With ``axis > 0`` the source is read in batches along its first axis
+    (e.g. epochs), so a lazy epoch array is never materialised whole.
+    """
+    if axis == 0:
+        dest[:] = data[g0:g1]
+        return dest
+    n = data.shape[0]
+    row_bytes = int(np.prod(data.shape[1:], dtype=np.int64)) * 8
+    rows = max(1, batch_bytes // max(row_bytes, 1))
+    index = (slice(None),) * (axis - 1) + (slice(g0, g1),)
+    for start in range(0, n, rows):
+        batch = np.asarray(data[start:start + rows])
+        dest[:, start:start + len(batch)] = np.moveaxis(batch[(slice(None),) + index], axis, 0)
+    return dest
+
+
+def _finish_group(group, dst, flag):
+    """Wait for a group's tasks, then copy its results out and free its shared memory."""
+    g0, g1, shm_in, shm_out, futures = group
+    try:
+        gather(futures, flag)
+        dst[g0:g1] = shm_out.array
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
+class ChannelExecutor:
+    """Process pool that maps a function over channel blocks of an array.
+
+    ``func(block, out_block, *args)`` receives matching channels-first
+    slices of the input and output and fills ``out_block`` in place. It
+    must be a module-level function so worker processes can import it.
+    """
+
+    def __init__(self, n_workers=None, memory_bytes=PARALLEL_MEMORY_BYTES):
+        self.n_workers = n_workers or CPU_COUNT
+        self.memory_bytes = memory_bytes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded Streamlit server is not safe
+                self._pool = ProcessPoolExecutor(self.n_workers, mp_context=mp.get_context("spawn"))
+            return self._pool
+
+    def _group_size(self, n_channels, per_channel):
+        """Channels per group: two groups in flight within the memory budget, but never fewer than the workers."""
+        fits = self.memory_bytes // 2 // max(per_channel, 1)
+        return int(max(1, min(n_channels, max(fits, self.n_workers))))
+
+    def _start_group(self, pool, func, data, axis, out_shape, out_dtype, g0, g1, flag, args):
+        """Copy channels ``g0:g1`` into shared memory and queue one task per worker over them."""
+        shape = data.shape[:axis] + data.shape[axis + 1:]
+        shm_in = SharedArray((g1 - g0,) + shape, getattr(data, "dtype", np.float64))
+        shm_out = SharedArray((g1 - g0,) + out_shape, out_dtype)
+        try:
+            _copy_channels(data, axis, g0, g1, shm_in.array)
+            bounds = np.linspace(0, g1 - g0, min(self.n_workers, g1 - g0) + 1).astype(int)
+            futures = [
+                pool.submit(run_task, _run_channels, func, shm_in.spec, shm_out.spec, flag.spec, int(a), int(b),
+                            tuple(args))
+                for a, b in zip(bounds[:-1], bounds[1:])
+                if b > a
+            ]
+        except BaseException:
+            shm_in.close()
+            shm_out.close()
+            raise
+        return g0, g1, shm_in, shm_out, futures
+
+    def map_channels(self, func, data, out, args=(), axis=0, out_axis=None):
+        """Fill ``out`` with ``func`` applied to channel blocks of ``data``.
+
+        ``axis`` is the channel axis of ``data`` (1 for epochs shaped
+        ``(n_epochs, n_channels, n_times)``, which may be a lazy
+        :class:`~openneurolens.preprocess.EpochArray`); ``out_axis`` that
+        of ``out`` (defaults to ``axis``).
+
+        Every group has at least one channel per worker, and groups are
+        pipelined: the next group is copied into shared memory while the
+        workers process the current one, and a group's results are copied
+        out while the next one runs.
+        """
+        dst = _channels_first(out, axis if out_axis is None else out_axis)
+        n_channels = data.shape[axis]
+        itemsize = np.dtype(getattr(data, "dtype", np.float64)).itemsize
+        per_channel = (
+            int(np.prod(data.shape, dtype=np.int64)) // max(n_channels, 1) * itemsize
+            + int(np.prod(dst.shape[1:], dtype=np.int64)) * dst.dtype.itemsize
+        )
+        group = self._group_size(n_channels, per_channel)
+        pool = self._get_pool()
+        flag = SharedArray((1,), np.uint8)
+        running = []
+
+        try:
+            for g0 in range(0, n_channels, group):
+                check_cancelled()
+                running.append(self._start_group(pool, func, data, axis, tuple(dst.shape[1:]), dst.dtype, g0,
+                                                 min(g0 + group, n_channels), flag, args))
+                if len(running) == 2:
+                    _finish_group(running.pop(0), dst, flag)
+            while running:
+                _finish_group(running.pop(0), dst, flag)
+        finally:
+            # Groups still in flight mean an error or a cancel: stop their tasks and free their memory
+            if running:
+                flag.array[0] = 1
+            for _, _, shm_in, shm_out, futures in running:
+                for future in futures:
+                    future.cancel()
+                shm_in.close()
+                shm_out.close()
+            flag.close()
+        return out
+
+    def submit(self, func, *args):
+        """Run ``func(*args)`` on the pool and return its future.
+
+        For work that is not split by channel; pass large arrays as
+        :class:`SharedArray` specs rather than by value. Collect the
+        futures with :func:`gather`, which unwraps the task usage.
+        """
+        return self._get_pool().submit(run_task, func, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process-wide :class:`ChannelExecutor` (one worker per CPU core)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ChannelExecutor()
+        return _executor
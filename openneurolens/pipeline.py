@@ -0,0 +1,320 @@
+"""Processing pipeline as a memoized stage graph driven by a :class:`PipelineConfig`.
+
+load → resample → filter → interpolate → re-reference → artifact → epoch
+→ analysis → render. Each stage
+only reads the config fields it lists, so e.g. changing ``analysis_type``
+reuses the filtered, re-referenced and epoched data from the memo.
+"""
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import (
+    artifacts, connectivity, erp, figures, ingest, interpolation, parallel, preprocess, profiling, spectral, stats,
+    timefreq,
+)
+from .events import EventIndex
+from .jobs import JobCancelled
+from .recording import Recording, load_upload
+from .stages import Stage, StageGraph, StageTiming
+
+
+class Epochs:
+    """Per-condition epoch arrays sharing one time axis."""
+
+    def __init__(self, data, times, ch_names, sfreq):
+        self.data = data              # {condition: (n_epochs, n_channels, n_times)}
+        self.times = times
+        self.ch_names = ch_names
+        self.sfreq = sfreq
+
+    def summary_frame(self):
+        """One row per condition: epoch count and array shape."""
+        rows = [
+            {"condition": cond, "epochs": ep.shape[0], "channels": ep.shape[1], "samples_per_epoch": ep.shape[2]}
+            for cond, ep in self.data.items()
+        ]
+        return pd.DataFrame(rows, columns=["condition", "epochs", "channels", "samples_per_epoch"])
+
+
+class PipelineResult:
+    """Per-condition epochs plus the stage timings of the run that produced them."""
+
+    def __init__(self, epochs, timing):
+        self.epochs = epochs.data
+        self.times = epochs.times
+        self.ch_names = epochs.ch_names
+        self.sfreq = epochs.sfreq
+        self._epochs = epochs
+        self._timing = timing
+
+    def summary_frame(self):
+        return self._epochs.summary_frame()
+
+    def timing_frame(self):
+        return self._timing.frame()
+
+
+# -------------------------------
+# Stage functions
+# -------------------------------
+def _load(config, upload):
+    return load_upload(upload, config)
+
+
+def _executor(config):
+    # A pool of one worker only adds start-up and copy overhead
+    return parallel.get_executor() if config.parallel and parallel.CPU_COUNT > 1 else None
+
+
+def _decimation(config, load):
+    """Decimation factor of the resample stage, which keys it: band or low-pass changes that keep it reuse the stage."""
+    if not config.resample:
+        return {"factor": 1}
+    return {"factor": preprocess.decimation_factor(load.sfreq, max(config.h_freq or 0.0, config.band[2]))}
+
+
+def _resample(config, load):
+    factor = _decimation(config, load)["factor"]
+    if factor == 1:
+        return load
+    data = preprocess.decimate(load.data, factor, executor=_executor(config))
+    events = load.events.copy()
+    events[:, 0] = np.round(events[:, 0] / factor).astype(np.int64)
+    return Recording(data, load.sfreq / factor, load.ch_names, events, source=load.source)
+
+
+def _filter(config, resample):
+    return preprocess.filter_data(
+        resample.data, resample.sfreq, config.l_freq, config.h_freq, config.notch, executor=_executor(config),
+        method=config.filter_method,
+    )
+
+
+def _interpolate(config, resample, filter):
+    if not config.interpolate:
+        n = len(resample.ch_names)
+        return interpolation.ChannelRepair(filter, resample.ch_names, np.zeros(n), [], [])
+    return interpolation.repair(filter, resample.ch_names, config.montage)
+
+
+def _reref(config, resample, interpolate):
+    data = interpolate.data
+    if config.reref is None:
+        return data
+    # Write to a new array: the input may still be memoized for other settings
+    out = ingest.scratch_array(data.shape)
+    for start, stop in ingest.block_ranges(data.shape[-1]):
+        block = np.array(data[:, start:stop])
+        out[:, start:stop] = preprocess.rereference(block, resample.ch_names, config.reref)
+    return out
+
+
+def _artifact(config, resample, reref):
+    if config.artifact_reject is None:
+        return None
+    return artifacts.detect(
+        reref, resample.events, resample.sfreq, resample.ch_names, config.tmin, config.tmax,
+        config.conditions, config.threshold_uv, blinks=config.blink_detection,
+        drop=config.artifact_reject == "automatic", executor=_executor(config),
+    )
+
+
+def _epoch(config, resample, reref, artifact):
+    events = EventIndex.from_array(resample.events if artifact is None else artifact.kept_events())
+    data = {}
+    times = preprocess.epoch_offsets(resample.sfreq, config.tmin, config.tmax)[1]
+    for cond, code in config.conditions.items():
+        onsets = events.select(code).onsets
+        data[cond], times, _ = preprocess.epoch(
+            reref, onsets, resample.sfreq, config.tmin, config.tmax, baseline=config.baseline
+        )
+    return Epochs(data, times, resample.ch_names, resample.sfreq)
+
+
+def _analysis(config, epoch):
+    tables = {"Epochs": epoch.summary_frame()}
+    data = {}
+    if config.analysis_type == "ERP":
+        result = erp.ERP.from_epochs(epoch)
+        tables["ERP_Peaks"] = result.peaks_frame()
+        tables["ERP_Summary"] = result.summary_frame()
+        tables["ERP_Waveforms"] = result.waveform_frame()
+        data["erp"] = result
+    elif config.analysis_type == "PSD":
+        spectra = spectral.Spectra.from_epochs(epoch, executor=_executor(config))
+        tables["Bandpower"] = spectra.bandpower_frame()
+        tables[f"{config.band[0].capitalize()}_Channels"] = spectra.channel_band_frame(config.band)
+        data["spectra"] = spectra
+    elif config.analysis_type == "Time-Frequency":
+        freqs = timefreq.default_freqs(epoch.sfreq, config.l_freq, config.h_freq)
+        tfr = timefreq.TimeFrequency.from_epochs(epoch, freqs, executor=_executor(config))
+        tables["TF_Power"] = tfr.band_frame(config.analysis_window)
+        data["tfr"] = tfr
+    elif config.analysis_type == "Connectivity":
+        conn = connectivity.Connectivity.from_epochs(epoch, config.band, executor=_executor(config))
+        tables["Connectivity_ROI"] = conn.roi_frame()
+        tables["Connectivity_Pairs"] = conn.pairs_frame()
+        data["connectivity"] = conn
+    return {"tables": tables, "data": data}
+
+
+def _cluster_params(config, epoch):
+    """Settings of the cluster test, which key its stage; none when it does not run."""
+    if config.analysis_type != "ERP" or not config.cluster_test:
+        return {}
+    return {"window": config.analysis_window, "montage": config.montage, "n_permutations": config.n_permutations,
+            "seed": config.permutation_seed}
+
+
+def _clusters(config, epoch):
+    """NoGo vs Go cluster permutation test within the analysis window (ERP only, when enabled)."""
+    params = _cluster_params(config, epoch)
+    if not params:
+        return None
+    return stats.go_nogo_test(epoch, params["montage"], params["window"], n_permutations=params["n_permutations"],
+                              seed=params["seed"], executor=_executor(config))
+
+
+def _render(config, load, resample, interpolate, reref, artifact, analysis, clusters, keys):
+    tables = dict(analysis["tables"])
+    report_figures = {}
+    if config.include_figures:
+        # The reref key covers the data and events plotted, so cached overviews never rescan the recording
+        report_figures = figures.report_figures(
+            figures.FigureStyle.from_config(config), resample, reref, analysis["data"], config.conditions,
+            data_key=keys["reref"],
+        )
+    if clusters is not None:
+        tables["ERP_Clusters"] = clusters.frame()
+    if config.interpolate:
+        tables["Bad_Channels"] = interpolate.frame()
+    if artifact is not None:
+        tables["Artifact_Summary"] = artifact.summary_frame()
+        tables["Artifact_Epochs"] = artifact.epochs_frame()
+        tables["Artifact_Channels"] = artifact.channel_frame()
+    return {
+        "recording": {
+            "source": load.source,
+            "n_channels": load.n_channels,
+            "sfreq": load.sfreq,
+            "analysis_sfreq": resample.sfreq,
+            "duration": load.duration,
+            "n_events": len(load.events),
+        },
+        "tables": tables,
+        "figures": report_figures,
+    }
+
+
+PIPELINE = StageGraph([
+    # The reader follows the upload's extension, not the "EEG File Type" setting (file_format)
+    Stage("load", _load, deps=("upload",), params=("sfreq", "event_channel")),
+    Stage("resample", _resample, deps=("load",), derive=_decimation),
+    Stage("filter", _filter, deps=("resample",), params=("l_freq", "h_freq", "notch", "filter_method")),
+    Stage("interpolate", _interpolate, deps=("resample", "filter"), params=("interpolate", "montage")),
+    Stage("reref", _reref, deps=("resample", "interpolate"), params=("reref",)),
+    Stage("artifact", _artifact, deps=("resample", "reref"),
+          params=("tmin", "tmax", "conditions", "artifact_reject", "threshold_uv", "blink_detection")),
+    Stage("epoch", _epoch, deps=("resample", "reref", "artifact"),
+          params=("tmin", "tmax", "baseline", "conditions")),
+    Stage("analysis", _analysis, deps=("epoch",),
+          params=("analysis_type", "analysis_window", "band", "l_freq", "h_freq")),
+    Stage("clusters", _clusters, deps=("epoch",), derive=_cluster_params),
+    # Display settings only reach this stage, so changing them never recomputes the analysis
+    Stage("render", _render, deps=("load", "resample", "interpolate", "reref", "artifact", "analysis", "clusters"),
+          params=("interpolate", "conditions", "include_figures", "figure_size", "theme", "show_annotations"),
+          with_keys=True),
+])
+
+
+def run_pipeline(recording, config, progress=None, memo=None):
+    """Run every stage up to epoching on an already loaded ``recording``.
+
+    Resamples, filters, repairs bad channels, re-references, rejects artifacts, then
+    epochs and baseline-corrects.
+    """
+    timing = StageTiming()
+    inputs = {"load": (f"recording:{id(recording)}", recording)}
+    epochs = PIPELINE.run("epoch", config, inputs, memo=memo, progress=progress, timing=timing)
+    return PipelineResult(epochs, timing)
+
+
+def upload_name(upload):
+    """File name(s) of an upload or upload set, for logs."""
+    files = upload if isinstance(upload, (list, tuple)) else [upload]
+    return ", ".join(Path(getattr(f, "name", "upload")).name for f in files)
+
+
+def log_run(config, upload, upload_key, probe, timing=None, status="done", error=None):
+    """Emit one profile record per stage plus a run summary; returns the summary."""
+    run_id = uuid.uuid4().hex[:12]
+    source = upload_name(upload)
+    rows = timing.rows if timing is not None else []
+    records = [dict({"event": "stage", "run_id": run_id, "source": source}, **row) for row in rows]
+    run = {
+        "event": "run",
+        "run_id": run_id,
+        "source": source,
+        "upload_key": upload_key,
+        "upload_mb": profiling.data_bytes(upload) / 2 ** 20,
+        "analysis_type": config.analysis_type,
+        "status": status,
+        "seconds": probe.seconds,
+        "cpu_seconds": probe.cpu_seconds,
+        # Process-wide high-water mark since the run started (approximate when jobs overlap)
+        "process_peak_rss_mb": probe.process_peak_rss_mb,
+        "worker_peak_rss_mb": probe.worker_peak_rss_mb,
+        "slowest_stage": max(rows, key=lambda r: r["seconds"])["stage"] if rows else None,
+    }
+    if error is not None:
+        run.update(level="WARNING" if status == "cancelled" else "ERROR", error=repr(error),
+                   failed_stage=timing.failed if timing is not None else None)
+    profiling.emit(records + [run], config.log_level, config.save_logs, config.show_console_output)
+    return run
+
+
+def run_report(upload, upload_key, config, progress=None, memo=None):
+    """Run every stage for an upload and return the picklable results report.
+
+    ``upload_key`` identifies the upload's content (see
+    :func:`openneurolens.cache.hash_uploads`); together with ``memo`` it
+    lets reruns skip every stage whose inputs did not change. The run is
+    profiled and logged (see :mod:`openneurolens.profiling`); the summary
+    is returned under ``"profile"``.
+    """
+    timing = StageTiming()
+    inputs = {"upload": (upload_key, upload)}
+    probe = profiling.Probe().start()
+    try:
+        report = PIPELINE.run("render", config, inputs, memo=memo, progress=progress, timing=timing)
+    except BaseException as e:
+        status = "cancelled" if isinstance(e, JobCancelled) else "failed"
+        log_run(config, upload, upload_key, probe.stop(), timing, status, e)
+        raise
+    profile = log_run(config, upload, upload_key, probe.stop(), timing)
+    return dict(report, tables=dict(report["tables"], Timings=timing.frame()), profile=profile)
+
+
+def process_upload(upload, upload_key, config, cache=None, cache_key=None, progress=None, memo=None):
+    """Report for an upload, served from ``cache`` when possible.
+
+    This is the unit of work the page submits to the background job
+    runner. The returned report carries ``"cached": True`` on a hit.
+    """
+    if cache is not None:
+        probe = profiling.Probe().start()
+        report = cache.get(cache_key)
+        probe.stop()
+        if report is not None:
+            # The stored timings belong to the run that filled the cache; report the lookup instead
+            timing = StageTiming()
+            timing.add("cache", probe, True)
+            profile = log_run(config, upload, upload_key, probe, status="cached")
+            return dict(report, tables=dict(report["tables"], Timings=timing.frame()), cached=True, profile=profile)
+    report = run_report(upload, upload_key, config, progress=progress, memo=memo)
+    if cache is not None:
+        cache.put(cache_key, report)
+    return dict(report, cached=False)
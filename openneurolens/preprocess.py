@@ -0,0 +1,406 @@
+"""Vectorized preprocessing on channels x samples arrays.
+
+Every function here operates on all channels at once along the last
+axis; there are no per-channel Python loops. Continuous-data stages
+stream over fixed-size sample blocks so they also work on disk-backed
+recordings.
+"""
+import functools
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as sp_fft
+from scipy import signal
+
+from . import ingest
+from .jobs import check_cancelled
+
+# Channel names treated as mastoid references for "Linked Mastoids"
+MASTOID_CHANNELS = ("M1", "M2", "A1", "A2", "TP9", "TP10")
+
+# FIR design (MNE-style "auto" settings): Hamming window, 3.3 / transition width long
+FIR_LENGTH_FACTOR = 3.3
+NOTCH_WIDTH_HZ = 1.0
+NOTCH_TRANSITION_HZ = 1.0
+
+# Resampling keeps at least this many samples per cycle of the highest analysed frequency
+RESAMPLE_OVERSAMPLING = 4.0
+
+
+def design_bandpass(l_freq, h_freq, sfreq, order=4):
+    """Butterworth band-pass (or high/low-pass if one edge is unusable) as SOS."""
+    nyq = sfreq / 2.0
+    low = l_freq if l_freq and l_freq > 0 else None
+    high = h_freq if h_freq and h_freq < nyq else None
+    if low and high:
+        return signal.butter(order, [low, high], btype="bandpass", fs=sfreq, output="sos")
+    if low:
+        return signal.butter(order, low, btype="highpass", fs=sfreq, output="sos")
+    if high:
+        return signal.butter(order, high, btype="lowpass", fs=sfreq, output="sos")
+    return None
+
+
+def design_notch(freq, sfreq, quality=30.0):
+    """Second-order IIR notch at ``freq`` as SOS (None above Nyquist)."""
+    if not freq or freq >= sfreq / 2.0:
+        return None
+    b, a = signal.iirnotch(freq, quality, fs=sfreq)
+    return signal.tf2sos(b, a)
+
+
+def _odd_taps(seconds, sfreq):
+    n = int(np.ceil(seconds * sfreq))
+    return n + 1 - n % 2
+
+
+def design_fir_bandpass(l_freq, h_freq, sfreq):
+    """Linear-phase (odd-length, symmetric) Hamming FIR band-pass, or None.
+
+    Transition bands follow MNE's "auto" rule: 25 % of the edge frequency,
+    at least 2 Hz, but never past 0 Hz or Nyquist.
+    """
+    nyq = sfreq / 2.0
+    low = l_freq if l_freq and l_freq > 0 else None
+    high = h_freq if h_freq and h_freq < nyq else None
+    if not (low or high):
+        return None
+    widths, cutoffs = [], []
+    if low:
+        l_trans = min(max(0.25 * low, 2.0), low)
+        widths.append(l_trans)
+        cutoffs.append(low - l_trans / 2.0)
+    if high:
+        h_trans = min(max(0.25 * high, 2.0), nyq - high)
+        widths.append(h_trans)
+        cutoffs.append(high + h_trans / 2.0)
+    numtaps = _odd_taps(FIR_LENGTH_FACTOR / min(widths), sfreq)
+    return signal.firwin(numtaps, cutoffs, window="hamming", pass_zero=not low, fs=sfreq)
+
+
+def design_fir_notch(freq, sfreq):
+    """Linear-phase FIR band-stop around ``freq`` (None above Nyquist)."""
+    half = (NOTCH_WIDTH_HZ + NOTCH_TRANSITION_HZ) / 2.0
+    if not freq or freq + half >= sfreq / 2.0:
+        return None
+    numtaps = _odd_taps(FIR_LENGTH_FACTOR / NOTCH_TRANSITION_HZ, sfreq)
+    return signal.firwin(numtaps, [freq - half, freq + half], window="hamming", fs=sfreq)
+
+
+@functools.lru_cache(maxsize=32)
+def design_filter(sfreq, l_freq=None, h_freq=None, notch=None, method="fir"):
+    """Cached ``(method, coefficients)`` for a band/notch pair, or None for no filtering.
+
+    ``"fir"`` gives one combined linear-phase kernel; ``"iir"`` gives the
+    cascaded Butterworth and notch sections for a forward-backward pass.
+    The arrays are shared between callers and must not be modified.
+    """
+    if method == "fir":
+        kernels = [k for k in (design_fir_bandpass(l_freq, h_freq, sfreq), design_fir_notch(notch, sfreq))
+                   if k is not None]
+        if not kernels:
+            return None
+        coeffs = functools.reduce(np.convolve, kernels)
+    elif method == "iir":
+        sections = [s for s in (design_bandpass(l_freq, h_freq, sfreq), design_notch(notch, sfreq)) if s is not None]
+        if not sections:
+            return None
+        coeffs = np.vstack(sections)
+    else:
+        raise ValueError(f"Unknown filter method: {method!r}")
+    return method, coeffs
+
+
+def _odd_head(x, padlen):
+    return 2 * x[:, :1] - x[:, padlen:0:-1]
+
+
+def _odd_tail(x, padlen):
+    return 2 * x[:, -1:] - x[:, -2:-padlen - 2:-1]
+
+
+def sosfiltfilt_blocks(sos, data, out, block_samples=ingest.BLOCK_SAMPLES):
+    """Block-streamed equivalent of ``scipy.signal.sosfiltfilt(sos, data, axis=-1)``.
+
+    The forward pass carries the filter state from block to block and
+    writes into ``out``; the backward pass then walks the blocks in
+    reverse over ``out``. Odd-extension padding at both ends matches
+    SciPy's default, so the result is the same as the in-memory call
+    while only one block is ever resident.
+    """
+    n = data.shape[-1]
+    padlen = min(3 * (2 * len(sos) + 1), n - 1)
+    zi0 = signal.sosfilt_zi(sos)[:, None, :]
+
+    # Forward: warm up on the leading odd extension, then stream the blocks
+    head = _odd_head(np.asarray(data[:, :padlen + 1], dtype=np.float64), padlen)
+    zi = zi0 * head[None, :, :1]
+    _, zi = signal.sosfilt(sos, head, axis=-1, zi=zi)
+    for start, block in ingest.iter_array_blocks(data, block_samples):
+        y, zi = signal.sosfilt(sos, block, axis=-1, zi=zi)
+        out[:, start:start + y.shape[-1]] = y
+    tail = _odd_tail(np.asarray(data[:, n - padlen - 1:], dtype=np.float64), padlen)
+    tail, _ = signal.sosfilt(sos, tail, axis=-1, zi=zi)
+
+    # Backward: start from the filtered trailing extension, then blocks in reverse
+    tail = tail[:, ::-1]
+    zi = zi0 * tail[None, :, :1]
+    _, zi = signal.sosfilt(sos, tail, axis=-1, zi=zi)
+    for start, stop in reversed(list(ingest.block_ranges(n, block_samples))):
+        block = np.array(out[:, start:stop][:, ::-1], dtype=np.float64)
+        y, zi = signal.sosfilt(sos, block, axis=-1, zi=zi)
+        out[:, start:stop] = y[:, ::-1]
+    return out
+
+
+def _extension(data, padlen):
+    """Odd-extension head and tail of ``padlen`` samples (zero beyond the data length)."""
+    n = data.shape[-1]
+    k = min(padlen, n - 1)
+    head = _odd_head(np.asarray(data[:, :k + 1], dtype=np.float64), k)
+    tail = _odd_tail(np.asarray(data[:, n - k - 1:], dtype=np.float64), k)
+    zeros = np.zeros((data.shape[0], padlen - k))
+    return np.hstack([zeros, head]), np.hstack([tail, zeros])
+
+
+def fir_filter_blocks(h, data, out, block_samples=ingest.BLOCK_SAMPLES):
+    """Zero-phase FIR filtering by overlap-add FFT convolution, one block at a time.
+
+    ``h`` is an odd-length symmetric kernel; its group delay is removed so
+    the output is aligned with the input. The signal is odd-extended by
+    half the kernel at both ends, then every block is convolved with one
+    FFT of size ``block + len(h) - 1`` and its tail carried into the next
+    block. Blocks are at least twice the kernel (long high-pass kernels
+    exceed ``block_samples``), so each FFT yields at least a third of its
+    length in output samples: cost is O(N log M) and only one block is
+    resident.
+    """
+    n = data.shape[-1]
+    m = len(h)
+    pad = (m - 1) // 2
+    head, tail = _extension(data, pad)
+    block_samples = max(block_samples, 2 * m)
+    n_fft = sp_fft.next_fast_len(block_samples + m - 1, real=True)
+    H = sp_fft.rfft(h, n_fft)
+    carry = np.zeros((data.shape[0], m - 1))
+
+    # Walk the extended signal [head | data | tail]; full-convolution sample i is output i - 2 * pad
+    ext_len = n + 2 * pad
+    for a in range(0, ext_len, block_samples):
+        check_cancelled()
+        b = min(a + block_samples, ext_len)
+        pieces = []
+        if a < pad:
+            pieces.append(head[:, a:min(b, pad)])
+        if b > pad and a < pad + n:
+            pieces.append(np.asarray(data[:, max(a, pad) - pad:min(b, pad + n) - pad], dtype=np.float64))
+        if b > pad + n:
+            pieces.append(tail[:, max(a, pad + n) - pad - n:b - pad - n])
+        chunk = np.hstack(pieces) if len(pieces) > 1 else pieces[0]
+
+        y = sp_fft.irfft(sp_fft.rfft(chunk, n_fft, axis=-1) * H, n_fft, axis=-1)[:, :b - a + m - 1]
+        y[:, :m - 1] += carry
+        carry = y[:, b - a:].copy()
+        lo, hi = max(a, 2 * pad), min(b, 2 * pad + n)
+        if hi > lo:
+            out[:, lo - 2 * pad:hi - 2 * pad] = y[:, lo - a:hi - a]
+    return out
+
+
+def _filter_channels(block, out, design, block_samples):
+    """:meth:`ChannelExecutor.map_channels` worker for :func:`filter_data`."""
+    method, coeffs = design
+    if method == "fir":
+        fir_filter_blocks(coeffs, block, out, block_samples)
+    else:
+        sosfiltfilt_blocks(coeffs, block, out, block_samples)
+
+
+def filter_data(data, sfreq, l_freq=None, h_freq=None, notch=None, block_samples=ingest.BLOCK_SAMPLES,
+                executor=None, method="fir"):
+    """Zero-phase band-pass and notch filter every channel, streaming over blocks.
+
+    ``method`` selects a single linear-phase FIR kernel applied by
+    overlap-add (``"fir"``) or cascaded Butterworth/notch sections run
+    forward and backward (``"iir"``); designs come from
+    :func:`design_filter`'s cache. The input is never modified; the
+    result is a new (disk-backed when large) float32 array. With an
+    :class:`~openneurolens.parallel.ChannelExecutor` the channels are
+    split across worker processes.
+    """
+    out = ingest.scratch_array(data.shape)
+    design = design_filter(float(sfreq), l_freq, h_freq, notch, method)
+    if design is None:
+        for start, block in ingest.iter_array_blocks(data, block_samples):
+            out[:, start:start + block.shape[-1]] = block
+        return out
+    if data.shape[-1] < 2:
+        raise ValueError("Recording is too short to filter")
+    if executor is not None and data.shape[0] > 1:
+        return executor.map_channels(_filter_channels, data, out, args=(design, block_samples))
+    _filter_channels(data, out, design, block_samples)
+    return out
+
+
+def decimation_factor(sfreq, f_max):
+    """Largest power-of-two factor keeping ``RESAMPLE_OVERSAMPLING * f_max`` Hz (1 = keep rate)."""
+    if not f_max or f_max <= 0:
+        return 1
+    ratio = sfreq / (RESAMPLE_OVERSAMPLING * f_max)
+    return 1 << int(np.floor(np.log2(ratio))) if ratio >= 2 else 1
+
+
+@functools.lru_cache(maxsize=8)
+def design_decimation(factor):
+    """Zero-padded anti-alias kernel and output offset, as in ``scipy.signal.resample_poly(x, 1, factor)``."""
+    half_len = 10 * factor
+    h = signal.firwin(2 * half_len + 1, 1.0 / factor, window=("kaiser", 5.0))
+    pre_pad = factor - half_len % factor
+    return np.r_[np.zeros(pre_pad), h], (half_len + pre_pad) // factor
+
+
+def decimate_blocks(data, out, factor, block_samples=ingest.BLOCK_SAMPLES):
+    """Polyphase decimation by an integer ``factor``, streaming over output blocks.
+
+    ``upfirdn`` only evaluates the kept output samples, so the anti-alias
+    filter costs ``len(h) / factor`` multiplies per output sample. The
+    result equals ``resample_poly(data, 1, factor, axis=-1)``.
+    """
+    n = data.shape[-1]
+    n_out = out.shape[-1]
+    h, offset = design_decimation(factor)
+    # Input samples before each output block needed to fill the kernel, rounded to whole outputs
+    lead = -(-(len(h) - 1) // factor) * factor
+    step = max(1, block_samples // factor)
+    for n0 in range(0, n_out, step):
+        check_cancelled()
+        n1 = min(n0 + step, n_out)
+        s = (n0 + offset) * factor - lead
+        e = (n1 - 1 + offset) * factor + 1
+        chunk = np.zeros((data.shape[0], e - s))
+        a, b = max(s, 0), min(e, n)
+        if b > a:
+            chunk[:, a - s:b - s] = data[:, a:b]
+        y = signal.upfirdn(h, chunk, 1, factor, axis=-1)
+        out[:, n0:n1] = y[:, lead // factor:lead // factor + n1 - n0]
+    return out
+
+
+def _decimate_channels(block, out, factor, block_samples):
+    """:meth:`ChannelExecutor.map_channels` worker for :func:`decimate`."""
+    decimate_blocks(block, out, factor, block_samples)
+
+
+def decimate(data, factor, block_samples=ingest.BLOCK_SAMPLES, executor=None):
+    """Decimated copy of ``data`` as a new float32 scratch array."""
+    out = ingest.scratch_array((data.shape[0], -(-data.shape[-1] // factor)))
+    if executor is not None and data.shape[0] > 1:
+        return executor.map_channels(_decimate_channels, data, out, args=(factor, block_samples))
+    return decimate_blocks(data, out, factor, block_samples)
+
+
+def rereference(data, ch_names, method="average"):
+    """Re-reference in place to the common average or linked mastoids."""
+    if method is None:
+        return data
+    if method == "average":
+        ref = data.mean(axis=0, keepdims=True)
+    elif method == "mastoids":
+        idx = [i for i, name in enumerate(ch_names) if name.upper() in MASTOID_CHANNELS]
+        if not idx:
+            raise ValueError(f"Linked mastoid reference needs one of {', '.join(MASTOID_CHANNELS)}")
+        ref = data[idx].mean(axis=0, keepdims=True)
+    else:
+        raise ValueError(f"Unknown re-reference method: {method!r}")
+    data -= ref
+    return data
+
+
+def epoch_offsets(sfreq, tmin, tmax):
+    """Sample offsets and times (s) of an epoch window relative to its event."""
+    start = int(round(tmin * sfreq))
+    stop = int(round(tmax * sfreq))
+    offsets = np.arange(start, stop + 1)
+    return offsets, offsets / sfreq
+
+
+class EpochArray:
+    """Lazy ``(n_epochs, n_channels, n_times)`` epochs over continuous data.
+
+    The epochs are a zero-copy ``sliding_window_view`` of the continuous
+    array; indexing along the epoch axis gathers only the requested
+    epochs (one vectorized take, baseline-corrected on the way out). The
+    analysis engines read epochs in batches, so a condition's epochs are
+    never all materialised unless converted with ``np.asarray``.
+    :meth:`crop` narrows the samples gathered to a time window.
+    """
+
+    ndim = 3
+
+    def __init__(self, data, onsets, offsets, times, baseline=False, span=slice(None)):
+        self.data = data
+        self.onsets = np.asarray(onsets, dtype=np.int64)
+        self.start = int(offsets[0])
+        self.baseline = baseline
+        self._offsets = offsets
+        self._span = span
+        self._full_times = times
+        self.times = times[span]
+        self._windows = sliding_window_view(data, len(offsets), axis=-1)
+        # Pre-stimulus samples of the full epoch, averaged for baseline correction (see baseline_correct)
+        self._n_base = int(np.count_nonzero(times <= 0.0))
+
+    @property
+    def shape(self):
+        return (len(self.onsets), self.data.shape[0], len(self.times))
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def crop(self, tmin, tmax):
+        """Epochs of the samples with ``tmin <= t <= tmax`` (s), still baseline-corrected over the full epoch."""
+        keep = np.flatnonzero((self._full_times >= tmin) & (self._full_times <= tmax))
+        span = slice(int(keep[0]), int(keep[-1]) + 1) if len(keep) else slice(0, 0)
+        return EpochArray(self.data, self.onsets, self._offsets, self._full_times, self.baseline, span)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self[index[0]][(slice(None),) * np.ndim(self.onsets[index[0]]) + index[1:]]
+        first = self.onsets[index] + self.start
+        # (channels, [epochs,] times) gather of the window's samples
+        out = np.array(self._windows[:, first, self._span])
+        if self.baseline and self._n_base:
+            out -= self._windows[:, first, :self._n_base].mean(axis=-1, keepdims=True)
+        # Move epochs to the front
+        return out if np.ndim(first) == 0 else np.moveaxis(out, 1, 0)
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:]
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+
+def epoch(data, onsets, sfreq, tmin, tmax, baseline=False):
+    """Lazy ``(n_epochs, n_channels, n_times)`` :class:`EpochArray` around ``onsets``.
+
+    Events whose window falls outside the recording are dropped; the
+    returned boolean mask marks which onsets were kept.
+    """
+    offsets, times = epoch_offsets(sfreq, tmin, tmax)
+    onsets = np.asarray(onsets, dtype=np.int64)
+    keep = (onsets + offsets[0] >= 0) & (onsets + offsets[-1] < data.shape[-1])
+    return EpochArray(data, onsets[keep], offsets, times, baseline), times, keep
+
+
+def baseline_correct(epochs, times, tmin=None, tmax=0.0):
+    """Subtract each epoch/channel mean over the pre-stimulus interval in place."""
+    mask = times <= tmax
+    if tmin is not None:
+        mask &= times >= tmin
+    if not mask.any():
+        return epochs
+    epochs -= epochs[..., mask].mean(axis=-1, keepdims=True)
+    return epochs
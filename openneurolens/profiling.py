@@ -0,0 +1,220 @@
+"""Resource accounting for pipeline stages and page reruns, plus JSON-lines logs.
+
+:class:`Probe` measures one piece of work: wall time, CPU time, peak
+resident memory and the bytes of data it consumed. CPU time is that of
+the calling thread plus the worker-process tasks it ran (see
+:func:`run_task`), so concurrent jobs do not count each other's work.
+Worker processes run one task at a time, so each task resets and reports
+its own memory peak. The parent's peak RSS is process-wide and
+approximate: on Linux its high-water mark (``/proc/self/clear_refs``) is
+only reset when a probe starts while no other probe is running, never in
+the middle of a job; elsewhere it is the lifetime peak. With ``save_logs``
+every record is appended as one JSON object per line to
+``LOG_DIR/profile-YYYYMMDD.jsonl``.
+"""
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import CACHE_DIR
+
+LOG_DIR = Path(os.environ.get("OPENNEUROLENS_LOG_DIR", CACHE_DIR / "logs"))
+
+logger = logging.getLogger("openneurolens")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+    # Records are filtered by the run's "Log Level" setting in emit(), not by the logger
+    logger.setLevel(logging.DEBUG)
+
+_log_lock = threading.Lock()
+
+
+# -------------------------------
+# Measurements
+# -------------------------------
+def peak_rss_bytes():
+    """High-water mark of the process's resident memory."""
+    try:
+        with open("/proc/self/status", "rb") as fh:
+            for line in fh:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows: no portable high-water mark without extra dependencies
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """Reset the RSS high-water mark where the kernel allows it; returns whether it did."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def data_bytes(value):
+    """Bytes of sample data held by ``value`` (arrays, lazy readers, recordings, uploads, paths...)."""
+    if value is None:
+        return 0
+    if isinstance(value, dict):
+        return sum(data_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(data_bytes(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=False, deep=False).sum())
+    shape, dtype = getattr(value, "shape", None), getattr(value, "dtype", None)
+    if shape is not None and dtype is not None:
+        return int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if hasattr(value, "data") and not callable(value.data):
+        return data_bytes(value.data)
+    if isinstance(value, os.PathLike):
+        try:
+            return os.stat(value).st_size
+        except OSError:
+            return 0
+    if isinstance(getattr(value, "size", None), int):
+        return value.size              # Streamlit UploadedFile
+    if hasattr(value, "fileno"):
+        try:
+            return os.fstat(value.fileno()).st_size
+        except OSError:
+            return 0
+    return 0
+
+
+# Resetting probes running in any thread (the RSS high-water mark is only reset when there are none).
+# Held weakly, so a probe abandoned without stop() (e.g. an interrupted page rerun) stops counting once collected.
+_active_probes = weakref.WeakSet()
+_probe_lock = threading.Lock()
+# Per-thread [(pid, cpu_seconds, peak_rss_bytes)] of the worker tasks this thread ran
+_tasks = threading.local()
+
+
+def run_task(func, *args):
+    """Run ``func(*args)`` in a worker process; returns ``(result, (pid, cpu_seconds, peak_rss_bytes))``.
+
+    Workers run one task at a time, so resetting their own high-water mark
+    here makes the reported peak that of this task alone.
+    """
+    reset_peak_rss()
+    cpu = time.process_time()
+    result = func(*args)
+    return result, (os.getpid(), time.process_time() - cpu, peak_rss_bytes())
+
+
+def record_tasks(usages):
+    """Attribute worker task usages (from :func:`run_task`) to the probes running in this thread."""
+    if getattr(_tasks, "probes", None):
+        _tasks.records.extend(usages)
+
+
+class Probe:
+    """Wall/CPU time and peak RSS of the work done between ``start`` and ``stop``.
+
+    ``cpu_seconds`` covers this thread and its worker tasks;
+    ``worker_peak_rss_mb`` sums each worker process's largest task peak.
+    With ``reset_rss=False`` the parent's high-water mark is never reset
+    (nor kept from being reset by other probes) and ``process_peak_rss_mb``
+    is the process peak since the last reset.
+    """
+
+    def __init__(self, reset_rss=True):
+        self.reset_rss = reset_rss
+
+    def start(self):
+        with _probe_lock:
+            self.rss_reset = self.reset_rss and not _active_probes and reset_peak_rss()
+            if self.reset_rss:
+                _active_probes.add(self)
+        if not getattr(_tasks, "probes", None):
+            _tasks.probes, _tasks.records = weakref.WeakSet(), []
+        _tasks.probes.add(self)
+        self._first_task = len(_tasks.records)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._wall
+        tasks = _tasks.records[self._first_task:]
+        self.cpu_seconds = time.thread_time() - self._cpu + sum(cpu for _, cpu, _ in tasks)
+        self.process_peak_rss_mb = peak_rss_bytes() / 2 ** 20
+        peaks = {}
+        for pid, _, peak in tasks:
+            peaks[pid] = max(peaks.get(pid, 0), peak)
+        self.worker_peak_rss_mb = sum(peaks.values()) / 2 ** 20
+        _tasks.probes.discard(self)
+        with _probe_lock:
+            _active_probes.discard(self)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# -------------------------------
+# Structured logs
+# -------------------------------
+def log_path(directory=LOG_DIR, day=None):
+    day = day or datetime.date.today()
+    return Path(directory) / f"profile-{day:%Y%m%d}.jsonl"
+
+
+def write_records(records, directory=LOG_DIR):
+    """Append ``records`` (dicts) to today's JSON-lines profile log."""
+    stamp = datetime.datetime.now().isoformat(timespec="milliseconds")
+    lines = "".join(json.dumps(dict({"time": stamp}, **r), default=str, ensure_ascii=False) + "\n" for r in records)
+    path = log_path(directory)
+    with _log_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(lines)
+    return path
+
+
+def _level(name):
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def emit(records, level="INFO", save=False, console=True):
+    """Send records at or above ``level`` to the console logger and, with ``save``, to the log file.
+
+    Each record may carry its own ``"level"`` (default ``"INFO"``).
+    """
+    threshold = _level(level)
+    kept = [r for r in records if _level(r.get("level", "INFO")) >= threshold]
+    if console:
+        for r in kept:
+            fields = " ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                              for k, v in r.items() if k not in ("event", "level", "run_id"))
+            logger.log(_level(r.get("level", "INFO")), "%s %s", r.get("event", "record"), fields)
+    if save and kept:
+        return write_records(kept)
+    return None
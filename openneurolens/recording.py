@@ -0,0 +1,306 @@
+"""Continuous EEG recordings and the loaders that build them from uploads."""
+import os
+import re
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+from . import brainvision, edf, ingest
+
+# Columns in a CSV export that carry event markers rather than EEG
+EVENT_COLUMNS = ("Stimulus", "Response", "Trigger", "Event", "Marker")
+TIME_COLUMNS = ("Time", "time", "t", "Time (s)", "Time (ms)")
+
+# Upload extension -> reader format key (see config.FILE_TYPE_FORMATS)
+EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".edf": "edf",
+    ".bdf": "bdf",
+    ".vhdr": "brainvision",
+    ".eeg": "brainvision",
+    ".vmrk": "brainvision",
+    ".set": "eeglab",
+    ".cnt": "cnt",
+}
+
+
+class Recording:
+    """Continuous EEG as a channels x samples array in µV.
+
+    ``events`` follows the MNE convention: an ``(n_events, 3)`` int array of
+    ``[sample, previous_value, code]`` rows sorted by sample.
+    """
+
+    def __init__(self, data, sfreq, ch_names, events=None, source=None):
+        # Lazy readers (e.g. EDFReader) expose shape/__getitem__ and stay undecoded
+        if not hasattr(data, "shape"):
+            data = np.asarray(data)
+        if len(data.shape) != 2:
+            raise ValueError(f"Expected a 2-D channels x samples array, got shape {data.shape}")
+        if len(ch_names) != data.shape[0]:
+            raise ValueError(f"{len(ch_names)} channel names for {data.shape[0]} channels")
+        self.data = data
+        self.sfreq = float(sfreq)
+        self.ch_names = list(ch_names)
+        if events is None:
+            events = np.zeros((0, 3), dtype=np.int64)
+        self.events = np.asarray(events, dtype=np.int64).reshape(-1, 3)
+        self.source = source
+
+    @property
+    def n_channels(self):
+        return self.data.shape[0]
+
+    @property
+    def n_samples(self):
+        return self.data.shape[1]
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sfreq
+
+    def get_data(self, picks=None, start=0, stop=None):
+        """Samples ``[start, stop)`` of the channels in ``picks`` (names or indices).
+
+        With a lazy reader behind ``data`` only the requested channels and
+        samples are decoded.
+        """
+        if picks is None:
+            index = slice(None)
+        else:
+            index = [self.ch_names.index(p) if isinstance(p, str) else int(p) for p in picks]
+        return np.asarray(self.data[index, start:stop])
+
+    def __repr__(self):
+        return (
+            f"<Recording {self.n_channels} ch x {self.n_samples} samples "
+            f"@ {self.sfreq:g} Hz, {len(self.events)} events>"
+        )
+
+
+def read_csv(path, sfreq, event_channel="Stimulus", block_samples=ingest.BLOCK_SAMPLES):
+    """Stream a wide CSV export (one column per channel, optional time/marker columns).
+
+    Samples are collected block by block into a disk-backed array.
+    """
+    ch_names = []
+    events = []
+
+    def blocks():
+        for names, block, block_events in ingest.iter_csv_blocks(
+            path, block_samples, TIME_COLUMNS, EVENT_COLUMNS, event_channel
+        ):
+            if not ch_names:
+                ch_names.extend(names)
+            events.append(block_events)
+            yield block
+
+    data = ingest.collect_blocks(blocks())
+    events = np.concatenate(events) if events else None
+    return Recording(data, sfreq, ch_names, events=events)
+
+
+def detect_format(name):
+    """Reader format key for an upload name, or None if the extension is unknown."""
+    return EXTENSION_FORMATS.get(Path(name).suffix.lower())
+
+
+def marker_code(description, event_channel="Stimulus"):
+    """Integer code of a marker description for ``event_channel``, or None.
+
+    Accepts BrainVision-style ``"Stimulus/S  5"``, short ``"S  5"`` /
+    ``"R 12"`` forms and bare numbers (treated as stimulus codes).
+    ``"Custom"`` accepts any description that carries a number.
+    """
+    desc = description.strip()
+    digits = re.findall(r"\d+", desc)
+    if not digits:
+        return None
+    kind = event_channel.lower()
+    if kind != "custom":
+        lowered = desc.lower()
+        short = re.match(r"([sr])\s*\d+$", lowered)
+        if lowered.startswith(("stimulus", "response")):
+            if not lowered.startswith(kind):
+                return None
+        elif short:
+            if short.group(1) != kind[0]:
+                return None
+        elif not desc.isdigit() or kind != "stimulus":
+            return None
+    return int(digits[-1])
+
+
+def events_from_annotations(onsets, descriptions, sfreq, event_channel="Stimulus"):
+    """Events array from annotation onsets (s) and descriptions."""
+    rows = []
+    for onset, desc in zip(onsets, descriptions):
+        code = marker_code(desc, event_channel)
+        if code is not None:
+            rows.append((int(round(onset * sfreq)), 0, code))
+    if not rows:
+        return None
+    events = np.array(rows, dtype=np.int64)
+    return events[np.argsort(events[:, 0], kind="stable")]
+
+
+def events_from_channel(values):
+    """Events array from a trigger channel (one row per change to a non-zero code)."""
+    values = np.asarray(values, dtype=np.int64)
+    previous = np.concatenate(([0], values[:-1]))
+    onsets = np.flatnonzero((values != previous) & (values != 0))
+    return np.column_stack([onsets, previous[onsets], values[onsets]])
+
+
+def read_edf(path, event_channel="Stimulus"):
+    """Open an EDF/EDF+/BDF file lazily; samples stay memory-mapped until read."""
+    reader = edf.EDFReader(path)
+    events = None
+    status = reader.status()
+    if status is not None:
+        events = events_from_channel(status)
+    if events is None or not len(events):
+        annotations = reader.annotations()
+        events = events_from_annotations(
+            [a[0] for a in annotations], [a[1] for a in annotations], reader.sfreq, event_channel
+        )
+    return Recording(reader, reader.sfreq, reader.ch_names, events=events)
+
+
+def read_brainvision(vhdr_path, event_channel="Stimulus"):
+    """Open a BrainVision triplet lazily from its ``.vhdr`` header."""
+    reader = brainvision.BrainVisionReader(vhdr_path)
+    events = reader.markers().events(event_channel)
+    return Recording(reader, reader.sfreq, reader.ch_names, events=events)
+
+
+def _match_brainvision_names(directory, vhdr):
+    """Rename a lone uploaded .eeg/.vmrk to the names the header refers to."""
+    common = brainvision.parse_ini(vhdr).get("Common Infos", {})
+    for key, suffix in (("DataFile", ".eeg"), ("MarkerFile", ".vmrk")):
+        expected = common.get(key, "").strip()
+        if not expected:
+            continue
+        target = brainvision.companion_path(directory, expected)
+        if target.resolve().parent != directory.resolve():
+            raise ValueError(f"BrainVision header refers to {expected!r} outside the upload")
+        if target.exists():
+            continue
+        candidates = list(directory.glob(f"*{suffix}"))
+        if len(candidates) == 1:
+            candidates[0].rename(target)
+
+
+def load_brainvision_upload(uploaded_files, config):
+    """Spool a .vhdr/.eeg/.vmrk upload set and open it lazily."""
+    parts = {Path(f.name).suffix.lower() for f in uploaded_files}
+    missing = [ext for ext in (".vhdr", ".eeg") if ext not in parts]
+    if missing:
+        raise ValueError(
+            "BrainVision recordings need the .vhdr header, .eeg data and .vmrk marker files; "
+            f"missing {', '.join(missing)}"
+        )
+    directory = ingest.spool_uploads(uploaded_files)
+    try:
+        vhdr = next(directory.glob("*.vhdr"))
+        _match_brainvision_names(directory, vhdr)
+        recording = read_brainvision(vhdr, config.event_channel)
+    except Exception:
+        ingest.remove_spool_dir(directory)
+        raise
+    weakref.finalize(recording, ingest.remove_spool_dir, directory)
+    return recording
+
+
+def read_with_mne(path, event_channel="Stimulus", block_samples=ingest.BLOCK_SAMPLES):
+    """Fallback loader for formats without a native reader (EEGLAB, CNT, ...)."""
+    import mne
+
+    raw = mne.io.read_raw(str(path), preload=False, verbose="error")
+    events = None
+    stim = mne.pick_types(raw.info, meg=False, stim=True)
+    if len(stim):
+        events = mne.find_events(raw, shortest_event=1, verbose="error")
+    if events is None or not len(events):
+        annot = raw.annotations
+        events = events_from_annotations(
+            annot.onset - raw.first_time, annot.description, raw.info["sfreq"], event_channel
+        )
+
+    picks = mne.pick_types(raw.info, meg=False, eeg=True, eog=True)
+    blocks = (
+        raw.get_data(picks=picks, start=start, stop=stop) * 1e6  # V -> µV
+        for start, stop in ingest.block_ranges(raw.n_times, block_samples)
+    )
+    data = ingest.collect_blocks(blocks)
+    ch_names = [raw.ch_names[i] for i in picks]
+    return Recording(data, raw.info["sfreq"], ch_names, events=events)
+
+
+def upload_format(uploaded):
+    """Reader format for one upload or an upload set (see :data:`EXTENSION_FORMATS`)."""
+    files = uploaded if isinstance(uploaded, (list, tuple)) else [uploaded]
+    formats = {detect_format(f.name) for f in files}
+    if "brainvision" in formats:
+        return "brainvision"
+    return formats.pop() if len(formats) == 1 else None
+
+
+def load_upload(uploaded, config):
+    """Spool an upload (one ``UploadedFile`` or a BrainVision set) and load it.
+
+    EDF/BDF and BrainVision recordings stay memory-mapped on their spool
+    files, which are removed once the recording is garbage collected.
+    Paths (rather than uploads) are read in place, see :func:`load_files`.
+    """
+    files = list(uploaded) if isinstance(uploaded, (list, tuple)) else [uploaded]
+    if all(isinstance(f, (str, os.PathLike)) for f in files):
+        return load_files(files, config)
+    fmt = upload_format(files)
+    if fmt == "brainvision":
+        recording = load_brainvision_upload(files, config)
+        recording.source = next(f.name for f in files if f.name.lower().endswith(".vhdr"))
+        return recording
+    if len(files) != 1:
+        raise ValueError("Upload one recording at a time (or one .vhdr/.eeg/.vmrk set)")
+
+    uploaded_file = files[0]
+    path = ingest.spool_upload(uploaded_file)
+    try:
+        if fmt == "csv":
+            recording = read_csv(path, config.sfreq, config.event_channel)
+        elif fmt in ("edf", "bdf"):
+            recording = read_edf(path, config.event_channel)
+            weakref.finalize(recording, ingest.remove_spool, path)
+            path = None
+        else:
+            recording = read_with_mne(path, config.event_channel)
+    finally:
+        if path is not None:
+            ingest.remove_spool(path)
+    recording.source = uploaded_file.name
+    return recording
+
+
+def load_files(paths, config):
+    """Load a recording straight from files on disk (one file, or a BrainVision set), without spooling."""
+    paths = [Path(p) for p in paths]
+    fmt = upload_format(paths)
+    if fmt == "brainvision":
+        path = next((p for p in paths if p.suffix.lower() == ".vhdr"), None)
+        if path is None:
+            raise ValueError("BrainVision recordings are opened from their .vhdr header")
+        recording = read_brainvision(path, config.event_channel)
+    elif len(paths) != 1:
+        raise ValueError("Load one recording at a time (or one .vhdr/.eeg/.vmrk set)")
+    else:
+        path = paths[0]
+        if fmt == "csv":
+            recording = read_csv(path, config.sfreq, config.event_channel)
+        elif fmt in ("edf", "bdf"):
+            recording = read_edf(path, config.event_channel)
+        else:
+            recording = read_with_mne(path, config.event_channel)
+    recording.source = path.name
+    return recording
@@ -0,0 +1,150 @@
+"""Vectorized Welch PSD and band power.
+
+Segments are strided views (``sliding_window_view``) over the epoch
+arrays, so splitting into overlapping windows copies nothing; each batch
+of rows is detrended, windowed and transformed with one ``rfft`` call.
+Batches are sized by ``batch_bytes`` so 256 channels x thousands of
+epochs never materialise at once, and the per-epoch spectra are folded
+into a running mean instead of being stored.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from .config import FREQUENCY_BANDS, roi_indices
+from .jobs import check_cancelled
+
+# Bytes of complex FFT output allowed per batch
+PSD_BATCH_BYTES = 128 << 20
+
+
+def welch_params(n_times, sfreq, nperseg=None, noverlap=None):
+    """Segment length/overlap: 1 s windows with 50 % overlap, clipped to the epoch."""
+    nperseg = int(min(n_times, nperseg or int(round(sfreq))))
+    noverlap = nperseg // 2 if noverlap is None else int(noverlap)
+    return nperseg, noverlap
+
+
+def welch_mean(x, sfreq, nperseg=None, noverlap=None, batch_bytes=PSD_BATCH_BYTES):
+    """Welch PSD of every row of ``x`` (..., n_times), averaged over axis 0.
+
+    Equivalent to ``scipy.signal.welch(x, sfreq, nperseg=..., noverlap=...)
+    .mean(axis=0)`` (Hann window, constant detrend, density scaling),
+    computed in bounded batches along axis 0.
+    Returns ``(freqs, psd)`` with ``psd`` shaped ``x.shape[1:-1] + (n_freqs,)``.
+    """
+    n_times = x.shape[-1]
+    nperseg, noverlap = welch_params(n_times, sfreq, nperseg, noverlap)
+    step = nperseg - noverlap
+    window = signal.get_window("hann", nperseg)
+    scale = 1.0 / (sfreq * (window ** 2).sum())
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sfreq)
+    n_seg = (n_times - nperseg) // step + 1
+
+    inner = x.shape[1:-1]
+    per_row = max(1, int(np.prod(inner, dtype=np.int64))) * n_seg * len(freqs) * 16
+    rows = max(1, batch_bytes // per_row)
+    total = np.zeros(inner + (len(freqs),))
+
+    for start in range(0, x.shape[0], rows):
+        check_cancelled()
+        batch = np.asarray(x[start:start + rows])
+        segments = sliding_window_view(batch, nperseg, axis=-1)[..., ::step, :]
+        segments = segments - segments.mean(axis=-1, keepdims=True)
+        spec = np.fft.rfft(segments * window, axis=-1)
+        power = spec.real ** 2 + spec.imag ** 2
+        total += power.mean(axis=-2).sum(axis=0)
+
+    psd = total * (scale / max(x.shape[0], 1))
+    # One-sided spectrum: double everything except DC (and Nyquist for even nperseg)
+    psd[..., 1:len(freqs) - (nperseg % 2 == 0)] *= 2
+    return freqs, psd
+
+
+def _welch_channels(block, out, sfreq, nperseg, noverlap, batch_bytes):
+    """:meth:`ChannelExecutor.map_channels` worker: block is (channels, epochs, times)."""
+    out[:] = welch_mean(np.moveaxis(block, 0, 1), sfreq, nperseg, noverlap, batch_bytes)[1]
+
+
+def epochs_psd(epochs, sfreq, nperseg=None, noverlap=None, batch_bytes=PSD_BATCH_BYTES, executor=None):
+    """Epoch-averaged PSD ``(n_channels, n_freqs)`` of ``(n_epochs, n_channels, n_times)`` data."""
+    nperseg, noverlap = welch_params(epochs.shape[-1], sfreq, nperseg, noverlap)
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sfreq)
+    if not epochs.shape[0]:
+        return freqs, np.full((epochs.shape[1], len(freqs)), np.nan)
+    if executor is not None and epochs.shape[1] > 1:
+        out = np.zeros((epochs.shape[1], len(freqs)))
+        executor.map_channels(
+            _welch_channels, epochs, out, args=(sfreq, nperseg, noverlap, batch_bytes), axis=1, out_axis=0
+        )
+        return freqs, out
+    return welch_mean(epochs, sfreq, nperseg, noverlap, batch_bytes)
+
+
+def band_power(freqs, psd, bands=FREQUENCY_BANDS):
+    """Integrated power per band: ``(..., n_bands)`` in µV² (rectangle rule)."""
+    df = freqs[1] - freqs[0] if len(freqs) > 1 else 1.0
+    out = []
+    for lo, hi in bands.values():
+        mask = (freqs >= lo) & (freqs < hi)
+        out.append(psd[..., mask].sum(axis=-1) * df)
+    return np.stack(out, axis=-1)
+
+
+class Spectra:
+    """Per-condition epoch-averaged PSDs sharing one frequency axis."""
+
+    def __init__(self, freqs, psd, ch_names):
+        self.freqs = freqs
+        self.psd = psd                # {condition: (n_channels, n_freqs)}
+        self.ch_names = ch_names
+
+    @classmethod
+    def from_epochs(cls, epochs, executor=None, **kwargs):
+        psd = {}
+        freqs = None
+        for cond, data in epochs.data.items():
+            freqs, psd[cond] = epochs_psd(data, epochs.sfreq, executor=executor, **kwargs)
+        return cls(freqs, psd, epochs.ch_names)
+
+    def roi_psd(self):
+        """``{(condition, roi): psd}`` averaged over each ROI's channels."""
+        rois = roi_indices(self.ch_names)
+        return {
+            (cond, roi): psd[idx].mean(axis=0)
+            for cond, psd in self.psd.items()
+            for roi, idx in rois.items()
+        }
+
+    def bandpower_frame(self, bands=FREQUENCY_BANDS):
+        """The ``Bandpower`` summary sheet: one row per ROI x band x condition."""
+        lo = min(b[0] for b in bands.values())
+        hi = max(b[1] for b in bands.values())
+        rows = []
+        for (cond, roi), psd in self.roi_psd().items():
+            powers = band_power(self.freqs, psd, bands)
+            total = band_power(self.freqs, psd, {"total": (lo, hi)})[0]
+            for (name, (b_lo, b_hi)), power in zip(bands.items(), powers):
+                mask = (self.freqs >= b_lo) & (self.freqs < b_hi)
+                rows.append({
+                    "roi": roi,
+                    "band": name,
+                    "power_uV2": power,
+                    "mean_psd_uV2_per_Hz": psd[mask].mean() if mask.any() else np.nan,
+                    "relative_power": power / total if total > 0 else np.nan,
+                    "power_dB": 10 * np.log10(power) if power > 0 else np.nan,
+                    "condition": cond,
+                })
+        columns = ["roi", "band", "power_uV2", "mean_psd_uV2_per_Hz", "relative_power", "power_dB", "condition"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def channel_band_frame(self, band):
+        """Per-channel power in one ``(name, lo, hi)`` band for every condition."""
+        name, lo, hi = band
+        rows = []
+        for cond, psd in self.psd.items():
+            power = band_power(self.freqs, psd, {name: (lo, hi)})[:, 0]
+            for ch, p in zip(self.ch_names, power):
+                rows.append({"channel": ch, "condition": cond, f"{name}_power_uV2": p})
+        return pd.DataFrame(rows)
@@ -0,0 +1,165 @@
+"""Dependency graph of pipeline stages with per-stage memoization.
+
+Each stage declares the upstream stages it consumes and the
+``PipelineConfig`` fields it reads. Its memo key hashes exactly those
+fields plus the keys of its upstream stages, so changing a setting only
+recomputes the stages downstream of the first stage that reads it. A
+stage whose output depends on a setting only through a coarser derived
+value (e.g. the decimation factor) hashes that value instead.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .profiling import Probe, data_bytes
+
+
+class Stage:
+    """One node of the graph: ``func(config, **upstream_outputs) -> output``.
+
+    ``derive(config, **upstream_outputs) -> dict`` adds values computed
+    from the settings to the key, for settings the stage only uses through them.
+    With ``with_keys`` the function also gets ``keys``, the memo keys of
+    its upstream stages, e.g. to key its own caches on them.
+    """
+
+    def __init__(self, name, func, deps=(), params=(), derive=None, with_keys=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = tuple(params)
+        self.derive = derive
+        self.with_keys = with_keys
+
+    def key(self, config, dep_keys, dep_values=None):
+        parts = [self.name]
+        parts += [f"{p}={getattr(config, p)!r}" for p in self.params]
+        if self.derive is not None:
+            parts += [f"{k}={v!r}" for k, v in self.derive(config, **(dep_values or {})).items()]
+        parts += [f"{d}:{dep_keys[d]}" for d in self.deps]
+        return hashlib.blake2b("\n".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class StageMemo:
+    """Per-session store of stage outputs, keeping the newest few per stage.
+
+    Safe to share with background jobs (see :mod:`openneurolens.jobs`).
+    """
+
+    def __init__(self, max_per_stage=2):
+        self.max_per_stage = max_per_stage
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, stage, key):
+        with self._lock:
+            entries = self._entries.get(stage)
+            if entries is None or key not in entries:
+                return None
+            entries.move_to_end(key)
+            return entries[key]
+
+    def put(self, stage, key, value):
+        with self._lock:
+            entries = self._entries.setdefault(stage, OrderedDict())
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.max_per_stage:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StageTiming:
+    """Per-stage profile of one graph run: wall and CPU time, peak RSS, input size, memo hit.
+
+    ``process_peak_rss_mb`` is the server process's peak since the run
+    started (process-wide, so approximate when jobs overlap);
+    ``worker_peak_rss_mb`` that of the stage's worker tasks. ``failed``
+    names the stage that raised, if any; its row is the partial run.
+    """
+
+    columns = ["stage", "seconds", "cpu_seconds", "process_peak_rss_mb", "worker_peak_rss_mb", "input_mb",
+               "cached"]
+
+    def __init__(self):
+        self.rows = []
+        self.failed = None
+
+    def add(self, stage, probe, cached, input_bytes=0):
+        self.rows.append({
+            "stage": stage,
+            "seconds": probe.seconds,
+            "cpu_seconds": probe.cpu_seconds,
+            "process_peak_rss_mb": probe.process_peak_rss_mb,
+            "worker_peak_rss_mb": probe.worker_peak_rss_mb,
+            "input_mb": input_bytes / 2 ** 20,
+            "cached": cached,
+        })
+
+    def frame(self):
+        return pd.DataFrame(self.rows, columns=self.columns)
+
+
+class StageGraph:
+    """Stages in topological order (each stage only depends on earlier ones)."""
+
+    def __init__(self, stages):
+        self.stages = OrderedDict((s.name, s) for s in stages)
+
+    def _upstream(self, target, inputs):
+        """Stages needed for ``target``, in order, stopping at supplied inputs."""
+        needed = set()
+        stack = [target]
+        while stack:
+            name = stack.pop()
+            if name in needed or name in inputs:
+                continue
+            needed.add(name)
+            stack.extend(self.stages[name].deps)
+        return [s for s in self.stages.values() if s.name in needed]
+
+    def run(self, target, config, inputs, memo=None, progress=None, timing=None):
+        """Compute ``target``.
+
+        ``inputs`` maps names to ``(key, value)`` pairs. A name may be a
+        graph input (e.g. ``"upload"``) or a stage, in which case that
+        stage is not run and its supplied value is used instead.
+        """
+        memo = memo if memo is not None else StageMemo(max_per_stage=0)
+        timing = timing if timing is not None else StageTiming()
+        keys = {name: key for name, (key, _) in inputs.items()}
+        values = {name: value for name, (_, value) in inputs.items()}
+        plan = self._upstream(target, inputs)
+
+        for i, stage in enumerate(plan):
+            args = {d: values[d] for d in stage.deps}
+            input_bytes = data_bytes(list(args.values()))
+            key = stage.key(config, keys, args)
+            keys[stage.name] = key
+            if progress:
+                progress(i / len(plan), stage.name.capitalize())
+            probe = Probe().start()
+            value = memo.get(stage.name, key)
+            cached = value is not None
+            if not cached:
+                try:
+                    if stage.with_keys:
+                        value = stage.func(config, keys={d: keys[d] for d in stage.deps}, **args)
+                    else:
+                        value = stage.func(config, **args)
+                except BaseException:
+                    timing.add(stage.name, probe.stop(), False, input_bytes)
+                    timing.failed = stage.name
+                    raise
+                memo.put(stage.name, key, value)
+            values[stage.name] = value
+            timing.add(stage.name, probe.stop(), cached, input_bytes)
+
+        if progress:
+            progress(1.0, "Done")
+        return values[target]
@@ -0,0 +1,264 @@
+"""Cluster-based permutation tests over channels x times (Maris & Oostenveld, 2007).
+
+Every channel x time point gets a t statistic; supra-threshold points that
+are neighbours in time or on the scalp (Delaunay neighbours of the
+``montage_type`` positions, as ``mne.channels.find_ch_adjacency`` finds
+them) form clusters, scored by their summed t. The
+largest cluster mass of each permutation builds the null distribution.
+
+Permuting condition labels (or flipping signs of paired differences) does
+not change a point's total sum of squares, so each permutation's t follows
+from the label-weighted sums alone: a batch of permutations is one
+``(n_perm, n_obs) @ (n_obs, n_points)`` product. Clusters of a whole batch
+are labelled with one connected-components pass over a block-diagonal
+graph. Batches get independent child seeds of one ``SeedSequence``, so the
+result does not depend on how many workers ran them.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy import stats as sp_stats
+from scipy.sparse import csgraph
+from scipy.spatial import Delaunay
+
+from .interpolation import head_positions
+from .jobs import check_cancelled
+from .parallel import SharedArray, gather
+from .preprocess import EpochArray
+
+N_PERMUTATIONS = 1000
+PERMUTATION_SEED = 0
+# Two-tailed p of the point-wise t that forms clusters
+CLUSTER_ALPHA = 0.05
+# Per-batch budget for the permutation statistics, masks and kept graph edges
+PERMUTATION_BATCH_BYTES = 128 << 20
+
+CLUSTER_COLUMNS = [
+    "contrast", "cluster", "sign", "mass", "p_value", "start_ms", "end_ms", "peak_ms", "peak_channel", "peak_t",
+    "n_channels", "n_points", "channels",
+]
+
+
+# -------------------------------
+# Adjacency
+# -------------------------------
+@functools.lru_cache(maxsize=16)
+def channel_adjacency(montage, ch_names):
+    """``(n_edges, 2)`` neighbouring channel pairs: Delaunay edges of the montage positions.
+
+    ``ch_names`` is a tuple. Channels the montage does not place have no
+    spatial neighbours (they still cluster over time).
+    """
+    positions = head_positions(montage)
+    placed = np.array([i for i, name in enumerate(ch_names) if name.upper() in positions], dtype=np.int64)
+    if len(placed) < 3:
+        return np.zeros((0, 2), dtype=np.int64)
+    xyz = np.array([positions[ch_names[i].upper()] for i in placed])
+    # Azimuthal projection from the head origin scaled by distance, as on MNE's topomaps
+    r = np.linalg.norm(xyz, axis=1)
+    theta = np.arccos(np.clip(xyz[:, 2] / r, -1.0, 1.0))
+    phi = np.arctan2(xyz[:, 1], xyz[:, 0])
+    simplices = Delaunay(np.c_[theta * np.cos(phi), theta * np.sin(phi)] * r[:, None]).simplices
+    pairs = np.sort(np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]]), axis=1)
+    return placed[np.unique(pairs, axis=0)]
+
+
+def spatiotemporal_edges(ch_edges, n_channels, n_times):
+    """Edges between points ``channel * n_times + time``: scalp neighbours and adjacent samples."""
+    t = np.arange(n_times)
+    spatial = [(ch_edges[:, k, None] * n_times + t).ravel() for k in (0, 1)]
+    c = np.arange(n_channels)[:, None] * n_times
+    temporal = [(c + t[:-1]).ravel(), (c + t[1:]).ravel()]
+    return np.column_stack([np.concatenate([spatial[0], temporal[0]]), np.concatenate([spatial[1], temporal[1]])])
+
+
+# -------------------------------
+# Statistics
+# -------------------------------
+def _design(rng, n_perm, n_obs, n1):
+    """Permutation rows: random group-1 indicators (``n1`` ones), or random signs when ``n1`` is None."""
+    if n1 is None:
+        return rng.integers(0, 2, (n_perm, n_obs)) * 2.0 - 1.0
+    return (rng.random((n_perm, n_obs)).argsort(axis=1) < n1).astype(np.float64)
+
+
+def _t_stats(sums, total_sq, n_obs, n1):
+    """t of every row of ``design @ x`` (``x`` centred when ``n1`` is given; ``total_sq`` is ``(x ** 2).sum(0)``)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if n1 is None:
+            # One-sample t of the sign-flipped observations
+            var = (total_sq - sums ** 2 / n_obs) / (n_obs - 1)
+            t = sums / n_obs / np.sqrt(var / n_obs)
+        else:
+            # Pooled-variance two-sample t; the other group's sum is -sums because x is centred
+            n2 = n_obs - n1
+            var = (total_sq - sums ** 2 / n1 - sums ** 2 / n2) / (n_obs - 2)
+            t = (sums / n1 + sums / n2) / np.sqrt(var * (1 / n1 + 1 / n2))
+    return np.where(var > 0, t, 0.0)
+
+
+def cluster_masses(t, threshold, edges):
+    """``(labels, masses)`` of the clusters in each row of ``t`` (``(n_perm, n_points)``).
+
+    ``labels`` has the shape of ``t``; points below threshold are singleton
+    components of zero mass. Positive and negative points never share a cluster.
+    """
+    n_perm, n_points = t.shape
+    pos, neg = t > threshold, t < -threshold
+    i, j = edges[:, 0], edges[:, 1]
+    rows, kept = np.nonzero((pos[:, i] & pos[:, j]) | (neg[:, i] & neg[:, j]))
+    offset = rows * n_points
+    size = n_perm * n_points
+    graph = sparse.coo_matrix((np.ones(len(kept), dtype=bool), (offset + i[kept], offset + j[kept])),
+                              shape=(size, size))
+    n_comp, labels = csgraph.connected_components(graph, directed=False)
+    masses = np.bincount(labels, weights=np.where(pos | neg, t, 0.0).ravel(), minlength=n_comp)
+    return labels.reshape(n_perm, n_points), masses
+
+
+def _null_batch(x, total_sq, n1, n_perm, seed, threshold, edges):
+    """Largest absolute cluster mass of ``n_perm`` permutations drawn from ``seed``."""
+    rng = np.random.default_rng(seed)
+    t = _t_stats(_design(rng, n_perm, x.shape[0], n1) @ x, total_sq, x.shape[0], n1)
+    labels, masses = cluster_masses(t, threshold, edges)
+    owner = np.empty(len(masses), dtype=np.int64)
+    owner[labels.ravel()] = np.repeat(np.arange(n_perm), t.shape[1])
+    largest = np.zeros(n_perm)
+    np.maximum.at(largest, owner, np.abs(masses))
+    return largest
+
+
+def _run_null_batch(spec, total_sq, n1, n_perm, seed, threshold, ch_edges, n_channels, n_times):
+    """Worker entry point: :func:`_null_batch` on observations held in shared memory."""
+    x = SharedArray.attach(spec)
+    try:
+        edges = spatiotemporal_edges(ch_edges, n_channels, n_times)
+        return _null_batch(x.array, total_sq, n1, n_perm, seed, threshold, edges)
+    finally:
+        x.close()
+
+
+class ClusterResult:
+    """Observed t map, its clusters and their permutation p-values."""
+
+    def __init__(self, t_obs, labels, masses, null, ch_names, times, threshold, contrast=""):
+        self.t_obs = t_obs            # (n_channels, n_times)
+        self.labels = labels          # cluster label of every point, same shape
+        self.masses = masses          # summed t per label (0 for points below threshold)
+        self.null = null              # largest |mass| of each permutation
+        self.ch_names = ch_names
+        self.times = times
+        self.threshold = threshold
+        self.contrast = contrast
+
+    def p_value(self, mass):
+        return (1 + np.count_nonzero(self.null >= abs(mass))) / (1 + len(self.null))
+
+    def frame(self):
+        """One row per cluster, most significant first."""
+        rows = []
+        for label in np.flatnonzero(self.masses):
+            chans, samples = np.nonzero(self.labels == label)
+            peak = np.argmax(np.abs(self.t_obs[chans, samples]))
+            rows.append({
+                "contrast": self.contrast,
+                "sign": "positive" if self.masses[label] > 0 else "negative",
+                "mass": self.masses[label],
+                "p_value": self.p_value(self.masses[label]),
+                "start_ms": self.times[samples.min()] * 1000,
+                "end_ms": self.times[samples.max()] * 1000,
+                "peak_ms": self.times[samples[peak]] * 1000,
+                "peak_channel": self.ch_names[chans[peak]],
+                "peak_t": self.t_obs[chans[peak], samples[peak]],
+                "n_channels": len(np.unique(chans)),
+                "n_points": len(chans),
+                "channels": ", ".join(self.ch_names[c] for c in np.unique(chans)),
+            })
+        frame = pd.DataFrame(rows, columns=[c for c in CLUSTER_COLUMNS if c != "cluster"])
+        frame = frame.sort_values(["p_value", "mass"], key=lambda s: s.abs() if s.name == "mass" else s,
+                                  ascending=[True, False], ignore_index=True)
+        frame.insert(1, "cluster", np.arange(1, len(frame) + 1))
+        return frame
+
+
+def cluster_test(a, b=None, ch_names=None, times=None, montage="standard_1020", n_permutations=N_PERMUTATIONS,
+                 alpha=CLUSTER_ALPHA, seed=PERMUTATION_SEED, executor=None, batch_bytes=PERMUTATION_BATCH_BYTES,
+                 contrast=""):
+    """Cluster permutation test of ``a`` vs ``b`` (``(n_obs, n_channels, n_times)`` each).
+
+    With ``b`` the observations are exchangeable between groups (e.g. Go
+    and NoGo epochs) and condition labels are permuted; without it, ``a``
+    holds paired differences (e.g. one NoGo - Go map per subject) whose
+    signs are flipped. Batches run on ``executor`` (a
+    :class:`~openneurolens.parallel.ChannelExecutor`) when given.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    n_channels, n_times = a.shape[1:]
+    ch_names = list(ch_names) if ch_names is not None else [f"Channel{i + 1}" for i in range(n_channels)]
+    times = np.asarray(times) if times is not None else np.arange(n_times, dtype=float)
+    if b is None:
+        x, n1, dof = a.reshape(len(a), -1), None, len(a) - 1
+    else:
+        b = np.asarray(b, dtype=np.float64)
+        x, n1, dof = np.concatenate([a, b]).reshape(len(a) + len(b), -1), len(a), len(a) + len(b) - 2
+        x = x - x.mean(axis=0)
+    if dof < 1:
+        raise ValueError("Not enough observations for a t statistic")
+    n_obs, n_points = x.shape
+    total_sq = (x ** 2).sum(axis=0)
+    threshold = sp_stats.t.ppf(1 - alpha / 2, dof)
+    ch_edges = channel_adjacency(montage, tuple(ch_names))
+    edges = spatiotemporal_edges(ch_edges, n_channels, n_times)
+
+    observed = np.ones((1, n_obs)) if n1 is None else (np.arange(n_obs) < n1)[None].astype(np.float64)
+    t_obs = _t_stats(observed @ x, total_sq, n_obs, n1)
+    labels, masses = cluster_masses(t_obs, threshold, edges)
+
+    # Statistics, masks and kept edges of one permutation bound the batch size
+    per_perm = n_points * 8 * 4 + len(edges) * 3 + n_obs * 16
+    batch = int(max(1, min(n_permutations, batch_bytes // per_perm)))
+    sizes = [min(batch, n_permutations - s) for s in range(0, n_permutations, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if executor is None:
+        null = []
+        for size, s in zip(sizes, seeds):
+            check_cancelled()
+            null.append(_null_batch(x, total_sq, n1, size, s, threshold, edges))
+    else:
+        shared = SharedArray(x.shape, np.float64)
+        try:
+            shared.array[:] = x
+            futures = [
+                executor.submit(_run_null_batch, shared.spec, total_sq, n1, size, s, threshold, ch_edges,
+                                n_channels, n_times)
+                for size, s in zip(sizes, seeds)
+            ]
+            null = gather(futures)
+        finally:
+            shared.close()
+    null = np.concatenate(null) if null else np.zeros(0)
+    return ClusterResult(t_obs.reshape(n_channels, n_times), labels.reshape(n_channels, n_times), masses, null,
+                         ch_names, times, threshold, contrast)
+
+
+def _crop(epochs, times, window):
+    """Samples of ``epochs`` within ``window``: lazy epochs are cropped before they are gathered."""
+    if window is None:
+        return np.asarray(epochs)
+    if isinstance(epochs, EpochArray):
+        return np.asarray(epochs.crop(*window))
+    return np.asarray(epochs)[:, :, (times >= window[0]) & (times <= window[1])]
+
+
+def go_nogo_test(epochs, montage, window=None, conditions=("NoGo", "Go"), **kwargs):
+    """:func:`cluster_test` of NoGo vs Go epochs within ``window`` (s); None with fewer than two epochs of either."""
+    first, second = (epochs.data.get(c) for c in conditions)
+    if first is None or second is None or len(first) < 2 or len(second) < 2:
+        return None
+    times = epochs.times
+    if window is not None:
+        times = times[(times >= window[0]) & (times <= window[1])]
+    return cluster_test(_crop(first, epochs.times, window), _crop(second, epochs.times, window), epochs.ch_names,
+                        times, montage, contrast=" - ".join(conditions), **kwargs)
@@ -0,0 +1,196 @@
+"""Synthetic Go/NoGo EEG for benchmarks and demos.
+
+:func:`generate` builds a recording block by block (so hour-long
+256-channel sessions never sit in RAM at once) from:
+
+- 1/f background activity,
+- an amplitude-modulated alpha rhythm, strongest over posterior sites,
+- mains line noise,
+- eye blinks on the frontal/frontopolar channels,
+- Go/NoGo events with an N2 (frontal) and P3 (posterior) response that
+  are larger after NoGo.
+
+:func:`write_bdf` streams a recording to a 24-bit BDF file with the event
+codes on a ``Status`` channel, which is what the upload path reads.
+"""
+import numpy as np
+from scipy import signal
+
+from . import ingest
+from .config import CONDITIONS, ROIS
+from .interpolation import builtin_montage
+from .recording import Recording
+
+SYNTHETIC_SEED = 0
+
+# Channels every synthetic montage starts with (ROIs, blink sites, midline), then standard_1005 order
+CORE_CHANNELS = (
+    "Fp1", "Fp2", "Fpz", "AF3", "AF4",
+    *ROIS["Frontal"], *ROIS["Posterior"],
+    "Cz", "C3", "C4", "T7", "T8", "CPz", "F7", "F8",
+)
+
+# Amplitudes (µV) of each component
+BACKGROUND_UV = 8.0
+ALPHA_UV = 12.0
+ALPHA_HZ = 10.0
+LINE_UV = 4.0
+LINE_HZ = 50.0
+BLINK_UV = 150.0
+# (latency s, width s, amplitude µV) of the N2 and P3 after Go; NoGo scales them by NOGO_GAIN
+N2 = (0.27, 0.035, -4.0)
+P3 = (0.40, 0.080, 6.0)
+NOGO_GAIN = 1.8
+
+# Go/NoGo task timing: stimulus-onset asynchrony range (s) and share of NoGo trials
+SOA = (1.0, 1.6)
+NOGO_RATE = 0.2
+# Mean interval between blinks (s) and blink duration (s)
+BLINK_INTERVAL = 4.0
+BLINK_DURATION = 0.3
+
+# BDF physical range (±µV) mapped onto the 24-bit digital range: ~0.004 µV resolution
+BDF_RANGE_UV = 32768.0
+BDF_DIGITAL = 8388607
+
+
+def synthetic_ch_names(n_channels):
+    """The first ``n_channels`` labels: :data:`CORE_CHANNELS`, then the rest of standard_1005."""
+    import mne
+
+    names = list(dict.fromkeys(CORE_CHANNELS))
+    rest = mne.channels.make_standard_montage(builtin_montage("standard_1005")).ch_names
+    names += [name for name in rest if name not in names]
+    if n_channels > len(names):
+        raise ValueError(f"At most {len(names)} synthetic channels are available")
+    return names[:n_channels]
+
+
+def _weights(ch_names):
+    """Per-channel gains of (alpha, blink, N2, P3) from the channel label."""
+    upper = [name.upper() for name in ch_names]
+    posterior = np.array([n.startswith(("P", "O")) for n in upper], dtype=float)
+    blink = np.array([1.0 if n.startswith("FP") else 0.6 if n.startswith("AF") else
+                      0.3 if n.startswith("F") and not n.startswith("FT") else 0.05 for n in upper])
+    frontal = np.array([1.0 if n.startswith(("F", "AF")) else 0.4 if n.startswith("C") else 0.1 for n in upper])
+    central = np.array([1.0 if n.startswith(("P", "CP", "C")) else 0.5 if n.startswith(("O", "F")) else 0.2
+                        for n in upper])
+    alpha = 0.3 + 0.7 * posterior
+    return alpha, blink, frontal, central
+
+
+def task_events(duration, sfreq, rng):
+    """Go/NoGo events over ``duration`` seconds as an ``(n, 3)`` array."""
+    n_max = int(duration / SOA[0]) + 1
+    onsets = 1.0 + np.cumsum(rng.uniform(*SOA, n_max))
+    onsets = onsets[onsets < duration - 1.0]
+    codes = np.where(rng.random(len(onsets)) < NOGO_RATE, CONDITIONS["NoGo"], CONDITIONS["Go"])
+    return np.column_stack([np.round(onsets * sfreq).astype(np.int64), np.zeros(len(onsets), np.int64), codes])
+
+
+def _gaussian(t, latency, width):
+    return np.exp(-0.5 * ((t - latency) / width) ** 2)
+
+
+def _add_transients(out, start, onsets, template, gains):
+    """Add ``gains[:, None] * template`` at every onset overlapping ``[start, start + out.shape[-1])``."""
+    n, width = out.shape[-1], template.shape[-1]
+    first, last = np.searchsorted(onsets, [start - width, start + n])
+    for onset, gain in zip(onsets[first:last], gains[first:last]):
+        lo, hi = max(onset, start), min(onset + width, start + n)
+        if hi > lo:
+            out[:, lo - start:hi - start] += gain * template[:, lo - onset:hi - onset]
+
+
+def generate(sfreq=512.0, n_channels=64, duration=60.0, seed=SYNTHETIC_SEED, block_samples=ingest.BLOCK_SAMPLES):
+    """A synthetic Go/NoGo :class:`Recording` in µV (data in a scratch array)."""
+    rng = np.random.default_rng(seed)
+    ch_names = synthetic_ch_names(n_channels)
+    n_samples = int(round(duration * sfreq))
+    alpha_w, blink_w, frontal_w, central_w = _weights(ch_names)
+    events = task_events(duration, sfreq, rng)
+
+    # ERP templates: (channels, samples) per condition
+    t_erp = np.arange(int(0.8 * sfreq)) / sfreq
+    n2 = N2[2] * _gaussian(t_erp, N2[0], N2[1])
+    p3 = P3[2] * _gaussian(t_erp, P3[0], P3[1])
+    erp_go = frontal_w[:, None] * n2 + central_w[:, None] * p3
+    erp_gains = np.where(events[:, 2] == CONDITIONS["NoGo"], NOGO_GAIN, 1.0)
+
+    # Blinks: raised-cosine deflections at Poisson times
+    blink_onsets = np.cumsum(rng.exponential(BLINK_INTERVAL, int(duration / BLINK_INTERVAL * 2) + 1))
+    blink_onsets = np.round(blink_onsets[blink_onsets < duration] * sfreq).astype(np.int64)
+    blink_shape = np.hanning(max(3, int(BLINK_DURATION * sfreq)))
+    blink_template = blink_w[:, None] * blink_shape * BLINK_UV
+    blink_gains = rng.uniform(0.6, 1.2, len(blink_onsets))
+
+    # 1/f-like background: white noise through a one-pole low-pass, filter state carried across blocks
+    b, a = [1.0 - 0.98], [1.0, -0.98]
+    zi = np.zeros((n_channels, 1))
+    scale = BACKGROUND_UV / np.sqrt((1 - 0.98) ** 2 / (1 - 0.98 ** 2))
+    # Alpha bursts: a slow (< 0.5 Hz) random envelope of roughly unit variance
+    env_b, env_a = signal.butter(2, 0.5 / (sfreq / 2))
+    env_zi = np.zeros(len(env_a) - 1)
+    env_scale = np.sqrt(sfreq)
+    line_phase = rng.uniform(0, 2 * np.pi, n_channels)[:, None]
+
+    out = ingest.scratch_array((n_channels, n_samples))
+    for start, stop in ingest.block_ranges(n_samples, block_samples):
+        t = np.arange(start, stop) / sfreq
+        noise, zi = signal.lfilter(b, a, rng.standard_normal((n_channels, stop - start)), zi=zi)
+        block = noise * scale
+        env, env_zi = signal.lfilter(env_b, env_a, env_scale * rng.standard_normal(stop - start), zi=env_zi)
+        alpha = np.clip(1.0 + 0.5 * env, 0.0, None) * ALPHA_UV * np.sin(2 * np.pi * ALPHA_HZ * t)
+        block += np.outer(alpha_w, alpha)
+        block += LINE_UV * np.sin(2 * np.pi * LINE_HZ * t + line_phase)
+        _add_transients(block, start, blink_onsets, blink_template, blink_gains)
+        _add_transients(block, start, events[:, 0], erp_go, erp_gains)
+        out[:, start:stop] = block
+    return Recording(out, sfreq, ch_names, events, source=f"synthetic-{int(sfreq)}Hz-{n_channels}ch-{duration:g}s")
+
+
+def write_bdf(path, recording, record_duration=1.0, block_samples=ingest.BLOCK_SAMPLES):
+    """Stream ``recording`` to a BDF file with its events on a ``Status`` channel."""
+    spr = int(round(recording.sfreq * record_duration))
+    if abs(spr - recording.sfreq * record_duration) > 1e-6:
+        raise ValueError("record_duration must hold a whole number of samples")
+    n_ch = recording.n_channels
+    n_records = -(-recording.n_samples // spr)
+    status = np.zeros(n_records * spr, dtype=np.int64)
+    status[recording.events[:, 0]] = recording.events[:, 2]
+
+    def field(value, width):
+        return str(value)[:width].ljust(width).encode("latin-1")
+
+    labels = recording.ch_names + ["Status"]
+    signals = [(label, "uV", -BDF_RANGE_UV, BDF_RANGE_UV) for label in recording.ch_names]
+    signals.append(("Status", "Boolean", -BDF_DIGITAL - 1, BDF_DIGITAL))
+    header = b"\xffBIOSEMI" + field("X X X X", 80) + field("Startdate X X X X", 80)
+    header += field("01.01.25", 8) + field("00.00.00", 8) + field(256 * (len(labels) + 1), 8)
+    header += field("24BIT", 44) + field(n_records, 8) + field(f"{record_duration:g}", 8) + field(len(labels), 4)
+    columns = [
+        (16, [s[0] for s in signals]), (80, [""] * len(signals)), (8, [s[1] for s in signals]),
+        (8, [s[2] for s in signals]), (8, [s[3] for s in signals]),
+        (8, [-BDF_DIGITAL - 1] * len(signals)), (8, [BDF_DIGITAL] * len(signals)),
+        (80, [""] * len(signals)), (8, [spr] * len(signals)), (32, [""] * len(signals)),
+    ]
+    for width, values in columns:
+        header += b"".join(field(v, width) for v in values)
+
+    # With these ranges the reader decodes physical = digital * gain + gain / 2
+    gain = 2 * BDF_RANGE_UV / (2 * BDF_DIGITAL + 1)
+    records_per_block = max(1, block_samples // spr)
+    with open(path, "wb") as fh:
+        fh.write(header)
+        for r0 in range(0, n_records, records_per_block):
+            r1 = min(n_records, r0 + records_per_block)
+            start, stop = r0 * spr, r1 * spr
+            block = np.zeros((n_ch + 1, stop - start))
+            data = np.asarray(recording.data[:, start:min(stop, recording.n_samples)], dtype=np.float64)
+            block[:n_ch, :data.shape[-1]] = np.round(data / gain - 0.5)
+            block[n_ch] = status[start:stop]
+            digital = np.clip(block, -BDF_DIGITAL - 1, BDF_DIGITAL).astype("<i4")
+            # (records, signals, samples) -> little-endian 3-byte samples
+            digital = np.ascontiguousarray(digital.reshape(n_ch + 1, r1 - r0, spr).transpose(1, 0, 2))
+            fh.write(digital.view(np.uint8).reshape(-1, 4)[:, :3].tobytes())
+    return path
@@ -0,0 +1,164 @@
+"""Morlet-wavelet time-frequency power with bounded memory.
+
+Convolution happens in the frequency domain: each batch of epochs is
+transformed once and that FFT is reused for every wavelet frequency.
+Frequencies are processed in blocks sized so the complex
+``(epochs, channels, frequencies, n_fft)`` intermediate stays within
+``TFR_BATCH_BYTES``, and single-trial power is folded into a running
+average over epochs instead of being stored.
+"""
+import numpy as np
+import pandas as pd
+from scipy import fft as sp_fft
+
+from .config import FREQUENCY_BANDS, roi_indices
+from .jobs import check_cancelled
+
+# Bytes of complex intermediate allowed per epoch batch x frequency block
+TFR_BATCH_BYTES = 256 << 20
+
+# Default analysis frequencies (Hz) and wavelet width
+TFR_FREQS = np.arange(2.0, 41.0, 1.0)
+MIN_CYCLES = 3.0
+
+
+def default_freqs(sfreq, l_freq=None, h_freq=None):
+    """``TFR_FREQS`` limited to the pass band and below Nyquist."""
+    lo = l_freq or 0.0
+    hi = min(h_freq or np.inf, sfreq / 2.0)
+    freqs = TFR_FREQS[(TFR_FREQS >= lo) & (TFR_FREQS <= hi)]
+    return freqs if len(freqs) else TFR_FREQS[TFR_FREQS < sfreq / 2.0]
+
+
+def n_cycles_for(freqs):
+    """Half a cycle per Hz (constant 0.5 s temporal width), at least ``MIN_CYCLES``."""
+    return np.maximum(np.asarray(freqs, dtype=float) / 2.0, MIN_CYCLES)
+
+
+def morlet_wavelets(sfreq, freqs, n_cycles):
+    """Zero-mean complex Morlet wavelets, unit-energy normalised, one per frequency."""
+    wavelets = []
+    for f, n in zip(freqs, np.broadcast_to(n_cycles, np.shape(freqs))):
+        sigma_t = n / (2.0 * np.pi * f)
+        # Symmetric support of +-5 sigma so the centre sample is t = 0
+        t = np.arange(0.0, 5.0 * sigma_t, 1.0 / sfreq)
+        t = np.r_[-t[::-1], t[1:]]
+        # Subtracting the DC offset keeps short (3-cycle) wavelets blind to drifts
+        oscillation = np.exp(2j * np.pi * f * t) - np.exp(-2.0 * (np.pi * f * sigma_t) ** 2)
+        w = oscillation * np.exp(-t ** 2 / (2.0 * sigma_t ** 2))
+        wavelets.append(w / np.sqrt(0.5) / np.linalg.norm(w))
+    return wavelets
+
+
+def _wavelet_fft(wavelets, n_fft):
+    out = np.zeros((len(wavelets), n_fft), dtype=np.complex64)
+    for i, w in enumerate(wavelets):
+        out[i] = sp_fft.fft(w, n_fft)
+    return out
+
+
+def tfr_mean(x, sfreq, freqs, n_cycles=None, batch_bytes=TFR_BATCH_BYTES):
+    """Epoch-averaged Morlet power of ``x`` (n_epochs, n_channels, n_times).
+
+    Returns ``(n_channels, n_freqs, n_times)`` in µV². Each wavelet is
+    centred on its sample ("same" convolution), matching
+    ``mne.time_frequency.tfr_array_morlet(..., output="avg_power")``.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    n_cycles = n_cycles_for(freqs) if n_cycles is None else n_cycles
+    n_epochs, n_channels, n_times = x.shape
+    wavelets = morlet_wavelets(sfreq, freqs, n_cycles)
+    longest = max(len(w) for w in wavelets)
+    n_fft = sp_fft.next_fast_len(n_times + longest - 1)
+    W = _wavelet_fft(wavelets, n_fft)
+    offsets = np.array([(len(w) - 1) // 2 for w in wavelets])
+    total = np.zeros((n_channels, len(freqs), n_times))
+
+    # One quarter of the budget for the epoch FFTs, the rest for the products
+    row_bytes = n_channels * n_fft * 8
+    rows = max(1, min(n_epochs, batch_bytes // 4 // row_bytes))
+    for start in range(0, n_epochs, rows):
+        check_cancelled()
+        # Single precision halves the memory traffic; power is accumulated in float64
+        X = sp_fft.fft(np.asarray(x[start:start + rows], dtype=np.float32), n_fft, axis=-1)
+        n_rows = X.shape[0]
+        block = max(1, (batch_bytes - X.nbytes) // (n_rows * row_bytes))
+        for f0 in range(0, len(freqs), block):
+            f1 = min(f0 + block, len(freqs))
+            conv = sp_fft.ifft(X[:, :, None, :] * W[None, None, f0:f1], axis=-1)
+            for j, off in enumerate(offsets[f0:f1]):
+                seg = conv[:, :, j, off:off + n_times]
+                total[:, f0 + j] += (seg.real ** 2 + seg.imag ** 2).sum(axis=0)
+    return total / max(n_epochs, 1)
+
+
+def _tfr_channels(block, out, sfreq, freqs, n_cycles, batch_bytes):
+    """:meth:`ChannelExecutor.map_channels` worker: block is (channels, epochs, times)."""
+    out[:] = tfr_mean(np.moveaxis(block, 0, 1), sfreq, freqs, n_cycles, batch_bytes)
+
+
+def epochs_tfr(epochs, sfreq, freqs, n_cycles=None, batch_bytes=TFR_BATCH_BYTES, executor=None):
+    """Epoch-averaged power ``(n_channels, n_freqs, n_times)`` of one condition."""
+    freqs = np.asarray(freqs, dtype=float)
+    n_cycles = n_cycles_for(freqs) if n_cycles is None else n_cycles
+    shape = (epochs.shape[1], len(freqs), epochs.shape[2])
+    if not epochs.shape[0]:
+        return np.full(shape, np.nan)
+    if executor is not None and epochs.shape[1] > 1:
+        out = np.zeros(shape)
+        executor.map_channels(
+            _tfr_channels, epochs, out, args=(sfreq, freqs, n_cycles, batch_bytes), axis=1, out_axis=0
+        )
+        return out
+    return tfr_mean(epochs, sfreq, freqs, n_cycles, batch_bytes)
+
+
+class TimeFrequency:
+    """Per-condition epoch-averaged power sharing one frequency and time axis."""
+
+    def __init__(self, freqs, times, power, ch_names):
+        self.freqs = freqs
+        self.times = times
+        self.power = power            # {condition: (n_channels, n_freqs, n_times)}
+        self.ch_names = ch_names
+
+    @classmethod
+    def from_epochs(cls, epochs, freqs, executor=None, **kwargs):
+        power = {
+            cond: epochs_tfr(data, epochs.sfreq, freqs, executor=executor, **kwargs)
+            for cond, data in epochs.data.items()
+        }
+        return cls(np.asarray(freqs, dtype=float), epochs.times, power, epochs.ch_names)
+
+    def roi_power(self):
+        """``{(condition, roi): (n_freqs, n_times)}`` averaged over each ROI's channels."""
+        rois = roi_indices(self.ch_names)
+        return {
+            (cond, roi): power[idx].mean(axis=0)
+            for cond, power in self.power.items()
+            for roi, idx in rois.items()
+        }
+
+    def band_frame(self, window, bands=FREQUENCY_BANDS):
+        """Mean band power in ``window`` (s) and its change from the pre-stimulus baseline."""
+        in_window = (self.times >= window[0]) & (self.times <= window[1])
+        in_baseline = self.times < 0
+        rows = []
+        for (cond, roi), power in self.roi_power().items():
+            for name, (lo, hi) in bands.items():
+                mask = (self.freqs >= lo) & (self.freqs < hi)
+                if not mask.any():
+                    continue
+                band = power[mask].mean(axis=0)
+                value = band[in_window].mean() if in_window.any() else np.nan
+                base = band[in_baseline].mean() if in_baseline.any() else np.nan
+                rows.append({
+                    "roi": roi,
+                    "band": name,
+                    "condition": cond,
+                    "power_uV2": value,
+                    "baseline_uV2": base,
+                    "change_dB": 10 * np.log10(value / base) if base > 0 and value > 0 else np.nan,
+                })
+        columns = ["roi", "band", "condition", "power_uV2", "baseline_uV2", "change_dB"]
+        return pd.DataFrame(rows, columns=columns)
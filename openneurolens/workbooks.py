@@ -0,0 +1,91 @@
+"""Columnar sidecars for the Excel summary workbooks shown on the page.
+
+Parsing ``.xlsx`` with openpyxl is slow and the page reruns on every
+widget interaction, so each workbook is converted once into one Feather
+file per sheet under ``CACHE_DIR/workbooks`` plus a JSON manifest of the
+sheet names. The manifest records the workbook's mtime and size; when
+either changes the sidecar is rebuilt, otherwise the Excel parser never
+runs and a sheet is read only when it is asked for.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from .cache import CACHE_DIR, atomic_write
+
+WORKBOOK_DIR = CACHE_DIR / "workbooks"
+MANIFEST_NAME = "manifest.json"
+
+# Inferred dtypes of object columns that Arrow cannot store as one type
+MIXED_DTYPES = ("mixed", "mixed-integer")
+
+
+def _arrow_safe(df):
+    """``df`` with string column names, a default index and mixed columns as text."""
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    for name in df.columns[df.dtypes == object]:
+        col = df[name]
+        if pd.api.types.infer_dtype(col, skipna=True) in MIXED_DTYPES:
+            df[name] = col.astype(str).where(col.notna())
+    return df
+
+
+class Workbook:
+    """Sheets of one ``.xlsx`` file, served from its columnar sidecar."""
+
+    def __init__(self, path, directory=WORKBOOK_DIR):
+        self.path = Path(path)
+        name = hashlib.blake2b(str(self.path.resolve()).encode("utf-8"), digest_size=10).hexdigest()
+        self.directory = Path(directory) / name
+        self._files = None
+        self._frames = None     # parsed sheets kept in memory when the sidecar cannot be written
+
+    def _stamp(self):
+        stat = self.path.stat()
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _load_manifest(self):
+        stamp = self._stamp()
+        try:
+            manifest = json.loads((self.directory / MANIFEST_NAME).read_text("utf-8"))
+            if manifest["stamp"] == stamp:
+                return manifest["sheets"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.convert(stamp)
+
+    def convert(self, stamp=None):
+        """Parse the workbook once and write the sidecar; returns ``{sheet: file name}``."""
+        stamp = self._stamp() if stamp is None else stamp
+        frames = {name: _arrow_safe(df) for name, df in pd.read_excel(self.path, sheet_name=None).items()}
+        files = {name: f"{i:03d}.feather" for i, name in enumerate(frames)}
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for name, df in frames.items():
+                atomic_write(self.directory / files[name], df.to_feather)
+            # Manifest last, so a reader never sees it before the sheets it lists
+            text = json.dumps({"source": str(self.path), "stamp": stamp, "sheets": files}, ensure_ascii=False)
+            atomic_write(self.directory / MANIFEST_NAME,
+                         lambda tmp: Path(tmp).write_text(text, encoding="utf-8"))
+            for stale in set(self.directory.glob("*.feather")) - {self.directory / f for f in files.values()}:
+                stale.unlink(missing_ok=True)
+        except OSError:
+            self._frames = frames
+        return files
+
+    @property
+    def sheet_names(self):
+        if self._files is None:
+            self._files = self._load_manifest()
+        return list(self._files)
+
+    def sheet(self, name):
+        """One sheet as a DataFrame, read from its Feather file."""
+        if name not in self.sheet_names:
+            raise KeyError(f"{self.path.name} has no sheet {name!r}")
+        if self._frames is not None:
+            return self._frames[name]
+        return pd.read_feather(self.directory / self._files[name])
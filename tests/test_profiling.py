@@ -0,0 +1,38 @@
+"""Probes keep resetting the memory high-water mark after others were abandoned."""
+import gc
+
+import pytest
+
+from openneurolens import profiling
+
+
+@pytest.fixture
+def resettable():
+    if not profiling.reset_peak_rss():
+        pytest.skip("the kernel does not allow resetting the RSS high-water mark")
+
+
+def test_abandoned_probe_does_not_block_resets(resettable):
+    # An interrupted page rerun never reaches stop()
+    profiling.Probe().start()
+    gc.collect()
+    probe = profiling.Probe().start()
+    assert probe.rss_reset
+    probe.stop()
+
+
+def test_running_probe_defers_resets_until_stopped(resettable):
+    outer = profiling.Probe().start()
+    inner = profiling.Probe().start()
+    assert outer.rss_reset and not inner.rss_reset
+    inner.stop()
+    outer.stop()
+    assert profiling.Probe().start().rss_reset
+
+
+def test_non_resetting_probe_does_not_block_resets(resettable):
+    rerun = profiling.Probe(reset_rss=False).start()
+    probe = profiling.Probe().start()
+    assert not rerun.rss_reset and probe.rss_reset
+    probe.stop()
+    rerun.stop()
@@ -0,0 +1,81 @@
+"""Cluster permutation tests checked against scipy's t-tests and MNE's cluster statistics."""
+import numpy as np
+import pytest
+from scipy import stats as sp_stats
+
+from openneurolens import preprocess, stats, synthetic
+from openneurolens.interpolation import builtin_montage
+from openneurolens.pipeline import Epochs
+
+N_TIMES = 40
+
+
+def _channels(n=32):
+    return synthetic.synthetic_ch_names(n)
+
+
+def _groups(seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.normal(size=(30, 32, N_TIMES))
+    b = rng.normal(size=(20, 32, N_TIMES))
+    # An effect on the frontal channels, mid-window
+    a[:, :8, 15:25] += 1.0
+    return a, b
+
+
+def test_two_sample_t_matches_scipy():
+    a, b = _groups()
+    result = stats.cluster_test(a, b, _channels(), n_permutations=0)
+    assert np.allclose(result.t_obs, sp_stats.ttest_ind(a, b, axis=0).statistic)
+
+
+def test_paired_t_matches_scipy():
+    diff = np.random.default_rng(2).normal(size=(20, 32, N_TIMES)) + 0.3
+    result = stats.cluster_test(diff, None, _channels(), n_permutations=0)
+    assert np.allclose(result.t_obs, sp_stats.ttest_1samp(diff, 0, axis=0).statistic)
+
+
+@pytest.mark.parametrize("n_channels", [19, 32, 64])
+def test_channel_adjacency_matches_mne(n_channels):
+    mne = pytest.importorskip("mne")
+    names = _channels(n_channels)
+    info = mne.create_info(names, 100.0, "eeg")
+    info.set_montage(builtin_montage("standard_1020"), verbose="error")
+    adjacency, _ = mne.channels.find_ch_adjacency(info, "eeg")
+    adjacency = adjacency.tocoo()
+    expected = {(min(i, j), max(i, j)) for i, j in zip(adjacency.row, adjacency.col) if i != j}
+    assert {tuple(e) for e in stats.channel_adjacency("standard_1020", tuple(names)).tolist()} == expected
+
+
+def test_clusters_match_mne():
+    mne = pytest.importorskip("mne")
+    a, b = _groups()
+    names = _channels()
+    result = stats.cluster_test(a, b, names, n_permutations=200, seed=0)
+    info = mne.create_info(names, 100.0, "eeg")
+    info.set_montage(builtin_montage("standard_1020"), verbose="error")
+    adjacency, _ = mne.channels.find_ch_adjacency(info, "eeg")
+    _, clusters, p_values, _ = mne.stats.permutation_cluster_test(
+        [a.transpose(0, 2, 1), b.transpose(0, 2, 1)], threshold=result.threshold, n_permutations=200, tail=0,
+        stat_fun=mne.stats.ttest_ind_no_p, adjacency=adjacency, out_type="mask", seed=0, verbose="error",
+    )
+    frame = result.frame()
+    assert sorted(frame["n_points"]) == sorted(int(c.sum()) for c in clusters)
+    assert frame["p_value"].iloc[0] < 0.05 and p_values.min() < 0.05
+
+
+def test_go_nogo_test_crops_lazy_epochs():
+    rng = np.random.default_rng(3)
+    data = rng.normal(size=(32, 20000)) * 10
+    sfreq = 256.0
+    onsets = np.arange(100, 19000, 300)
+    epochs = {}
+    for cond, subset in (("Go", onsets[::2]), ("NoGo", onsets[1::2])):
+        epochs[cond], times, _ = preprocess.epoch(data, subset, sfreq, -0.2, 0.8, baseline=True)
+    result = stats.go_nogo_test(Epochs(epochs, times, _channels(), sfreq), "standard_1020", (0.0, 0.5),
+                                n_permutations=50)
+    keep = (times >= 0.0) & (times <= 0.5)
+    expected = stats.cluster_test(np.asarray(epochs["NoGo"])[:, :, keep], np.asarray(epochs["Go"])[:, :, keep],
+                                  _channels(), times[keep], n_permutations=50)
+    assert np.array_equal(result.times, times[keep])
+    assert np.allclose(result.t_obs, expected.t_obs)